@@ -0,0 +1,230 @@
+"""
+Aplicación en lote de eventos del servicio de operaciones.
+
+Un cambio masivo de precios llega como miles de PRODUCT_STOCK_UPDATED /
+RECIPE_UPDATED. En vez de una tarea de Celery por mensaje, el consumidor los
+junta en lotes (CATALOG_EVENTS_BATCH_SIZE mensajes o
+CATALOG_EVENTS_FLUSH_INTERVAL segundos), se queda solo con el último evento
+de cada producto/receta, los aplica con bulk_update/bulk_create en una
+transacción y confirma todo el lote con un solo ack.
+"""
+
+import json
+import logging
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_EVENT = 'PRODUCT_STOCK_UPDATED'
+RECIPE_EVENT = 'RECIPE_UPDATED'
+
+PRODUCT_FIELDS = ['name', 'sku', 'unit_cost', 'current_stock', 'unit_of_measure', 'is_active',
+                  'last_synced_at']
+RECIPE_FIELDS = ['name', 'production_cost', 'yield_quantity', 'yield_unit', 'cost_per_unit',
+                 'is_active', 'last_synced_at']
+
+
+def collapse_events(events):
+    """
+    Último payload por producto y por receta, en el orden de llegada.
+    Retorna ({product_id: product_data}, {recipe_id: recipe_data}).
+    """
+    products = {}
+    recipes = {}
+    for event in events:
+        event_type = event.get('event_type')
+        if event_type == PRODUCT_EVENT:
+            products[event.get('product_id')] = event.get('product_data', {})
+        elif event_type == RECIPE_EVENT:
+            recipes[event.get('recipe_id')] = event.get('recipe_data', {})
+    return products, recipes
+
+
+def _product_values(data):
+    return {
+        'name': data.get('name', ''),
+        'sku': data.get('sku', ''),
+        'unit_cost': Decimal(str(data.get('unit_cost', 0))),
+        'current_stock': Decimal(str(data.get('current_stock', 0))),
+        'unit_of_measure': data.get('unit_of_measure', 'unidad'),
+        'is_active': data.get('is_active', True),
+    }
+
+
+def _recipe_values(data):
+    production_cost = Decimal(str(data.get('production_cost', 0)))
+    yield_quantity = Decimal(str(data.get('yield_quantity', 1)))
+    return {
+        'name': data.get('name', ''),
+        'production_cost': production_cost,
+        'yield_quantity': yield_quantity,
+        'yield_unit': data.get('yield_unit', 'porción'),
+        'cost_per_unit': production_cost / yield_quantity if yield_quantity > 0 else Decimal('0'),
+        'is_active': data.get('is_active', True),
+    }
+
+
+def _upsert(model, rows, fields):
+    """Actualiza o crea los espejos {original_id: valores} con una consulta por operación"""
+    now = timezone.now()
+    existing = model.objects.in_bulk(list(rows), field_name='original_id')
+
+    to_update = []
+    to_create = []
+    for original_id, values in rows.items():
+        instance = existing.get(original_id)
+        if instance is None:
+            to_create.append(model(original_id=original_id, **values))
+            continue
+        for field, value in values.items():
+            setattr(instance, field, value)
+        instance.last_synced_at = now
+        to_update.append(instance)
+
+    if to_update:
+        model.objects.bulk_update(to_update, fields)
+    if to_create:
+        model.objects.bulk_create(to_create)
+    return to_update + to_create
+
+
+def apply_catalog_events(events):
+    """
+    Aplica un lote de eventos del catálogo en una transacción y propaga los
+    nuevos costos a los componentes del menú. Retorna cuántos productos,
+    recetas e items del menú se actualizaron.
+    """
+    from menu.component_names import invalidate_component_names
+    from menu.costing import defer_cost_recalc, propagate_component_costs
+    from .models import MirroredProduct, MirroredRecipe
+
+    products, recipes = collapse_events(events)
+
+    # Cada item del menú afectado se recalcula una vez por lote, dentro de la transacción
+    with transaction.atomic(), defer_cost_recalc():
+        mirrored_products = _upsert(
+            MirroredProduct,
+            {product_id: _product_values(data) for product_id, data in products.items()},
+            PRODUCT_FIELDS
+        )
+        mirrored_recipes = _upsert(
+            MirroredRecipe,
+            {recipe_id: _recipe_values(data) for recipe_id, data in recipes.items()},
+            RECIPE_FIELDS
+        )
+        product_ids = [product.original_id for product in mirrored_products]
+        recipe_ids = [recipe.original_id for recipe in mirrored_recipes]
+        menu_items = propagate_component_costs(product_ids=product_ids, recipe_ids=recipe_ids)
+        invalidate_component_names(product_ids=product_ids, recipe_ids=recipe_ids)
+
+    return {
+        'products': len(mirrored_products),
+        'recipes': len(mirrored_recipes),
+        'menu_items': menu_items,
+    }
+
+
+class CatalogEventBatcher:
+    """
+    Acumula mensajes de un canal AMQP y los aplica por lotes.
+
+    El canal debe permitir basic_ack/basic_nack con `multiple` (un canal de
+    pika con prefetch_count >= batch_size).
+    """
+
+    def __init__(self, channel, batch_size=None, flush_interval=None):
+        self.channel = channel
+        self.batch_size = batch_size or getattr(settings, 'CATALOG_EVENTS_BATCH_SIZE', 200)
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else getattr(settings, 'CATALOG_EVENTS_FLUSH_INTERVAL', 1.0)
+        )
+        self._events = []
+        self._last_tag = None
+        self._first_received_at = None
+        self.stats = {
+            'messages': 0,
+            'batches': 0,
+            'products': 0,
+            'recipes': 0,
+            'seconds': 0.0,
+        }
+
+    def add(self, delivery_tag, body):
+        """Agrega un mensaje al lote; lo aplica si el lote se llenó"""
+        try:
+            event = json.loads(body)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Evento inválido descartado: {str(e)}")
+            self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+            return
+
+        if not self._events:
+            self._first_received_at = time.monotonic()
+        self._events.append((delivery_tag, event))
+        self._last_tag = delivery_tag
+
+        if len(self._events) >= self.batch_size:
+            self.flush()
+
+    def tick(self):
+        """Aplica el lote si pasó el intervalo desde el primer mensaje pendiente"""
+        if self._events and time.monotonic() - self._first_received_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Aplica los mensajes pendientes y confirma el lote completo"""
+        if not self._events:
+            return
+
+        batch = self._events
+        last_tag = self._last_tag
+        self._events = []
+        self._last_tag = None
+
+        started = time.perf_counter()
+        try:
+            result = apply_catalog_events([event for _, event in batch])
+        except Exception as e:
+            # Un mensaje defectuoso no debe descartar el lote: se aplican uno por uno
+            logger.error(f"Error aplicando lote de {len(batch)} eventos, reintentando uno a uno: {str(e)}")
+            result = self._apply_individually(batch)
+        else:
+            self.channel.basic_ack(delivery_tag=last_tag, multiple=True)
+        elapsed = time.perf_counter() - started
+
+        self.stats['messages'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['products'] += result['products']
+        self.stats['recipes'] += result['recipes']
+        self.stats['seconds'] += elapsed
+
+        logger.info(
+            f"Lote de {len(batch)} eventos: {result['products']} productos, "
+            f"{result['recipes']} recetas en {elapsed * 1000:.0f} ms "
+            f"({self.throughput():.0f} eventos/s acumulado)"
+        )
+
+    def _apply_individually(self, batch):
+        result = {'products': 0, 'recipes': 0, 'menu_items': 0}
+        for delivery_tag, event in batch:
+            try:
+                applied = apply_catalog_events([event])
+            except Exception as e:
+                logger.error(f"Error procesando evento: {str(e)}")
+                self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+                continue
+            self.channel.basic_ack(delivery_tag=delivery_tag)
+            for key in result:
+                result[key] += applied[key]
+        return result
+
+    def throughput(self):
+        """Eventos aplicados por segundo de procesamiento"""
+        if not self.stats['seconds']:
+            return 0.0
+        return self.stats['messages'] / self.stats['seconds']
@@ -1,9 +1,13 @@
+import json
+from unittest.mock import MagicMock
 from django.test import TestCase
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
+from menu.models import MenuCategory, MenuItem, MenuItemComponent
 from .models import MirroredProduct, MirroredRecipe
+from .events import CatalogEventBatcher, collapse_events
 
 
 class MirroredProductModelTest(TestCase):
@@ -114,3 +118,78 @@ class MirroredRecipeAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], 'Test Recipe')
         self.assertEqual(Decimal(response.data['cost_per_unit']), Decimal('2000'))
+
+
+class CatalogEventBatchTest(TestCase):
+    """Tests para el consumo de eventos de operaciones en lotes"""
+    
+    def setUp(self):
+        MirroredProduct.objects.create(original_id=1, name="Carne", unit_cost=Decimal('8000'))
+        self.category = MenuCategory.objects.create(name="Platos", display_order=1)
+        self.item = MenuItem.objects.create(category=self.category, name="Lomo", price=Decimal('15000'))
+        MenuItemComponent.objects.create(
+            menu_item=self.item, component_type='product', product_id=1, quantity=Decimal('0.5')
+        )
+        self.channel = MagicMock()
+    
+    def _product_event(self, product_id, unit_cost):
+        return json.dumps({
+            'event_type': 'PRODUCT_STOCK_UPDATED',
+            'product_id': product_id,
+            'product_data': {'name': f"Producto {product_id}", 'unit_cost': unit_cost},
+        })
+    
+    def test_latest_event_per_product_wins(self):
+        """Test que solo se aplica el último evento de cada producto"""
+        products, recipes = collapse_events([
+            json.loads(self._product_event(1, 100)),
+            json.loads(self._product_event(2, 50)),
+            json.loads(self._product_event(1, 300)),
+        ])
+        
+        self.assertEqual(products[1]['unit_cost'], 300)
+        self.assertEqual(set(products), {1, 2})
+        self.assertEqual(recipes, {})
+    
+    def test_batch_applied_and_acked_once(self):
+        """Test que un lote lleno se aplica y se confirma con un solo ack"""
+        batcher = CatalogEventBatcher(self.channel, batch_size=4, flush_interval=60)
+        batcher.add(1, self._product_event(1, 9000))
+        batcher.add(2, self._product_event(2, 500))
+        batcher.add(3, json.dumps({
+            'event_type': 'RECIPE_UPDATED', 'recipe_id': 5,
+            'recipe_data': {'name': "Salsa", 'production_cost': 3000, 'yield_quantity': 4},
+        }))
+        self.channel.basic_ack.assert_not_called()
+        batcher.add(4, self._product_event(1, 10000))
+        
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=4, multiple=True)
+        self.assertEqual(MirroredProduct.objects.get(original_id=1).unit_cost, Decimal('10000'))
+        self.assertEqual(MirroredProduct.objects.get(original_id=2).name, "Producto 2")
+        self.assertEqual(MirroredRecipe.objects.get(original_id=5).cost_per_unit, Decimal('750'))
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cached_cost, Decimal('5000'))
+        self.assertEqual(batcher.stats['messages'], 4)
+        self.assertEqual(batcher.stats['products'], 2)
+        self.assertGreater(batcher.throughput(), 0)
+    
+    def test_partial_batch_flushed_after_interval(self):
+        """Test que un lote incompleto se aplica al cumplirse el intervalo"""
+        batcher = CatalogEventBatcher(self.channel, batch_size=100, flush_interval=0)
+        batcher.add(1, self._product_event(1, 9000))
+        batcher.tick()
+        
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=1, multiple=True)
+    
+    def test_invalid_messages_rejected_individually(self):
+        """Test que un mensaje inválido se rechaza sin perder el resto del lote"""
+        batcher = CatalogEventBatcher(self.channel, batch_size=10, flush_interval=60)
+        batcher.add(1, 'no es json')
+        batcher.add(2, self._product_event(None, 100))
+        batcher.add(3, self._product_event(1, 9000))
+        batcher.flush()
+        
+        self.channel.basic_nack.assert_any_call(delivery_tag=1, requeue=False)
+        self.channel.basic_nack.assert_any_call(delivery_tag=2, requeue=False)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=3)
+        self.assertEqual(MirroredProduct.objects.get(original_id=1).unit_cost, Decimal('9000'))
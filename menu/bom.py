@@ -0,0 +1,109 @@
+"""
+Lista de materiales (BOM) aplanada por MenuItem.
+
+La BOM de un item es la cantidad de cada producto y receta del servicio de
+operaciones que consume una unidad del item. Las BOM de todos los items de
+una orden se calculan con una sola consulta, así que calcular el stock a
+descontar no recorre los componentes item por item.
+
+Con MENU_BOM_CACHE activo la BOM se guarda además en el cache de Django
+(MENU_BOM_CACHE_TIMEOUT) y se invalida cuando cambian los componentes del
+item. Requiere un cache compartido (CACHE_URL): con el cache en memoria de
+cada proceso, un cambio hecho en otro worker o en Celery no invalidaría la
+BOM de los demás y ORDEN_PAGADA descontaría stock con componentes viejos.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def bom_cache_key(menu_item_id):
+    return f'menu:bom:{menu_item_id}'
+
+
+def invalidate_bom(menu_item_id):
+    """
+    Descarta la BOM cacheada de un item. Se repite al confirmar la transacción
+    para que otro proceso no deje cacheada la versión anterior.
+    """
+    if not enabled():
+        return
+    key = bom_cache_key(menu_item_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def enabled():
+    return getattr(settings, 'MENU_BOM_CACHE', False)
+
+
+def build_boms(menu_item_ids):
+    """BOM de varios items calculadas con una consulta"""
+    from .models import MenuItemComponent
+
+    boms = {menu_item_id: {'products': {}, 'recipes': {}} for menu_item_id in menu_item_ids}
+    components = MenuItemComponent.objects.filter(menu_item_id__in=boms.keys()).values_list(
+        'menu_item_id', 'component_type', 'product_id', 'recipe_id', 'quantity'
+    )
+    for menu_item_id, component_type, product_id, recipe_id, quantity in components:
+        if component_type == 'product':
+            materials, material_id = boms[menu_item_id]['products'], product_id
+        else:
+            materials, material_id = boms[menu_item_id]['recipes'], recipe_id
+        materials[material_id] = materials.get(material_id, Decimal('0')) + quantity
+    return boms
+
+
+def get_boms(menu_item_ids):
+    """
+    BOM de varios items: {menu_item_id: {'products': {id: cantidad}, 'recipes': {id: cantidad}}}.
+    Los items que no están en cache se calculan con una sola consulta.
+    """
+    menu_item_ids = set(menu_item_ids)
+    if not enabled():
+        return build_boms(menu_item_ids)
+
+    keys = {bom_cache_key(menu_item_id): menu_item_id for menu_item_id in menu_item_ids}
+    cached = cache.get_many(keys.keys())
+    boms = {keys[key]: bom for key, bom in cached.items()}
+
+    missing = menu_item_ids - boms.keys()
+    if missing:
+        built = build_boms(missing)
+        cache.set_many(
+            {bom_cache_key(menu_item_id): bom for menu_item_id, bom in built.items()},
+            timeout=getattr(settings, 'MENU_BOM_CACHE_TIMEOUT', 24 * 60 * 60)
+        )
+        boms.update(built)
+
+    return boms
+
+
+def stock_deductions(lines):
+    """
+    Stock a descontar por unas líneas (menu_item_id, cantidad), sumado por
+    producto y por receta: cada producto o receta aparece una sola vez.
+    """
+    quantities = defaultdict(int)
+    for menu_item_id, quantity in lines:
+        quantities[menu_item_id] += quantity
+
+    totals = {'products': defaultdict(Decimal), 'recipes': defaultdict(Decimal)}
+    for menu_item_id, bom in get_boms(quantities.keys()).items():
+        for kind in ('products', 'recipes'):
+            for material_id, quantity in bom[kind].items():
+                totals[kind][material_id] += quantity * quantities[menu_item_id]
+
+    return {
+        'products': [
+            {'product_id': product_id, 'quantity': float(quantity)}
+            for product_id, quantity in sorted(totals['products'].items())
+        ],
+        'recipes': [
+            {'recipe_id': recipe_id, 'quantity': float(quantity)}
+            for recipe_id, quantity in sorted(totals['recipes'].items())
+        ],
+    }
@@ -0,0 +1,181 @@
+"""
+Nombres de los componentes del menú (productos y recetas del catálogo espejo).
+
+Los serializers no buscan el nombre componente por componente: antes de
+serializar una página juntan todos los componentes y resuelven los nombres
+que faltan con dos consultas IN (una para productos y otra para recetas).
+
+Con MENU_COMPONENT_NAMES_CACHE activo los nombres resueltos quedan además en
+un LRU por proceso con tamaño máximo (MENU_COMPONENT_NAMES_CACHE_SIZE). Las
+tareas que actualizan el catálogo llaman a invalidate_component_names(): el
+proceso que las ejecuta descarta esos nombres de inmediato y, al confirmarse
+la transacción, se incrementa una versión en el cache de Django con la que
+los demás procesos vacían su LRU. Por eso el LRU requiere un cache
+compartido (CACHE_URL): las tareas de Celery corren en otro proceso y con el
+cache en memoria los workers web nunca verían la versión nueva.
+"""
+
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from orders_service.versioning import CacheVersion
+
+UNKNOWN_NAME = 'Desconocido'
+
+
+def component_key(component):
+    """('product', id) o ('recipe', id) del componente; None si no apunta a nada"""
+    if component.component_type == 'product' and component.product_id:
+        return ('product', component.product_id)
+    if component.component_type == 'recipe' and component.recipe_id:
+        return ('recipe', component.recipe_id)
+    return None
+
+
+def fallback_name(key):
+    """Nombre que se muestra cuando el producto o receta no está en el catálogo espejo"""
+    if key is None:
+        return UNKNOWN_NAME
+    component_type, original_id = key
+    if component_type == 'product':
+        return f"Producto #{original_id}"
+    return f"Receta #{original_id}"
+
+
+class ComponentNameLRU:
+    """Nombres por clave de componente; al llenarse descarta el usado hace más tiempo"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def sync(self, version):
+        """Vacía el LRU si otro proceso invalidó los nombres (cambió la versión)"""
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, names):
+        with self._lock:
+            for key, name in names.items():
+                self._data[key] = name
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_names = ComponentNameLRU(getattr(settings, 'MENU_COMPONENT_NAMES_CACHE_SIZE', 5000))
+
+
+# Si el cache se vacía, la versión nueva también vacía los LRU de los procesos
+names_version = CacheVersion('menu:component_names:version', 'MENU_COMPONENT_NAMES_CACHE')
+
+
+def invalidate_component_names(product_ids=(), recipe_ids=()):
+    """Descarta los nombres cacheados de esos productos/recetas en todos los procesos"""
+    _names.discard(
+        [('product', product_id) for product_id in product_ids] +
+        [('recipe', recipe_id) for recipe_id in recipe_ids]
+    )
+    names_version.invalidate()
+
+
+def resolve_component_names(components):
+    """
+    {clave: nombre} de los componentes dados. Los que no están en el LRU (o
+    todos, sin LRU) se buscan con una consulta por tipo; los que no existen
+    en el catálogo espejo quedan con None y no se cachean.
+    """
+    from catalog_mirror.models import MirroredProduct, MirroredRecipe
+
+    keys = {key for key in map(component_key, components) if key is not None}
+    if not keys:
+        return {}
+
+    use_lru = names_version.enabled()
+    if use_lru:
+        _names.sync(names_version.current())
+        names = _names.get_many(keys)
+    else:
+        names = {}
+
+    missing = keys - names.keys()
+    product_ids = [original_id for component_type, original_id in missing if component_type == 'product']
+    recipe_ids = [original_id for component_type, original_id in missing if component_type == 'recipe']
+
+    found = {}
+    if product_ids:
+        found.update(
+            (('product', original_id), name)
+            for original_id, name in MirroredProduct.objects.filter(
+                original_id__in=product_ids
+            ).values_list('original_id', 'name')
+        )
+    if recipe_ids:
+        found.update(
+            (('recipe', original_id), name)
+            for original_id, name in MirroredRecipe.objects.filter(
+                original_id__in=recipe_ids
+            ).values_list('original_id', 'name')
+        )
+    if use_lru:
+        _names.set_many(found)
+
+    names.update(found)
+    for key in missing - found.keys():
+        names[key] = None
+    return names
+
+
+class ComponentNameResolver:
+    """
+    Nombres de los componentes durante una serialización. prime() resuelve
+    en lote los componentes de una página; name() resuelve al momento los
+    que no se precargaron.
+    """
+
+    def __init__(self):
+        self._names = {}
+
+    def prime(self, components):
+        pending = [
+            component for component in components
+            if component_key(component) not in self._names
+        ]
+        self._names.update(resolve_component_names(pending))
+
+    def name(self, component):
+        key = component_key(component)
+        if key is None:
+            return UNKNOWN_NAME
+        if key not in self._names:
+            self.prime([component])
+        return self._names[key] or fallback_name(key)
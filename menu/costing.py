@@ -0,0 +1,153 @@
+"""
+Propagación de costos del catálogo espejo a los items del menú.
+
+Cuando cambia el costo de un producto o receta del servicio de operaciones
+hay que actualizar el costo unitario cacheado de los componentes que lo usan
+y recalcular el costo de los items afectados. Ambos pasos son un UPDATE
+cada uno, sin importar en cuántos items se use el producto:
+
+- MenuItemComponent.cached_unit_cost se copia desde MirroredProduct.unit_cost
+  o MirroredRecipe.cost_per_unit con subconsultas.
+- MenuItem.cached_cost se recalcula como SUM(quantity * cached_unit_cost) de
+  sus componentes con una subconsulta agregada.
+
+Las ediciones masivas de componentes se envuelven en defer_cost_recalc():
+mientras está activo los componentes solo marcan su item como pendiente y al
+salir cada item se recalcula una sola vez.
+"""
+
+import threading
+from contextlib import ContextDecorator
+from decimal import Decimal
+from django.db.models import (
+    Case, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Coalesce
+from .snapshot import invalidate_menu_snapshot
+
+COST_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def components_cost_subquery():
+    """Subconsulta con la suma de quantity * cached_unit_cost de los componentes del item"""
+    from .models import MenuItemComponent
+
+    totals = MenuItemComponent.objects.filter(
+        menu_item_id=OuterRef('pk')
+    ).order_by().values('menu_item_id').annotate(
+        total=Sum(ExpressionWrapper(F('quantity') * F('cached_unit_cost'), output_field=COST_FIELD))
+    ).values('total')
+
+    return Coalesce(Subquery(totals, output_field=COST_FIELD), Value(Decimal('0')), output_field=COST_FIELD)
+
+
+def recalculate_costs(menu_items):
+    """Recalcula cached_cost de los items del queryset con un solo UPDATE; retorna cuántos cambió"""
+    updated = menu_items.update(cached_cost=components_cost_subquery())
+    if updated:
+        invalidate_menu_snapshot()
+    return updated
+
+
+_deferred = threading.local()
+
+
+def _dirty_menu_item_ids():
+    return getattr(_deferred, 'menu_item_ids', None)
+
+
+class defer_cost_recalc(ContextDecorator):
+    """
+    Posterga el recálculo de costos de los items del menú hasta salir del
+    bloque. Se puede anidar (recalcula el bloque más externo) y usar como
+    decorador. Si el bloque termina con una excepción no se recalcula nada.
+
+    Uso:
+        with defer_cost_recalc():
+            for data in components_data:
+                MenuItemComponent.objects.create(menu_item=item, **data)
+    """
+
+    def __init__(self):
+        self._outermost = False
+
+    def _recreate_cm(self):
+        # Cada llamada a una función decorada usa su propio contexto
+        return self.__class__()
+
+    def __enter__(self):
+        self._outermost = _dirty_menu_item_ids() is None
+        if self._outermost:
+            _deferred.menu_item_ids = set()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._outermost:
+            return False
+
+        menu_item_ids = _deferred.menu_item_ids
+        _deferred.menu_item_ids = None
+        if exc_type is None and menu_item_ids:
+            from .models import MenuItem
+            recalculate_costs(MenuItem.objects.filter(id__in=menu_item_ids))
+        return False
+
+
+def mark_cost_dirty(*menu_item_ids):
+    """
+    Marca items para recalcular al salir de defer_cost_recalc(). Retorna
+    False si no hay un bloque activo (el llamador debe recalcular ahora).
+    """
+    dirty = _dirty_menu_item_ids()
+    if dirty is None:
+        return False
+    dirty.update(menu_item_ids)
+    return True
+
+
+def propagate_component_costs(product_ids=(), recipe_ids=()):
+    """
+    Copia los costos actuales del catálogo espejo a los componentes que usan
+    esos productos/recetas (original_id) y recalcula los items afectados.
+    Retorna la cantidad de items afectados. Dentro de defer_cost_recalc() los
+    items solo se marcan y se recalculan junto con el resto al salir.
+    """
+    from catalog_mirror.models import MirroredProduct, MirroredRecipe
+    from .models import MenuItem, MenuItemComponent
+
+    product_ids = list(product_ids)
+    recipe_ids = list(recipe_ids)
+    if not product_ids and not recipe_ids:
+        return 0
+
+    # Además del costo pudo cambiar el nombre que muestra el menú público
+    invalidate_menu_snapshot()
+
+    affected = MenuItemComponent.objects.filter(
+        Q(component_type='product', product_id__in=product_ids) |
+        Q(component_type='recipe', recipe_id__in=recipe_ids)
+    )
+
+    product_cost = MirroredProduct.objects.filter(
+        original_id=OuterRef('product_id')
+    ).values('unit_cost')[:1]
+    recipe_cost = MirroredRecipe.objects.filter(
+        original_id=OuterRef('recipe_id')
+    ).values('cost_per_unit')[:1]
+
+    # Si el espejo no existe se conserva el costo anterior
+    affected.update(cached_unit_cost=Case(
+        When(component_type='product', then=Coalesce(Subquery(product_cost), F('cached_unit_cost'))),
+        When(component_type='recipe', then=Coalesce(Subquery(recipe_cost), F('cached_unit_cost'))),
+        default=F('cached_unit_cost'),
+        output_field=COST_FIELD
+    ))
+
+    if _dirty_menu_item_ids() is not None:
+        menu_item_ids = set(affected.values_list('menu_item_id', flat=True))
+        mark_cost_dirty(*menu_item_ids)
+        return len(menu_item_ids)
+
+    return recalculate_costs(
+        MenuItem.objects.filter(id__in=affected.values('menu_item_id'))
+    )
@@ -0,0 +1,119 @@
+"""
+Benchmark de la búsqueda del menú.
+
+Arma un menú sintético en memoria (por defecto 10.000 items con nombres y
+descripciones en español, con tildes) y mide la latencia del índice de
+trigramas (MenuSearchIndex) contra recorrer todos los items comparando el
+texto plegado, que es lo que hace un LIKE '%...%' sobre search_text. No
+escribe en la base de datos.
+
+Uso:
+    python manage.py bench_menu_search --items 10000 --queries 2000
+"""
+
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from menu.search import MenuSearchIndex, fold_text, match_score
+
+DISHES = [
+    'Café', 'Té', 'Jugo', 'Limonada', 'Hamburguesa', 'Pizza', 'Lasaña', 'Empanada',
+    'Crème brûlée', 'Ají de gallina', 'Ceviche', 'Sándwich', 'Tostada', 'Ensalada',
+    'Pollo asado', 'Jamón serrano', 'Piña colada', 'Churrasco', 'Puré', 'Crepé',
+]
+STYLES = [
+    'de la casa', 'con leche', 'doble', 'especial', 'al jugo', 'criolla', 'vegana',
+    'a la plancha', 'con queso', 'sin azúcar', 'picante', 'tradicional', 'del chef',
+]
+INGREDIENTS = [
+    'jamón', 'queso', 'champiñones', 'palta', 'tomate', 'piña', 'maracuyá', 'limón',
+    'azúcar', 'orégano', 'ají', 'cebolla', 'atún', 'salmón', 'plátano', 'maní',
+]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de la búsqueda del menú sobre un menú sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000, help='Items del menú sintético')
+        parser.add_argument('--queries', type=int, default=2000, help='Búsquedas a medir')
+        parser.add_argument('--limit', type=int, default=10, help='Resultados por búsqueda')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        limit = options['limit']
+
+        entries = [self.synthetic_item(rng, item_id) for item_id in range(1, options['items'] + 1)]
+        queries = [self.synthetic_query(rng) for _ in range(options['queries'])]
+
+        started = time.perf_counter()
+        index = MenuSearchIndex(entries)
+        build_seconds = time.perf_counter() - started
+
+        folded = [
+            (entry, fold_text(entry['name']), fold_text(entry['description']))
+            for entry in entries
+        ]
+
+        index_times, index_hits = self.measure(queries, lambda query: index.search(query, limit=limit))
+        scan_times, scan_hits = self.measure(queries, lambda query: self.scan(folded, query, limit))
+
+        self.stdout.write(f"Items: {len(entries)}, búsquedas: {len(queries)}")
+        self.stdout.write(f"Construcción del índice: {build_seconds * 1000:.0f} ms")
+        self.report('Índice de trigramas', index_times, index_hits)
+        self.report('Recorrido completo', scan_times, scan_hits)
+        self.stdout.write(self.style.SUCCESS(
+            f"Aceleración (p50): {statistics.median(scan_times) / statistics.median(index_times):.1f}x"
+        ))
+
+    def synthetic_item(self, rng, item_id):
+        name = f"{rng.choice(DISHES)} {rng.choice(STYLES)}"
+        description = ', '.join(rng.sample(INGREDIENTS, 3))
+        return {
+            'id': item_id,
+            'name': f"{name} {item_id}",
+            'description': f"Con {description}",
+            'category_id': item_id % 12,
+            'category_name': f"Categoría {item_id % 12}",
+            'price': Decimal(rng.randrange(1000, 50000, 500)),
+            'display_order': item_id,
+            'is_available': rng.random() > 0.05,
+        }
+
+    def synthetic_query(self, rng):
+        # Lo que se escribe en una terminal: sin tildes y muchas veces a medias
+        words = fold_text(f"{rng.choice(DISHES)} {rng.choice(STYLES + INGREDIENTS)}").split()
+        query = ' '.join(words[:rng.randint(1, 2)])
+        return query[:rng.randint(2, len(query))]
+
+    def scan(self, folded, query, limit):
+        tokens = fold_text(query).split()
+        results = []
+        for entry, name, description in folded:
+            if not entry['is_available']:
+                continue
+            scores = [match_score(token, name, description) for token in tokens]
+            if all(scores):
+                results.append((sum(scores), entry))
+        results.sort(key=lambda result: (-result[0], result[1]['display_order']))
+        return results[:limit]
+
+    def measure(self, queries, search):
+        times = []
+        hits = 0
+        for query in queries:
+            started = time.perf_counter()
+            hits += bool(search(query))
+            times.append(time.perf_counter() - started)
+        return times, hits
+
+    def report(self, label, times, hits):
+        ordered = sorted(times)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        self.stdout.write(
+            f"{label}: p50 {statistics.median(times) * 1e6:.0f} µs, p95 {p95 * 1e6:.0f} µs, "
+            f"{len(times) / sum(times):.0f} búsquedas/s, {hits} con resultados"
+        )
@@ -0,0 +1,23 @@
+"""
+Recalcula MenuItem.search_text de todos los items.
+
+MenuItem.save() lo mantiene al día; este comando sirve para llenarlo después
+de agregar la columna o si se editaron items con UPDATE directo.
+
+Uso:
+    python manage.py rebuild_menu_search
+"""
+
+from django.core.management.base import BaseCommand
+from menu.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el texto de búsqueda plegado de los items del menú'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Items por UPDATE')
+
+    def handle(self, *args, **options):
+        updated = MenuItem.objects.all().refresh_search_text(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"search_text recalculado en {updated} items"))
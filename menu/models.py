@@ -1,6 +1,10 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from .bom import invalidate_bom
+from .costing import mark_cost_dirty, recalculate_costs
+from .search import build_search_text
+from .snapshot import invalidate_menu_snapshot
 
 
 class MenuCategory(models.Model):
@@ -19,6 +23,47 @@ class MenuCategory(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_menu_snapshot()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_menu_snapshot()
+        return result
+
+
+class MenuItemQuerySet(models.QuerySet):
+
+    def with_profit_margin(self):
+        """
+        Anota `margin`: el margen de ganancia en porcentaje calculado en la
+        base de datos, con la misma regla que MenuItem.profit_margin (0 si el
+        item no tiene costo). Permite filtrar, ordenar y paginar por margen en SQL.
+        """
+        return self.annotate(margin=models.Case(
+            models.When(
+                cached_cost__gt=0,
+                then=(models.F('price') - models.F('cached_cost')) * Decimal('100') / models.F('price')
+            ),
+            default=models.Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=4)
+        ))
+
+    def refresh_search_text(self, batch_size=1000):
+        """Recalcula search_text de los items del queryset (p. ej. después de migrar)"""
+        updated = 0
+        batch = []
+        for item in self.only('id', 'name', 'description').iterator(chunk_size=batch_size):
+            item.search_text = build_search_text(item.name, item.description)
+            batch.append(item)
+            if len(batch) >= batch_size:
+                updated += self.model.objects.bulk_update(batch, ['search_text'])
+                batch = []
+        if batch:
+            updated += self.model.objects.bulk_update(batch, ['search_text'])
+        return updated
+
 
 class MenuItem(models.Model):
     """Items del menú (platos/productos que el cliente puede ordenar)"""
@@ -27,6 +72,9 @@ class MenuItem(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
     
+    # Nombre y descripción sin mayúsculas ni acentos para la búsqueda (ver menu/search.py)
+    search_text = models.TextField(blank=True, editable=False)
+    
     # El costo se calcula sumando los costos de todos los componentes
     cached_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
@@ -40,6 +88,8 @@ class MenuItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MenuItemQuerySet.as_manager()
+
     class Meta:
         ordering = ['category', 'display_order', 'name']
         indexes = [
@@ -49,14 +99,24 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.name} - ${self.price}"
 
+    def save(self, *args, **kwargs):
+        self.search_text = build_search_text(self.name, self.description)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'description'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+        invalidate_menu_snapshot()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_menu_snapshot()
+        return result
+
     def calculate_cost(self):
-        """Calcula el costo total sumando todos los componentes"""
-        total = Decimal('0')
-        for component in self.components.all():
-            total += component.get_cost()
-        self.cached_cost = total
-        self.save(update_fields=['cached_cost'])
-        return total
+        """Calcula el costo total sumando todos los componentes (un UPDATE agregado)"""
+        recalculate_costs(MenuItem.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['cached_cost'])
+        return self.cached_cost
 
     @property
     def profit_margin(self):
@@ -114,6 +174,16 @@ class MenuItemComponent(models.Model):
             raise ValueError("No puede tener product_id y recipe_id al mismo tiempo")
         
         super().save(*args, **kwargs)
+        invalidate_bom(self.menu_item_id)
+        
+        # Recalcular el costo del MenuItem padre (al salir de defer_cost_recalc si está activo)
+        if not mark_cost_dirty(self.menu_item_id):
+            self.menu_item.calculate_cost()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_bom(self.menu_item_id)
         
-        # Recalcular el costo del MenuItem padre
-        self.menu_item.calculate_cost()
+        if not mark_cost_dirty(self.menu_item_id):
+            self.menu_item.calculate_cost()
+        return result
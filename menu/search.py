@@ -0,0 +1,187 @@
+"""
+Búsqueda de items del menú sin distinguir mayúsculas ni acentos.
+
+Los textos se "pliegan" con fold_text(): minúsculas, sin tildes ni diéresis
+(café -> cafe, piña -> pina) y con la puntuación convertida en espacios.
+
+- En la base de datos, MenuItem.search_text guarda el nombre y la
+  descripción plegados y el parámetro `search` del listado filtra sobre esa
+  columna, ordenando primero los items cuyo nombre empieza con lo buscado.
+- Para el autocompletado de las terminales, MenuSearchIndex es un índice
+  invertido de trigramas en memoria. Cada proceso lo arma con una consulta y
+  lo reconstruye cuando cambia la versión del snapshot del menú
+  (menu/snapshot.py), así que las búsquedas no consultan la base de datos.
+  Sin cache compartido (MENU_SNAPSHOT_CACHE inactivo) los cambios hechos en
+  otros procesos no cambian la versión, así que el índice se reconstruye cada
+  MENU_SEARCH_INDEX_TTL segundos.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import F
+
+NGRAM_SIZE = 3
+
+_non_word = re.compile(r'[\W_]+')
+
+
+def fold_text(text):
+    """Texto en minúsculas, sin acentos y con palabras separadas por un espacio"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _non_word.sub(' ', stripped.casefold()).strip()
+
+
+def build_search_text(name, description=''):
+    """Valor de MenuItem.search_text: nombre y descripción plegados, en líneas separadas"""
+    return f"{fold_text(name)}\n{fold_text(description)}"
+
+
+def ngrams(word):
+    return {word[i:i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1)}
+
+
+def match_score(token, name, description):
+    """
+    Relevancia de un término en un item (0 si no aparece). Pesa más el
+    nombre que la descripción y el comienzo de palabra que el medio.
+    """
+    if name == token:
+        return 100
+    if name.startswith(token):
+        return 80
+    if f' {token}' in f' {name}':
+        return 60
+    if token in name:
+        return 40
+    if f' {token}' in f' {description}':
+        return 20
+    if token in description:
+        return 10
+    return 0
+
+
+class MenuSearchIndex:
+    """
+    Índice invertido en memoria de los items del menú.
+
+    Los términos de 3 o más letras se buscan por la intersección de sus
+    trigramas y los de 1-2 letras por prefijo de palabra. Cada candidato se
+    verifica y puntúa con match_score(); un item debe contener todos los
+    términos de la búsqueda.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {}
+        self._grams = defaultdict(set)
+        self._prefixes = defaultdict(set)
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        """
+        Agrega un item: dict con id, name, description, category_id,
+        category_name, price, display_order e is_available.
+        """
+        item_id = entry['id']
+        name = fold_text(entry['name'])
+        description = fold_text(entry.get('description', ''))
+        self.entries[item_id] = dict(entry, _name=name, _description=description)
+
+        for word in set(f'{name} {description}'.split()):
+            for gram in ngrams(word):
+                self._grams[gram].add(item_id)
+            for size in range(1, NGRAM_SIZE):
+                if len(word) >= size:
+                    self._prefixes[word[:size]].add(item_id)
+
+    def _candidates(self, token):
+        if len(token) < NGRAM_SIZE:
+            return self._prefixes.get(token, set())
+        postings = sorted((self._grams.get(gram, set()) for gram in ngrams(token)), key=len)
+        return set.intersection(*postings)
+
+    def search(self, query, limit=10, available_only=True):
+        """Items que coinciden con la búsqueda, del más relevante al menos relevante"""
+        tokens = fold_text(query).split()
+        if not tokens:
+            return []
+
+        candidates = None
+        for token in sorted(tokens, key=len, reverse=True):
+            token_candidates = self._candidates(token)
+            candidates = token_candidates if candidates is None else candidates & token_candidates
+            if not candidates:
+                return []
+
+        results = []
+        for item_id in candidates:
+            entry = self.entries[item_id]
+            if available_only and not entry['is_available']:
+                continue
+            score = 0
+            for token in tokens:
+                token_score = match_score(token, entry['_name'], entry['_description'])
+                if not token_score:
+                    break
+                score += token_score
+            else:
+                results.append((score, entry))
+
+        best = heapq.nsmallest(
+            limit, results, key=lambda result: (-result[0], result[1]['display_order'], result[1]['_name'])
+        )
+        return [
+            {key: value for key, value in entry.items() if not key.startswith('_')} | {'score': score}
+            for score, entry in best
+        ]
+
+
+_index_lock = threading.Lock()
+_index = {'version': None, 'index': None}
+
+
+def build_search_index():
+    """Índice con los items de las categorías activas (una consulta)"""
+    from .models import MenuItem
+
+    entries = MenuItem.objects.filter(category__is_active=True).values(
+        'id', 'name', 'description', 'category_id', 'price', 'display_order', 'is_available',
+        category_name=F('category__name')
+    )
+    return MenuSearchIndex(entries)
+
+
+def index_version():
+    """
+    Versión del menú con cache compartido; sin él, el intervalo de
+    MENU_SEARCH_INDEX_TTL segundos actual, que acota cuánto puede atrasarse
+    el índice respecto de los cambios hechos en otros procesos
+    """
+    from . import snapshot
+
+    if snapshot.menu_version.enabled():
+        return snapshot.menu_version.current()
+    ttl = getattr(settings, 'MENU_SEARCH_INDEX_TTL', 30)
+    return ('ttl', int(time.monotonic() // ttl))
+
+
+def get_search_index():
+    """Índice del proceso; se reconstruye cuando cambia la versión del menú"""
+    version = index_version()
+    if _index['index'] is not None and _index['version'] == version:
+        return _index['index']
+
+    with _index_lock:
+        if _index['index'] is None or _index['version'] != version:
+            _index['index'] = build_search_index()
+            _index['version'] = version
+        return _index['index']
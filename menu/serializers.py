@@ -1,5 +1,41 @@
+from django.db import models
 from rest_framework import serializers
 from .models import MenuCategory, MenuItem, MenuItemComponent
+from .bom import invalidate_bom
+from .costing import defer_cost_recalc, mark_cost_dirty
+from .component_names import ComponentNameResolver
+
+
+def prefetched(instance, relation):
+    """Objetos de una relación cargada con prefetch_related; [] si no se precargó"""
+    prefetched_objects = getattr(instance, '_prefetched_objects_cache', {})
+    if relation in prefetched_objects:
+        return prefetched_objects[relation]
+    return []
+
+
+def component_name_resolver(serializer):
+    """Resolver de nombres compartido por todos los serializers de una respuesta"""
+    return serializer.context.setdefault('component_names', ComponentNameResolver())
+
+
+class ComponentNamesListSerializer(serializers.ListSerializer):
+    """
+    Lista que resuelve juntos los nombres de todos los componentes que va a
+    serializar. El serializer hijo define components_of(instance) con los
+    componentes ya precargados de cada elemento.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        instances = list(data)
+        component_name_resolver(self).prime(
+            component
+            for instance in instances
+            for component in self.child.components_of(instance)
+        )
+        return super().to_representation(instances)
 
 
 class MenuItemComponentSerializer(serializers.ModelSerializer):
@@ -12,24 +48,14 @@ class MenuItemComponentSerializer(serializers.ModelSerializer):
                   'quantity', 'cached_unit_cost', 'total_cost', 'component_name',
                   'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = ComponentNamesListSerializer
 
     def get_component_name(self, obj):
         """Obtener el nombre del producto o receta desde catalog_mirror"""
-        from catalog_mirror.models import MirroredProduct, MirroredRecipe
-        
-        if obj.component_type == 'product' and obj.product_id:
-            try:
-                product = MirroredProduct.objects.get(original_id=obj.product_id)
-                return product.name
-            except MirroredProduct.DoesNotExist:
-                return f"Producto #{obj.product_id}"
-        elif obj.component_type == 'recipe' and obj.recipe_id:
-            try:
-                recipe = MirroredRecipe.objects.get(original_id=obj.recipe_id)
-                return recipe.name
-            except MirroredRecipe.DoesNotExist:
-                return f"Receta #{obj.recipe_id}"
-        return "Desconocido"
+        return component_name_resolver(self).name(obj)
+
+    def components_of(self, component):
+        return [component]
 
     def get_total_cost(self, obj):
         return obj.get_cost()
@@ -61,6 +87,10 @@ class MenuItemSerializer(serializers.ModelSerializer):
                   'is_available', 'display_order', 'preparation_time', 
                   'components', 'created_at', 'updated_at']
         read_only_fields = ['cached_cost', 'created_at', 'updated_at']
+        list_serializer_class = ComponentNamesListSerializer
+
+    def components_of(self, item):
+        return prefetched(item, 'components')
 
 
 class MenuItemCreateUpdateSerializer(serializers.ModelSerializer):
@@ -77,10 +107,12 @@ class MenuItemCreateUpdateSerializer(serializers.ModelSerializer):
         components_data = validated_data.pop('components', [])
         menu_item = MenuItem.objects.create(**validated_data)
         
-        for component_data in components_data:
-            MenuItemComponent.objects.create(menu_item=menu_item, **component_data)
+        # El costo se recalcula una sola vez, después de crear todos los componentes
+        with defer_cost_recalc():
+            for component_data in components_data:
+                MenuItemComponent.objects.create(menu_item=menu_item, **component_data)
         
-        menu_item.calculate_cost()
+        menu_item.refresh_from_db(fields=['cached_cost'])
         return menu_item
 
     def update(self, instance, validated_data):
@@ -91,12 +123,15 @@ class MenuItemCreateUpdateSerializer(serializers.ModelSerializer):
         instance.save()
         
         if components_data is not None:
-            # Eliminar componentes existentes y crear nuevos
-            instance.components.all().delete()
-            for component_data in components_data:
-                MenuItemComponent.objects.create(menu_item=instance, **component_data)
+            with defer_cost_recalc():
+                # Eliminar componentes existentes y crear nuevos
+                instance.components.all().delete()
+                invalidate_bom(instance.id)
+                mark_cost_dirty(instance.id)
+                for component_data in components_data:
+                    MenuItemComponent.objects.create(menu_item=instance, **component_data)
             
-            instance.calculate_cost()
+            instance.refresh_from_db(fields=['cached_cost'])
         
         return instance
 
@@ -0,0 +1,107 @@
+"""
+Snapshot versionado del menú público (endpoint items/available).
+
+El menú disponible se arma una vez por versión: se serializa a JSON, se
+comprime con gzip y se guarda en el cache de Django junto con su ETag (hash
+del contenido) y su versión. Se guarda siempre bajo la misma clave, así que
+el cache tiene un solo menú aunque la versión cambie con cada evento de
+stock. Cada proceso además recuerda el último snapshot, así que
+mientras la versión no cambie las terminales se atienden sin consultar la
+base de datos.
+
+Los cambios de categorías, items, componentes y costos llaman a
+invalidate_menu_snapshot(), que incrementa la versión al confirmarse la
+transacción. El siguiente request arma el snapshot nuevo.
+
+La versión vive en el cache de Django, así que reutilizar el snapshot
+requiere un cache compartido (MENU_SNAPSHOT_CACHE, activo por defecto solo
+con CACHE_URL): con el cache en memoria de cada proceso los cambios hechos
+en otro worker o en Celery no llegarían a los demás. Sin él cada request
+arma el snapshot desde la base de datos; el ETag sigue evitando transferir
+el menú a las terminales que ya lo tienen.
+"""
+
+import gzip
+import hashlib
+import threading
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from orders_service.versioning import CacheVersion
+
+SNAPSHOT_KEY = 'menu:snapshot'
+
+menu_version = CacheVersion('menu:snapshot:version', 'MENU_SNAPSHOT_CACHE')
+
+_local_lock = threading.Lock()
+_local = {'version': None, 'snapshot': None}
+
+
+def invalidate_menu_snapshot():
+    """Marca el snapshot como obsoleto cuando se confirme la transacción actual"""
+    menu_version.invalidate()
+
+
+def build_available_menu():
+    """Categorías activas con sus items disponibles, como las retorna el endpoint"""
+    from .models import MenuCategory, MenuItem
+    from .serializers import MenuItemSerializer
+
+    items = MenuItem.objects.filter(
+        is_available=True,
+        category__is_active=True
+    ).select_related('category').prefetch_related('components').order_by(
+        'category__display_order', 'display_order', 'name'
+    )
+
+    items_by_category = {}
+    for item in items:
+        items_by_category.setdefault(item.category_id, []).append(item)
+
+    categories = MenuCategory.objects.filter(
+        id__in=items_by_category.keys()
+    ).order_by('display_order', 'name')
+
+    return [
+        {
+            'id': category.id,
+            'name': category.name,
+            'description': category.description,
+            'items': MenuItemSerializer(items_by_category[category.id], many=True).data
+        }
+        for category in categories
+    ]
+
+
+def build_snapshot(version):
+    body = JSONRenderer().render(build_available_menu())
+    return {
+        'version': version,
+        'etag': f'"{hashlib.sha1(body).hexdigest()}"',
+        'body': body,
+        'gzip': gzip.compress(body),
+    }
+
+
+def get_menu_snapshot():
+    """Snapshot vigente: de la memoria del proceso, del cache o recién armado"""
+    if not menu_version.enabled():
+        return build_snapshot(None)
+
+    version = menu_version.current()
+
+    snapshot = _local['snapshot']
+    if snapshot is not None and _local['version'] == version:
+        return snapshot
+
+    with _local_lock:
+        if _local['snapshot'] is not None and _local['version'] == version:
+            return _local['snapshot']
+
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is None or snapshot['version'] != version:
+            snapshot = build_snapshot(version)
+            cache.set(SNAPSHOT_KEY, snapshot, timeout=None)
+
+        _local['version'] = version
+        _local['snapshot'] = snapshot
+        return snapshot
@@ -0,0 +1,39 @@
+from celery import shared_task
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name='menu.recalculate_all_costs')
+def recalculate_all_costs(self):
+    """
+    Recalcula el costo de todos los items del menú con un único UPDATE
+    agregado (SUM de quantity * cached_unit_cost por item).
+    
+    Mientras corre, el estado del job es PROGRESS con la hora de inicio; al
+    terminar el resultado incluye los items actualizados y la duración.
+    """
+    from django.utils import timezone
+    from .costing import recalculate_costs
+    from .models import MenuItem
+    
+    started_at = timezone.now()
+    if self.request.id:
+        self.update_state(state='PROGRESS', meta={
+            'progress': 0,
+            'started_at': started_at.isoformat(),
+        })
+    
+    started = time.perf_counter()
+    updated = recalculate_costs(MenuItem.objects.all())
+    duration_ms = (time.perf_counter() - started) * 1000
+    
+    logger.info(f"Costos recalculados para {updated} items en {duration_ms:.0f} ms")
+    return {
+        'progress': 100,
+        'total_items': updated,
+        'started_at': started_at.isoformat(),
+        'finished_at': timezone.now().isoformat(),
+        'duration_ms': round(duration_ms, 1),
+    }
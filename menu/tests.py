@@ -1,9 +1,22 @@
-from django.test import TestCase
+import gzip
+from unittest.mock import MagicMock, patch
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
 from .models import MenuCategory, MenuItem, MenuItemComponent
+from . import component_names
+from .bom import get_boms, stock_deductions
+from .costing import defer_cost_recalc, propagate_component_costs
+from .serializers import MenuItemCreateUpdateSerializer, MenuItemSerializer
+from .search import MenuSearchIndex, fold_text, get_search_index
+from .snapshot import SNAPSHOT_KEY, get_menu_snapshot, menu_version
+from .tasks import recalculate_all_costs
+from catalog_mirror.models import MirroredProduct, MirroredRecipe
 
 
 class MenuCategoryModelTest(TestCase):
@@ -53,6 +66,180 @@ class MenuItemModelTest(TestCase):
         self.assertLess(margin, Decimal('47'))
 
 
+@override_settings(MENU_BOM_CACHE=True)
+class MenuBOMTest(TestCase):
+    """Tests para la lista de materiales aplanada de los items"""
+    
+    def setUp(self):
+        cache.clear()
+        self.category = MenuCategory.objects.create(name="Platos Fuertes", display_order=1)
+        self.burger = MenuItem.objects.create(category=self.category, name="Hamburguesa", price=Decimal('8000'))
+        self.fries = MenuItem.objects.create(category=self.category, name="Papas", price=Decimal('3000'))
+        MenuItemComponent.objects.create(
+            menu_item=self.burger, component_type='product', product_id=7, quantity=Decimal('0.150')
+        )
+        MenuItemComponent.objects.create(
+            menu_item=self.burger, component_type='recipe', recipe_id=3, quantity=Decimal('1')
+        )
+        MenuItemComponent.objects.create(
+            menu_item=self.fries, component_type='product', product_id=7, quantity=Decimal('0.050')
+        )
+    
+    def test_bom_cached(self):
+        """Test que la BOM se calcula con una consulta y luego sale del cache"""
+        with self.assertNumQueries(1):
+            boms = get_boms([self.burger.id, self.fries.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_boms([self.burger.id, self.fries.id]), boms)
+        
+        self.assertEqual(boms[self.burger.id]['products'], {7: Decimal('0.150')})
+        self.assertEqual(boms[self.burger.id]['recipes'], {3: Decimal('1')})
+    
+    @override_settings(MENU_BOM_CACHE=False)
+    def test_bom_not_cached_without_shared_cache(self):
+        """Test que sin cache compartido la BOM se calcula en cada llamada"""
+        with self.assertNumQueries(1):
+            boms = get_boms([self.burger.id, self.fries.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(get_boms([self.burger.id, self.fries.id]), boms)
+    
+    def test_bom_invalidated_when_components_change(self):
+        """Test que cambiar o eliminar componentes invalida la BOM"""
+        get_boms([self.burger.id])
+        
+        component = self.burger.components.get(component_type='product')
+        component.quantity = Decimal('0.200')
+        component.save()
+        self.assertEqual(get_boms([self.burger.id])[self.burger.id]['products'], {7: Decimal('0.200')})
+        
+        component.delete()
+        self.assertEqual(get_boms([self.burger.id])[self.burger.id]['products'], {})
+    
+    def test_deductions_summed_per_product(self):
+        """Test que un producto usado en varios items aparece una sola vez"""
+        deductions = stock_deductions([
+            (self.burger.id, 2), (self.fries.id, 1), (self.burger.id, 1)
+        ])
+        
+        self.assertEqual(deductions['products'], [{'product_id': 7, 'quantity': 0.5}])
+        self.assertEqual(deductions['recipes'], [{'recipe_id': 3, 'quantity': 3.0}])
+
+
+class CostPropagationTest(TestCase):
+    """Tests para la propagación de costos del catálogo espejo"""
+    
+    def setUp(self):
+        self.category = MenuCategory.objects.create(name="Platos Fuertes", display_order=1)
+        self.items = MenuItem.objects.bulk_create([
+            MenuItem(category=self.category, name=f"Plato {n}", price=Decimal('10000'))
+            for n in range(150)
+        ])
+        MenuItemComponent.objects.bulk_create([
+            MenuItemComponent(menu_item=item, component_type='product', product_id=1,
+                              quantity=Decimal('0.5'), cached_unit_cost=Decimal('1000'))
+            for item in self.items
+        ] + [
+            MenuItemComponent(menu_item=self.items[0], component_type='recipe', recipe_id=9,
+                              quantity=Decimal('2'), cached_unit_cost=Decimal('100')),
+        ])
+        self.other = MenuItem.objects.create(category=self.category, name="Otro", price=Decimal('5000'))
+        MirroredProduct.objects.create(original_id=1, name="Carne", unit_cost=Decimal('3000'))
+        MirroredRecipe.objects.create(original_id=9, name="Salsa", cost_per_unit=Decimal('250'))
+    
+    def test_product_change_uses_two_updates(self):
+        """Test que un producto usado en muchos platos se propaga con dos UPDATE"""
+        with self.assertNumQueries(2):
+            updated = propagate_component_costs(product_ids=[1])
+        
+        self.assertEqual(updated, 150)
+        self.assertEqual(MenuItem.objects.get(id=self.items[1].id).cached_cost, Decimal('1500'))
+        # El componente receta conserva su costo hasta que cambie la receta
+        self.assertEqual(MenuItem.objects.get(id=self.items[0].id).cached_cost, Decimal('1700'))
+        self.assertEqual(MenuItem.objects.get(id=self.other.id).cached_cost, Decimal('0'))
+    
+    def test_recipe_change_only_touches_its_items(self):
+        """Test que un cambio de receta solo recalcula los items que la usan"""
+        updated = propagate_component_costs(recipe_ids=[9])
+        
+        self.assertEqual(updated, 1)
+        component = MenuItemComponent.objects.get(recipe_id=9)
+        self.assertEqual(component.cached_unit_cost, Decimal('250'))
+        self.assertEqual(MenuItem.objects.get(id=self.items[0].id).cached_cost, Decimal('1000'))
+
+
+class DeferCostRecalcTest(TestCase):
+    """Tests para el recálculo de costos postergado en ediciones masivas"""
+    
+    def setUp(self):
+        self.category = MenuCategory.objects.create(name="Platos Fuertes", display_order=1)
+        self.item = MenuItem.objects.create(category=self.category, name="Lomo", price=Decimal('15000'))
+    
+    def _add_components(self, count, first_id=1):
+        for n in range(count):
+            MenuItemComponent.objects.create(
+                menu_item=self.item, component_type='product', product_id=first_id + n,
+                quantity=Decimal('1'), cached_unit_cost=Decimal('100')
+            )
+    
+    def _cost_updates(self, queries):
+        """UPDATE agregados que recalculan cached_cost"""
+        table = MenuItem._meta.db_table
+        return [q for q in queries if q['sql'].startswith(f'UPDATE "{table}"') and 'SUM(' in q['sql']]
+    
+    def test_item_recalculated_once(self):
+        """Test que varios componentes escritos en el bloque recalculan el item una vez"""
+        with CaptureQueriesContext(connection) as queries:
+            with defer_cost_recalc():
+                self._add_components(5)
+        
+        self.assertEqual(len(self._cost_updates(queries.captured_queries)), 1)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cached_cost, Decimal('500'))
+    
+    def test_nested_blocks_recalculate_on_outer_exit(self):
+        """Test que un bloque anidado no recalcula hasta salir del externo"""
+        with defer_cost_recalc():
+            with defer_cost_recalc():
+                self._add_components(2)
+            self.item.refresh_from_db()
+            self.assertEqual(self.item.cached_cost, Decimal('0'))
+        
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cached_cost, Decimal('200'))
+    
+    def test_decorator_and_exception(self):
+        """Test del uso como decorador y que una excepción no recalcula"""
+        @defer_cost_recalc()
+        def add_and_fail():
+            self._add_components(1)
+            raise ValueError
+        
+        with self.assertRaises(ValueError):
+            add_and_fail()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cached_cost, Decimal('0'))
+        
+        defer_cost_recalc()(self._add_components)(1, first_id=2)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cached_cost, Decimal('200'))
+    
+    def test_serializer_replaces_components_with_one_recalc(self):
+        """Test que el serializer reemplaza componentes y recalcula el costo una vez"""
+        self._add_components(3)
+        serializer = MenuItemCreateUpdateSerializer(self.item, data={
+            'components': [
+                {'component_type': 'product', 'product_id': 9, 'quantity': '2', 'cached_unit_cost': '50'},
+            ]
+        }, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        
+        with CaptureQueriesContext(connection) as queries:
+            item = serializer.save()
+        
+        self.assertEqual(item.cached_cost, Decimal('100'))
+        self.assertEqual(len(self._cost_updates(queries.captured_queries)), 1)
+
+
 class MenuCategoryAPITest(TestCase):
     """Tests para la API de MenuCategory"""
     
@@ -124,3 +311,389 @@ class MenuItemAPITest(TestCase):
         """Test recalcular costo de item"""
         response = self.client.post(f'/api/menu/items/{self.item.id}/recalculate_cost/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RecalculateAllCostsJobTest(TestCase):
+    """Tests para el recálculo de costos de todo el menú en segundo plano"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.category = MenuCategory.objects.create(name="Test Category", display_order=1)
+        self.items = MenuItem.objects.bulk_create([
+            MenuItem(category=self.category, name=f"Plato {n}", price=Decimal('10000'))
+            for n in range(20)
+        ])
+        MenuItemComponent.objects.bulk_create([
+            MenuItemComponent(menu_item=item, component_type='product', product_id=1,
+                              quantity=Decimal('2'), cached_unit_cost=Decimal('300'))
+            for item in self.items
+        ])
+    
+    def test_task_uses_one_update(self):
+        """Test que el job recalcula todo el menú con un solo UPDATE"""
+        with self.assertNumQueries(1):
+            result = recalculate_all_costs.run()
+        
+        self.assertEqual(result['total_items'], 20)
+        self.assertEqual(result['progress'], 100)
+        self.assertIn('duration_ms', result)
+        self.assertFalse(MenuItem.objects.exclude(cached_cost=Decimal('600')).exists())
+    
+    def test_endpoint_returns_job_id(self):
+        """Test que el endpoint encola el job y responde de inmediato"""
+        with patch('menu.tasks.recalculate_all_costs.delay', return_value=MagicMock(id='job-1')) as delay:
+            response = self.client.post('/api/pos/menu/items/recalculate_all_costs/')
+        
+        delay.assert_called_once_with()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['job_id'], 'job-1')
+        self.assertTrue(response.data['status_url'].endswith('/recalculate_all_costs/job-1/'))
+    
+    def test_status_endpoint(self):
+        """Test que el estado del job informa avance y duración"""
+        job = MagicMock(state='SUCCESS', result={'progress': 100, 'total_items': 20, 'duration_ms': 3.5})
+        with patch('menu.views.AsyncResult', return_value=job) as async_result:
+            response = self.client.get('/api/pos/menu/items/recalculate_all_costs/job-1/')
+        
+        async_result.assert_called_once_with('job-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'SUCCESS')
+        self.assertEqual(response.data['duration_ms'], 3.5)
+        
+        job = MagicMock(state='PROGRESS', info={'progress': 0, 'started_at': '2025-01-01T00:00:00'})
+        with patch('menu.views.AsyncResult', return_value=job):
+            response = self.client.get('/api/pos/menu/items/recalculate_all_costs/job-1/')
+        self.assertEqual(response.data['started_at'], '2025-01-01T00:00:00')
+
+
+class LowMarginTest(TestCase):
+    """Tests para el filtro de margen de ganancia en la base de datos"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.category = MenuCategory.objects.create(name="Test Category", display_order=1)
+        # Márgenes: 50%, 10%, 5%, 0% (sin costo) y 15%
+        for name, cost in [('A', '5000'), ('B', '9000'), ('C', '9500'), ('D', '0'), ('E', '8500')]:
+            MenuItem.objects.create(
+                category=self.category, name=name, price=Decimal('10000'), cached_cost=Decimal(cost)
+            )
+    
+    def test_annotation_matches_property(self):
+        """Test que el margen anotado coincide con profit_margin"""
+        for item in MenuItem.objects.with_profit_margin():
+            self.assertAlmostEqual(float(item.margin), float(item.profit_margin), places=2)
+    
+    def test_low_margin_filtered_and_sorted_in_sql(self):
+        """Test que low_margin filtra y ordena por margen en la base de datos"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/pos/menu/items/low_margin/?threshold=12')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([item['name'] for item in response.data['items']], ['D', 'C', 'B'])
+        self.assertEqual(response.data['items'][2]['profit_margin'], 10.0)
+    
+    def test_low_margin_range(self):
+        """Test de un rango de margen"""
+        response = self.client.get('/api/pos/menu/items/low_margin/?min_margin=5&threshold=20')
+        
+        self.assertEqual([item['name'] for item in response.data['items']], ['C', 'B', 'E'])
+        
+        response = self.client.get('/api/pos/menu/items/low_margin/?threshold=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MENU_SNAPSHOT_CACHE=True)
+class MenuSnapshotTest(TestCase):
+    """Tests para el snapshot precompilado del menú disponible"""
+    
+    url = '/api/pos/menu/items/available/'
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.drinks = MenuCategory.objects.create(name="Bebidas", display_order=2)
+        self.mains = MenuCategory.objects.create(name="Platos", display_order=1)
+        MenuCategory.objects.create(name="Inactiva", display_order=0, is_active=False)
+        MirroredProduct.objects.create(
+            original_id=1, name="Carne", sku="CAR-1", unit_cost=Decimal('2000'),
+            current_stock=Decimal('10'), unit_of_measure='kg'
+        )
+        self.burger = MenuItem.objects.create(
+            category=self.mains, name="Hamburguesa", price=Decimal('10000')
+        )
+        MenuItemComponent.objects.create(
+            menu_item=self.burger, component_type='product', product_id=1,
+            quantity=Decimal('0.5'), cached_unit_cost=Decimal('2000')
+        )
+        MenuItem.objects.create(category=self.drinks, name="Jugo", price=Decimal('3000'))
+        MenuItem.objects.create(
+            category=self.drinks, name="Agotado", price=Decimal('3000'), is_available=False
+        )
+    
+    def test_snapshot_matches_live_menu(self):
+        """Test que el snapshot tiene el mismo contenido que el menú armado en vivo"""
+        snapshot = self.client.get(self.url)
+        live = self.client.get(self.url, {'is_available': 'true'})
+        
+        self.assertEqual(snapshot.status_code, status.HTTP_200_OK)
+        self.assertEqual(snapshot.json(), live.json())
+        self.assertEqual([category['name'] for category in snapshot.json()], ['Platos', 'Bebidas'])
+        self.assertEqual(snapshot.json()[0]['items'][0]['components'][0]['component_name'], 'Carne')
+    
+    def test_served_without_queries(self):
+        """Test que un snapshot ya armado se sirve sin consultar la base de datos"""
+        self.client.get(self.url)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_etag_and_gzip(self):
+        """Test de If-None-Match (304) y del cuerpo precomprimido"""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        etag = response['ETag']
+        
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), get_menu_snapshot()['body'])
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+    
+    def test_rebuilt_after_changes(self):
+        """Test que cambios del menú, categorías y costos generan un snapshot nuevo"""
+        etags = {self.client.get(self.url)['ETag']}
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.burger.price = Decimal('12000')
+            self.burger.save()
+        etags.add(self.client.get(self.url)['ETag'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drinks.name = "Refrescos"
+            self.drinks.save()
+        etags.add(self.client.get(self.url)['ETag'])
+        
+        MirroredProduct.objects.filter(original_id=1).update(unit_cost=Decimal('3000'))
+        with self.captureOnCommitCallbacks(execute=True):
+            propagate_component_costs(product_ids=[1])
+        response = self.client.get(self.url)
+        etags.add(response['ETag'])
+        
+        self.assertEqual(len(etags), 4)
+        self.assertEqual(response.json()[0]['items'][0]['cached_cost'], '1500.00')
+        self.assertEqual(response.json()[1]['name'], 'Refrescos')
+        
+        # Cada versión reemplaza a la anterior bajo la misma clave del cache
+        cached = cache.get(SNAPSHOT_KEY)
+        self.assertEqual(cached['version'], menu_version.current())
+        self.assertEqual(cached['etag'], response['ETag'])
+    
+    def test_not_rebuilt_before_commit(self):
+        """Test que el snapshot no cambia hasta que se confirma la transacción"""
+        etag = self.client.get(self.url)['ETag']
+        
+        with self.captureOnCommitCallbacks(execute=False):
+            self.burger.name = "Hamburguesa doble"
+            self.burger.save()
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+    
+    @override_settings(MENU_SNAPSHOT_CACHE=False)
+    def test_built_per_request_without_shared_cache(self):
+        """Test que sin cache compartido se ven los cambios hechos por otro proceso"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        
+        # Un cambio sin invalidación local, como el de otro worker con su propio cache
+        MenuItem.objects.filter(pk=self.burger.pk).update(name="Hamburguesa doble")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['items'][0]['name'], "Hamburguesa doble")
+
+
+@override_settings(MENU_COMPONENT_NAMES_CACHE=True)
+class ComponentNameResolutionTest(TestCase):
+    """Tests para la resolución en lote de nombres de componentes"""
+    
+    def setUp(self):
+        cache.clear()
+        self.category = MenuCategory.objects.create(name="Platos", display_order=1)
+        for original_id in range(1, 6):
+            MirroredProduct.objects.create(
+                original_id=original_id, name=f"Producto {original_id}", sku=f"P-{original_id}",
+                unit_cost=Decimal('100'), current_stock=Decimal('10'), unit_of_measure='kg'
+            )
+        MirroredRecipe.objects.create(
+            original_id=1, name="Salsa", production_cost=Decimal('1000'),
+            yield_quantity=Decimal('10'), yield_unit='porción'
+        )
+        for index in range(10):
+            item = MenuItem.objects.create(category=self.category, name=f"Item {index}", price=Decimal('5000'))
+            MenuItemComponent.objects.create(
+                menu_item=item, component_type='product', product_id=index % 5 + 1, quantity=Decimal('1')
+            )
+            MenuItemComponent.objects.create(
+                menu_item=item, component_type='recipe', recipe_id=1, quantity=Decimal('1')
+            )
+        MenuItemComponent.objects.create(
+            menu_item=item, component_type='product', product_id=99, quantity=Decimal('1')
+        )
+    
+    def serialize(self):
+        items = MenuItem.objects.select_related('category').prefetch_related('components')
+        return MenuItemSerializer(items, many=True).data
+    
+    def test_names_resolved_in_batch(self):
+        """Test que los nombres de toda la lista se resuelven con dos consultas IN"""
+        # items + componentes + productos + recetas
+        with self.assertNumQueries(4):
+            data = self.serialize()
+        
+        self.assertEqual(data[0]['components'][0]['component_name'], 'Producto 1')
+        self.assertEqual(data[0]['components'][1]['component_name'], 'Salsa')
+        self.assertEqual(data[9]['components'][2]['component_name'], 'Producto #99')
+        
+        # Los nombres salen del LRU del proceso; el faltante se vuelve a buscar
+        with self.assertNumQueries(3):
+            self.serialize()
+    
+    def test_invalidated_by_catalog_update(self):
+        """Test que la actualización del catálogo descarta los nombres cacheados"""
+        self.serialize()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            MirroredProduct.objects.filter(original_id=1).update(name="Carne")
+            component_names.invalidate_component_names(product_ids=[1])
+        
+        self.assertEqual(self.serialize()[0]['components'][0]['component_name'], 'Carne')
+    
+    def test_invalidated_in_other_processes(self):
+        """Test que otro proceso vacía su LRU cuando cambia la versión compartida"""
+        self.serialize()
+        MirroredProduct.objects.filter(original_id=1).update(name="Carne")
+        
+        # Solo se incrementa la versión, como lo vería un proceso distinto
+        component_names.names_version.bump()
+        
+        self.assertEqual(self.serialize()[0]['components'][0]['component_name'], 'Carne')
+    
+    @override_settings(MENU_COMPONENT_NAMES_CACHE=False)
+    def test_resolved_per_request_without_shared_cache(self):
+        """Test que sin cache compartido los nombres se buscan en cada serialización"""
+        self.serialize()
+        MirroredProduct.objects.filter(original_id=1).update(name="Carne")
+        
+        with self.assertNumQueries(4):
+            data = self.serialize()
+        self.assertEqual(data[0]['components'][0]['component_name'], 'Carne')
+    
+    def test_lru_bounded(self):
+        """Test que el LRU descarta los nombres usados hace más tiempo"""
+        lru = component_names.ComponentNameLRU(maxsize=2)
+        lru.set_many({('product', 1): 'A', ('product', 2): 'B'})
+        lru.get_many([('product', 1)])
+        lru.set_many({('product', 3): 'C'})
+        
+        self.assertEqual(len(lru), 2)
+        self.assertEqual(lru.get_many([('product', 1), ('product', 2), ('product', 3)]),
+                         {('product', 1): 'A', ('product', 3): 'C'})
+
+
+@override_settings(MENU_SNAPSHOT_CACHE=True)
+class MenuSearchTest(TestCase):
+    """Tests para la búsqueda sin acentos del menú"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.category = MenuCategory.objects.create(name="Bebidas", display_order=1)
+        self.latte = MenuItem.objects.create(
+            category=self.category, name="Café con leche", description="Espresso y leche", price=Decimal('2500')
+        )
+        self.cake = MenuItem.objects.create(
+            category=self.category, name="Torta de chocolate", description="Con café", price=Decimal('3000')
+        )
+        self.iced = MenuItem.objects.create(
+            category=self.category, name="Frappé de café", price=Decimal('3500')
+        )
+        MenuItem.objects.create(category=self.category, name="Piña colada", price=Decimal('4000'))
+        MenuItem.objects.create(
+            category=self.category, name="Café irlandés", price=Decimal('4500'), is_available=False
+        )
+    
+    def test_fold_text(self):
+        """Test que el texto queda sin acentos, en minúsculas y sin puntuación"""
+        self.assertEqual(fold_text("  Crème Brûlée, PIÑA-colada! "), 'creme brulee pina colada')
+        self.assertEqual(self.latte.search_text, "cafe con leche\nespresso y leche")
+    
+    def test_list_search_ignores_accents(self):
+        """Test que ?search=cafe encuentra los items con café, primero por nombre"""
+        response = self.client.get('/api/pos/menu/items/', {'search': 'CAFE'})
+        
+        names = [item['name'] for item in response.data['results']]
+        self.assertEqual(names[0], 'Café con leche')
+        self.assertEqual(names[-1], 'Torta de chocolate')
+        self.assertEqual(len(names), 4)
+    
+    def test_type_ahead_ranked(self):
+        """Test del autocompletado: nombre antes que descripción y sin items no disponibles"""
+        response = self.client.get('/api/pos/menu/items/search/', {'q': 'caf'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['name'] for item in response.data['results']],
+            ['Café con leche', 'Frappé de café', 'Torta de chocolate']
+        )
+        
+        response = self.client.get('/api/pos/menu/items/search/', {'q': 'pi co'})
+        self.assertEqual([item['name'] for item in response.data['results']], ['Piña colada'])
+    
+    def test_index_served_from_memory(self):
+        """Test que el índice se arma una vez y se reconstruye cuando cambia el menú"""
+        get_search_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_search_index().search('leche')), 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.iced.name = "Frappé de leche"
+            self.iced.save()
+        
+        self.assertEqual(len(get_search_index().search('leche')), 2)
+    
+    @override_settings(MENU_SNAPSHOT_CACHE=False, MENU_SEARCH_INDEX_TTL=30)
+    def test_index_expires_without_shared_cache(self):
+        """Test que sin cache compartido el índice se rearma al vencer su TTL"""
+        with patch('menu.search.time.monotonic', return_value=3000.0):
+            get_search_index()
+            # Un cambio de otro proceso no invalida el índice de este
+            MenuItem.objects.filter(pk=self.iced.pk).update(name="Frappé de leche")
+            with self.assertNumQueries(0):
+                self.assertEqual(len(get_search_index().search('leche')), 1)
+        
+        with patch('menu.search.time.monotonic', return_value=3030.0):
+            self.assertEqual(len(get_search_index().search('leche')), 2)
+    
+    def test_index_requires_every_term(self):
+        """Test que todos los términos de la búsqueda deben aparecer"""
+        index = MenuSearchIndex([
+            {'id': 1, 'name': 'Jamón serrano', 'description': '', 'display_order': 0, 'is_available': True},
+            {'id': 2, 'name': 'Jamón y queso', 'description': '', 'display_order': 0, 'is_available': True},
+        ])
+        
+        self.assertEqual([item['id'] for item in index.search('jamon queso')], [2])
+        self.assertEqual(index.search('pollo'), [])
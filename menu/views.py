@@ -2,14 +2,27 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Count, Sum
+import re
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from celery.result import AsyncResult
 from .models import MenuCategory, MenuItem, MenuItemComponent
+from .costing import defer_cost_recalc
+from .search import fold_text, get_search_index
+from .snapshot import get_menu_snapshot
 from .serializers import (
     MenuCategorySerializer, MenuCategoryListSerializer,
     MenuItemSerializer, MenuItemCreateUpdateSerializer,
     MenuItemComponentSerializer
 )
 
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+# Filtros de get_queryset; con cualquiera de ellos el menú se arma en vivo
+LIVE_MENU_PARAMS = ('category', 'is_available', 'search')
+
 
 class MenuCategoryViewSet(viewsets.ModelViewSet):
     """
@@ -38,6 +51,10 @@ class MenuCategoryViewSet(viewsets.ModelViewSet):
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
+        # El detalle incluye los items con sus componentes
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('items__components')
+        
         return queryset.order_by('display_order', 'name')
 
     @action(detail=True, methods=['get'])
@@ -81,13 +98,18 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         if is_available is not None:
             queryset = queryset.filter(is_available=is_available.lower() == 'true')
         
-        # Buscar por nombre
-        search = self.request.query_params.get('search')
+        # Buscar por nombre o descripción, sin distinguir mayúsculas ni acentos
+        search = fold_text(self.request.query_params.get('search', ''))
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search)
+            queryset = queryset.filter(search_text__contains=search).annotate(
+                search_rank=Case(
+                    When(search_text__startswith=search, then=Value(0)),
+                    When(search_text__contains=f' {search}', then=Value(1)),
+                    default=Value(2),
+                    output_field=IntegerField()
+                )
             )
+            return queryset.order_by('search_rank', 'category__display_order', 'display_order', 'name')
         
         return queryset.order_by('category__display_order', 'display_order', 'name')
 
@@ -112,8 +134,8 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         serializer = MenuItemComponentSerializer(data=request.data)
         
         if serializer.is_valid():
-            serializer.save(menu_item=item)
-            item.calculate_cost()
+            with defer_cost_recalc():
+                serializer.save(menu_item=item)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -132,8 +154,9 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         
         try:
             component = item.components.get(id=component_id)
-            component.delete()
-            item.calculate_cost()
+            with defer_cost_recalc():
+                component.delete()
+            item.refresh_from_db(fields=['cached_cost'])
             
             return Response({
                 'message': 'Componente eliminado exitosamente',
@@ -147,7 +170,35 @@ class MenuItemViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def available(self, request):
-        """Obtener solo los items disponibles (para el menú público)"""
+        """
+        Obtener solo los items disponibles (para el menú público).
+        
+        Sin filtros se sirve el snapshot precompilado (menu/snapshot.py) con
+        ETag: si el cliente envía If-None-Match con la versión vigente se
+        responde 304, y si acepta gzip se envía el cuerpo ya comprimido.
+        """
+        if any(param in request.query_params for param in LIVE_MENU_PARAMS):
+            return self._available_live()
+        
+        snapshot = get_menu_snapshot()
+        etag = snapshot['etag']
+        
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        elif ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+            response = HttpResponse(snapshot['gzip'], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(snapshot['body'], content_type='application/json')
+        
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        # Las terminales siempre revalidan; un 304 no transfiere el menú
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def _available_live(self):
+        """Menú disponible filtrado, armado desde la base de datos"""
         items = self.get_queryset().filter(is_available=True)
         
         # Agrupar por categoría
@@ -168,42 +219,115 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         
         return Response(data)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Autocompletado para las terminales: items que coinciden con `q`
+        ordenados por relevancia, desde el índice en memoria del proceso.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response(
+                {'error': 'limit debe ser un número entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        include_unavailable = request.query_params.get('include_unavailable', '').lower() == 'true'
+        
+        results = get_search_index().search(query, limit=limit, available_only=not include_unavailable)
+        
+        return Response({
+            'query': query,
+            'count': len(results),
+            'results': results,
+        })
+
     @action(detail=False, methods=['post'])
     def recalculate_all_costs(self, request):
-        """Recalcular los costos de todos los items del menú"""
-        items = self.get_queryset()
-        count = 0
+        """
+        Recalcular los costos de todos los items del menú en segundo plano.
+        Retorna el ID del job; el avance se consulta en
+        recalculate_all_costs/<job_id>/.
+        """
+        from .tasks import recalculate_all_costs
         
-        for item in items:
-            item.calculate_cost()
-            count += 1
+        job = recalculate_all_costs.delay()
         
         return Response({
-            'message': f'Se recalcularon los costos de {count} items',
-            'total_items': count
-        })
+            'job_id': job.id,
+            'status': 'PENDING',
+            'status_url': request.build_absolute_uri(f'{job.id}/'),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'recalculate_all_costs/(?P<job_id>[\w-]+)')
+    def recalculate_all_costs_status(self, request, job_id=None):
+        """Estado, avance y duración de un job de recálculo de costos"""
+        job = AsyncResult(job_id)
+        data = {
+            'job_id': job_id,
+            'status': job.state,
+        }
+        
+        if job.state == 'SUCCESS':
+            data.update(job.result)
+        elif job.state == 'PROGRESS':
+            data.update(job.info or {})
+        elif job.state == 'FAILURE':
+            data['error'] = str(job.result)
+        else:
+            data['progress'] = 0
+        
+        return Response(data)
 
     @action(detail=False, methods=['get'])
     def low_margin(self, request):
-        """Obtener items con bajo margen de ganancia"""
-        threshold = float(request.query_params.get('threshold', 20))  # 20% por defecto
-        
-        items = []
-        for item in self.get_queryset():
-            if item.profit_margin < threshold:
-                items.append({
-                    'id': item.id,
-                    'name': item.name,
-                    'price': item.price,
-                    'cost': item.cached_cost,
-                    'profit_margin': float(item.profit_margin),
-                })
+        """
+        Obtener items con bajo margen de ganancia, del menor al mayor margen.
+        El margen se calcula, filtra y pagina en la base de datos.
         
-        return Response({
+        Parámetros: threshold (20 por defecto, margen máximo exclusivo) y
+        min_margin (opcional, margen mínimo inclusivo).
+        """
+        try:
+            threshold = float(request.query_params.get('threshold', 20))  # 20% por defecto
+            min_margin = request.query_params.get('min_margin')
+            min_margin = float(min_margin) if min_margin is not None else None
+        except ValueError:
+            return Response(
+                {'error': 'threshold y min_margin deben ser números'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        items = self.get_queryset().prefetch_related(None).with_profit_margin().filter(
+            margin__lt=threshold
+        )
+        if min_margin is not None:
+            items = items.filter(margin__gte=min_margin)
+        items = items.order_by('margin', 'id').values('id', 'name', 'price', 'cached_cost', 'margin')
+        
+        page = self.paginate_queryset(items)
+        rows = page if page is not None else items
+        data = [
+            {
+                'id': item['id'],
+                'name': item['name'],
+                'price': item['price'],
+                'cost': item['cached_cost'],
+                'profit_margin': float(item['margin']),
+            }
+            for item in rows
+        ]
+        
+        response = {
             'threshold': threshold,
-            'count': len(items),
-            'items': items
-        })
+            'count': self.paginator.page.paginator.count if page is not None else len(data),
+            'items': data,
+        }
+        if page is not None:
+            response['next'] = self.paginator.get_next_link()
+            response['previous'] = self.paginator.get_previous_link()
+        return Response(response)
 
 
 class MenuItemComponentViewSet(viewsets.ModelViewSet):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem, Payment
+from .models import Order, OrderItem, OutboxEvent, Payment
 
 
 class OrderItemInline(admin.TabularInline):
@@ -23,7 +23,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at', 'table__zone']
     search_fields = ['order_number', 'customer_name', 'customer_phone']
     ordering = ['-created_at']
-    readonly_fields = ['order_number', 'subtotal', 'tax', 'total', 'is_fully_paid',
+    readonly_fields = ['order_number', 'subtotal', 'tax', 'total', 'amount_paid', 'is_fully_paid',
                        'created_at', 'started_at', 'completed_at', 'updated_at']
     inlines = [OrderItemInline, PaymentInline]
     
@@ -35,7 +35,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('customer_name', 'customer_phone', 'notes')
         }),
         ('Totales', {
-            'fields': ('subtotal', 'tax', 'total', 'is_fully_paid')
+            'fields': ('subtotal', 'tax', 'total', 'amount_paid', 'is_fully_paid')
         }),
         ('Tiempos', {
             'fields': ('created_at', 'started_at', 'completed_at', 'updated_at'),
@@ -85,3 +85,12 @@ class PaymentAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('order')
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'routing_key', 'created_at', 'sent_at', 'attempts']
+    list_filter = ['event_type', 'sent_at']
+    ordering = ['-id']
+    readonly_fields = ['event_type', 'routing_key', 'payload', 'created_at', 'sent_at',
+                       'attempts', 'last_error']
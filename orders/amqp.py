@@ -0,0 +1,266 @@
+"""
+Publicación de mensajes en RabbitMQ.
+
+RabbitMQPublisher mantiene una conexión y un canal de larga duración por
+proceso (ver get_publisher()): la conexión se abre con el primer mensaje, se
+reabre sola si el broker la cerró o si el proceso se bifurcó (workers de
+Celery con prefork) y el exchange se declara una sola vez. Con confirmaciones
+del broker (RABBITMQ_PUBLISHER_CONFIRMS) publish() retorna cuando el broker
+aceptó el mensaje y lanza PublishError si lo rechazó o si la conexión falló.
+
+Para tests y benchmarks sin RabbitMQ:
+- LocalPublisher reemplaza al publicador completo; con `available = False`
+  simula una caída.
+- LocalAMQPBroker reemplaza la conexión de pika (connection_factory) y simula
+  el costo del handshake de cada conexión nueva.
+"""
+
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EVENTS_EXCHANGE = 'restaurant_events'
+
+
+class PublishError(Exception):
+    """El broker no confirmó el mensaje"""
+    pass
+
+
+def pika_connection():
+    """Conexión bloqueante a RabbitMQ con la configuración del proyecto"""
+    import pika
+
+    credentials = pika.PlainCredentials(
+        settings.RABBITMQ_USER,
+        settings.RABBITMQ_PASSWORD
+    )
+    return pika.BlockingConnection(
+        pika.ConnectionParameters(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            credentials=credentials
+        )
+    )
+
+
+def pika_properties(message_id=None):
+    """Propiedades de un mensaje persistente en JSON"""
+    import pika
+
+    return pika.BasicProperties(
+        delivery_mode=2,  # Mensaje persistente
+        content_type='application/json',
+        message_id=message_id
+    )
+
+
+class RabbitMQPublisher:
+    """Publica mensajes persistentes en el exchange de eventos sobre una conexión reutilizable"""
+
+    def __init__(self, exchange=EVENTS_EXCHANGE, confirm=None,
+                 connection_factory=None, properties_factory=None):
+        self.exchange = exchange
+        self.confirm = getattr(settings, 'RABBITMQ_PUBLISHER_CONFIRMS', True) if confirm is None else confirm
+        self._connection_factory = connection_factory or pika_connection
+        self._properties_factory = properties_factory or pika_properties
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._channel = None
+        self._exchange_declared = False
+        self.connections_opened = 0
+
+    def _connect(self):
+        """Abre la conexión y el canal; el exchange se declara solo la primera vez"""
+        self._connection = self._connection_factory()
+        self._pid = os.getpid()
+        self.connections_opened += 1
+
+        channel = self._connection.channel()
+        if not self._exchange_declared:
+            channel.exchange_declare(
+                exchange=self.exchange,
+                exchange_type='topic',
+                durable=True
+            )
+            self._exchange_declared = True
+        if self.confirm:
+            channel.confirm_delivery()
+        self._channel = channel
+
+    def _channel_is_usable(self):
+        if self._channel is None or self._pid != os.getpid():
+            return False
+        if self._channel.is_closed or not self._connection.is_open:
+            return False
+        try:
+            # Atiende heartbeats pendientes y detecta conexiones cerradas por el broker
+            self._connection.process_data_events(time_limit=0)
+        except Exception:
+            return False
+        return self._channel.is_open
+
+    def publish(self, routing_key, body, message_id=None):
+        """
+        Publica un mensaje (y espera la confirmación del broker si está activa).
+        Si la conexión reutilizada falló se reconecta y reintenta una vez.
+        """
+        properties = self._properties_factory(message_id)
+
+        with self._lock:
+            for attempt in range(2):
+                reused = self._channel_is_usable()
+                try:
+                    if not reused:
+                        self._discard()
+                        self._connect()
+                    self._channel.basic_publish(
+                        exchange=self.exchange,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties
+                    )
+                    return
+                except Exception as e:
+                    self._discard()
+                    if reused and attempt == 0:
+                        logger.info(f"Reconectando publicador AMQP: {str(e) or e.__class__.__name__}")
+                        continue
+                    raise PublishError(str(e) or e.__class__.__name__) from e
+
+    def _discard(self):
+        """Olvida la conexión actual, cerrándola si pertenece a este proceso"""
+        connection = self._connection
+        owned = self._pid == os.getpid()
+        self._connection = None
+        self._channel = None
+        if connection is not None and owned and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._discard()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """
+    Publicador compartido por el proceso. Después de un fork el hijo no usa
+    la conexión heredada: abre la suya con el primer mensaje.
+    """
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = RabbitMQPublisher()
+        return _publisher
+
+
+class LocalPublisher:
+    """Publicador de reemplazo en memoria para tests y benchmarks"""
+
+    def __init__(self):
+        self.available = True
+        self.messages = []
+
+    def publish(self, routing_key, body, message_id=None):
+        if not self.available:
+            raise PublishError("Broker no disponible")
+        self.messages.append({
+            'routing_key': routing_key,
+            'body': body,
+            'message_id': message_id,
+        })
+
+    def close(self):
+        pass
+
+
+class LocalAMQPBroker:
+    """
+    Broker AMQP de reemplazo en memoria. `connect` se usa como
+    connection_factory del publicador y tarda `handshake_ms` por conexión,
+    como el handshake TCP + AMQP de una conexión real.
+    """
+
+    def __init__(self, handshake_ms=0):
+        self.handshake_ms = handshake_ms
+        self.available = True
+        self.connections_opened = 0
+        self.exchanges_declared = 0
+        self.messages = []
+        self._connections = []
+
+    def connect(self):
+        if not self.available:
+            raise ConnectionError("Broker no disponible")
+        if self.handshake_ms:
+            time.sleep(self.handshake_ms / 1000)
+        self.connections_opened += 1
+        connection = _LocalConnection(self)
+        self._connections.append(connection)
+        return connection
+
+    def drop_connections(self):
+        """Cierra todas las conexiones abiertas, como un reinicio del broker"""
+        for connection in self._connections:
+            connection.is_open = False
+        self._connections = []
+
+
+class _LocalConnection:
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+
+    def channel(self):
+        return _LocalChannel(self)
+
+    def process_data_events(self, time_limit=0):
+        if not self.is_open:
+            raise ConnectionError("Conexión cerrada por el broker")
+
+    def close(self):
+        self.is_open = False
+
+
+class _LocalChannel:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @property
+    def is_open(self):
+        return self.connection.is_open
+
+    @property
+    def is_closed(self):
+        return not self.connection.is_open
+
+    def exchange_declare(self, exchange, exchange_type, durable):
+        self.connection.broker.exchanges_declared += 1
+
+    def confirm_delivery(self):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        broker = self.connection.broker
+        if not self.connection.is_open or not broker.available:
+            raise ConnectionError("Conexión cerrada por el broker")
+        broker.messages.append({
+            'exchange': exchange,
+            'routing_key': routing_key,
+            'body': body,
+            'properties': properties,
+        })
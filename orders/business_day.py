@@ -0,0 +1,32 @@
+"""
+Utilidades para el día de negocio del restaurante.
+
+El día de negocio empieza a la hora POS_BUSINESS_DAY_START_HOUR (hora local),
+de modo que las órdenes tomadas después de medianoche siguen contando para
+el servicio del día anterior.
+"""
+
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.utils import timezone
+
+
+def _start_hour():
+    return getattr(settings, 'POS_BUSINESS_DAY_START_HOUR', 0)
+
+
+def business_day(moment=None):
+    """Retorna la fecha del día de negocio al que pertenece `moment` (por defecto, ahora)"""
+    local = timezone.localtime(moment or timezone.now())
+    return (local - timedelta(hours=_start_hour())).date()
+
+
+def business_day_bounds(day=None):
+    """
+    Retorna el rango [inicio, fin) en datetimes con zona horaria del día de negocio.
+    Sirve para filtrar created_at con comparaciones que aprovechan los índices.
+    """
+    day = day or business_day()
+    start = timezone.make_aware(datetime.combine(day, time(_start_hour())))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time(_start_hour())))
+    return start, end
@@ -1,4 +1,6 @@
 import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
@@ -7,6 +9,16 @@ class KDSConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer para Kitchen Display System (KDS).
     Muestra las órdenes en tiempo real en la cocina.
+    
+    Cada order_update lleva la época del registro de eventos y un número de
+    secuencia `seq`. Al reconectarse el cliente puede enviar
+    ?epoch=...&last_seq=N (los valores del último snapshot/evento aplicado)
+    para recibir solo los eventos perdidos en un mensaje 'resume'. Si está
+    demasiado atrasado recibe 'initial_orders'.
+    Los clientes deben ignorar eventos de su misma época con seq menor o igual
+    al último aplicado; si la época cambia deben pedir un snapshot (reconectar
+    sin last_seq). Sin registro compartido (KDS_STORE_URL vacío) seq es null:
+    se aplican todos los eventos y cada conexión recibe un snapshot.
     """
     
     async def connect(self):
@@ -20,12 +32,24 @@ class KDSConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Enviar órdenes activas al conectarse
-        orders = await self.get_active_orders()
-        await self.send(text_data=json.dumps({
-            'type': 'initial_orders',
-            'orders': orders
-        }))
+        # Reanudar desde la última secuencia si el cliente la indica
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        epoch = params.get('epoch', [None])[0]
+        last_seq = params.get('last_seq', [None])[0]
+        
+        if epoch and last_seq and last_seq.isdigit():
+            events = await self.get_missed_events(epoch, int(last_seq))
+            if events is not None:
+                await self.send(text_data=json.dumps({
+                    'type': 'resume',
+                    'epoch': epoch,
+                    'orders': events,
+                }))
+                return
+        
+        # Enviar el tablero actual al conectarse
+        snapshot = await self.get_active_orders()
+        await self.send(text_data=snapshot.decode())
     
     async def disconnect(self, close_code):
         # Salir del grupo
@@ -51,49 +75,31 @@ class KDSConsumer(AsyncWebsocketConsumer):
                 'message': str(e)
             }))
     
-    async def order_update(self, event):
+    async def order_batch(self, event):
         """
-        Enviar actualización de orden al KDS
+        Enviar al KDS las órdenes actualizadas en la última ventana de agrupación
         """
-        await self.send(text_data=json.dumps({
-            'type': 'order_update',
-            'order_id': event['order_id'],
-            'order_number': event['order_number'],
-            'status': event['status'],
-            'items': event['items'],
-            'table': event['table'],
-            'created_at': event['created_at'],
-        }))
+        for order in event['orders']:
+            await self.send(text_data=json.dumps({
+                'type': 'order_update',
+                **order,
+            }))
+    
+    @sync_to_async
+    def get_missed_events(self, epoch, last_seq):
+        """Eventos posteriores a last_seq, o None si hay que enviar un snapshot"""
+        from .kds_store import get_kds_store
+        return get_kds_store().events_since(epoch, last_seq)
     
     @database_sync_to_async
     def get_active_orders(self):
-        """Obtener órdenes activas para el KDS"""
-        from .models import Order
-        
-        orders = Order.objects.filter(
-            status__in=['pending', 'preparing']
-        ).select_related('table').prefetch_related('items__menu_item')
-        
-        orders_data = []
-        for order in orders:
-            orders_data.append({
-                'order_id': order.id,
-                'order_number': order.order_number,
-                'status': order.status,
-                'table': order.table.number if order.table else None,
-                'items': [
-                    {
-                        'id': item.id,
-                        'menu_item_name': item.menu_item.name,
-                        'quantity': item.quantity,
-                        'notes': item.notes,
-                    }
-                    for item in order.items.all()
-                ],
-                'created_at': order.created_at.isoformat(),
-            })
-        
-        return orders_data
+        """
+        Snapshot serializado del tablero (mensaje 'initial_orders' con época y
+        secuencia). Con el registro de Redis es compartido y solo se consulta
+        la base de datos la primera vez que se arma el tablero.
+        """
+        from .kds import kds_snapshot
+        return kds_snapshot()
     
     @database_sync_to_async
     def update_order_status(self, order_id, new_status):
@@ -103,11 +109,9 @@ class KDSConsumer(AsyncWebsocketConsumer):
         try:
             order = Order.objects.get(id=order_id)
             order.status = new_status
+            # save() hace el broadcast a todos los clientes si el estado cambió
             order.save()
             
-            # Broadcast a todos los clientes conectados
-            order.broadcast_to_kds()
-            
             return True
         except Order.DoesNotExist:
             return False
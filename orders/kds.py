@@ -0,0 +1,198 @@
+"""
+Envío de actualizaciones de órdenes al KDS (Kitchen Display System).
+
+Las escrituras no envían nada directamente: marcan la orden como pendiente
+de notificar. Al confirmarse la transacción la orden entra a la ventana de
+agrupación (KDS_BROADCAST_WINDOW_MS) y al cerrarse la ventana se arman los
+payloads de todas las órdenes pendientes con una sola consulta con prefetch
+y se envían al grupo 'kds' en un único mensaje.
+
+Con un registro de eventos compartido (ver orders/kds_store.py) cada orden
+enviada recibe un número de secuencia para que los clientes que se
+reconectan puedan pedir solo lo que se perdieron, y el registro mantiene el
+tablero materializado que reciben las pantallas nuevas y el endpoint REST.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from .kds_store import BOARD_STATUSES, get_kds_store
+
+logger = logging.getLogger(__name__)
+
+KDS_GROUP = 'kds'
+
+
+def serialize_kds_order(order):
+    """Payload de una orden para el KDS (requiere items y menu_item precargados)"""
+    return {
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'status': order.status,
+        'table': order.table.number if order.table else None,
+        'items': [
+            {
+                'id': item.id,
+                'menu_item_name': item.menu_item.name,
+                'quantity': item.quantity,
+                'notes': item.notes,
+            }
+            for item in order.items.all()
+        ],
+        'created_at': order.created_at.isoformat(),
+    }
+
+
+def kds_orders_queryset():
+    """Órdenes con todo lo que necesita el payload del KDS precargado"""
+    from .models import Order, OrderItem
+
+    return Order.objects.select_related('table').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+    )
+
+
+def build_kds_payloads(order_ids):
+    """
+    Arma los payloads de varias órdenes con una consulta para órdenes y otra
+    para items. Las órdenes que ya no existen se envían con estado 'deleted'
+    para que salgan del tablero.
+    """
+    orders = kds_orders_queryset().filter(id__in=order_ids).order_by('created_at')
+    payloads = [serialize_kds_order(order) for order in orders]
+    found = {payload['order_id'] for payload in payloads}
+    payloads.extend(
+        {'order_id': order_id, 'status': 'deleted'}
+        for order_id in sorted(set(order_ids) - found)
+    )
+    return payloads
+
+
+def build_kds_board():
+    """Payloads de las órdenes que se muestran en el tablero del KDS"""
+    orders = kds_orders_queryset().filter(status__in=BOARD_STATUSES).order_by('created_at')
+    return [serialize_kds_order(order) for order in orders]
+
+
+def kds_snapshot():
+    """Snapshot serializado (bytes) del tablero del KDS, compartido por todas las pantallas"""
+    return get_kds_store().snapshot(build_kds_board)
+
+
+class KDSBroadcaster:
+    """Agrupa las órdenes modificadas y las envía al KDS una vez por ventana"""
+
+    def __init__(self, window_ms=None, group=KDS_GROUP):
+        self._window_ms = window_ms
+        self.group = group
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._first_marked_at = None
+        self._timer = None
+        self._exit_hook = False
+        self._stats = {
+            'flushes': 0,
+            'orders_sent': 0,
+            'last_latency_ms': 0.0,
+            'max_latency_ms': 0.0,
+            'total_latency_ms': 0.0,
+        }
+
+    @property
+    def window_ms(self):
+        if self._window_ms is not None:
+            return self._window_ms
+        return getattr(settings, 'KDS_BROADCAST_WINDOW_MS', 100)
+
+    def mark_dirty(self, order_id):
+        """Marca una orden para enviarla al KDS cuando se confirme la transacción"""
+        transaction.on_commit(lambda: self._enqueue(order_id))
+
+    def _enqueue(self, order_id):
+        window_ms = self.window_ms
+        with self._lock:
+            if not self._pending:
+                self._first_marked_at = time.perf_counter()
+            self._pending.add(order_id)
+
+            if window_ms > 0 and self._timer is None:
+                self._timer = threading.Timer(window_ms / 1000, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+                if not self._exit_hook:
+                    # El timer es daemon: si el worker termina dentro de la
+                    # ventana, las órdenes pendientes se envían al salir
+                    atexit.register(self._safe_flush)
+                    self._exit_hook = True
+
+        if window_ms <= 0:
+            self._safe_flush()
+
+    def _safe_flush(self):
+        """
+        flush() sin lanzar excepciones: corre después de confirmada la
+        transacción, así que un channel layer caído no debe romper la request
+        """
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error enviando actualizaciones al KDS: {str(e)}")
+
+    def _flush_from_timer(self):
+        try:
+            self._safe_flush()
+        finally:
+            # El hilo del timer abre su propia conexión a la base de datos
+            connection.close()
+
+    def flush(self):
+        """Envía ahora todas las órdenes pendientes en un solo mensaje"""
+        with self._lock:
+            order_ids = self._pending
+            first_marked_at = self._first_marked_at
+            self._pending = set()
+            self._first_marked_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not order_ids:
+            return
+
+        orders = get_kds_store().append(build_kds_payloads(order_ids))
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(
+            self.group,
+            {
+                'type': 'order_batch',
+                'orders': orders,
+            }
+        )
+
+        latency_ms = (time.perf_counter() - first_marked_at) * 1000
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['orders_sent'] += len(orders)
+            self._stats['last_latency_ms'] = latency_ms
+            self._stats['max_latency_ms'] = max(self._stats['max_latency_ms'], latency_ms)
+            self._stats['total_latency_ms'] += latency_ms
+
+        logger.debug(f"KDS: {len(orders)} órdenes enviadas en {latency_ms:.1f} ms")
+
+    def stats(self):
+        """Métricas de envío: cantidad de flushes, órdenes enviadas y latencia desde el primer cambio"""
+        with self._lock:
+            stats = dict(self._stats)
+        total_latency_ms = stats.pop('total_latency_ms')
+        stats['avg_latency_ms'] = total_latency_ms / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
+
+
+# Broadcaster compartido por el proceso
+kds_broadcaster = KDSBroadcaster()
@@ -0,0 +1,279 @@
+"""
+Registro de eventos del KDS con números de secuencia.
+
+Cada actualización de orden enviada al KDS recibe un número de secuencia
+creciente y queda en un registro acotado (KDS_EVENT_LOG_SIZE eventos). Un
+cliente que se reconecta indica la última secuencia que aplicó y recibe solo
+los eventos que se perdió; si ya no están en el registro, o la época del
+registro cambió (reinicio del proceso o de Redis), recibe un snapshot.
+
+El registro de Redis también mantiene el tablero del KDS materializado: las
+órdenes en BOARD_STATUSES indexadas por id, actualizadas con cada evento
+registrado. El snapshot (mensaje 'initial_orders') se serializa una sola vez
+y se entrega como bytes a todas las conexiones nuevas y al endpoint REST
+hasta que llegue el siguiente evento. El tablero se construye desde la base
+de datos solo la primera vez que se pide. Los registros locales no guardan
+el tablero: lo arman desde la base de datos en cada snapshot, porque no ven
+los cambios hechos en otros procesos.
+
+Las secuencias solo sirven si todos los procesos que envían eventos al KDS
+las toman del mismo registro. Cada evento lleva la época del registro para
+que los clientes detecten un cambio de registro.
+
+Backends:
+- Redis (KDS_STORE_URL=redis://...): registro compartido entre los workers
+  HTTP, Celery y Daphne.
+- Memoria (KDS_STORE_URL=memory://): un registro por proceso. Sirve solo
+  cuando las escrituras y los WebSockets viven en el mismo proceso
+  (runserver, tests).
+- Sin registro (KDS_STORE_URL vacío): los eventos se envían sin secuencia
+  (seq null), no se puede reanudar y cada snapshot se arma desde la base de
+  datos. Con varios workers cada proceso numeraría sus eventos por su cuenta
+  y los clientes descartarían actualizaciones reales.
+"""
+
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Estados de las órdenes que se muestran en el tablero del KDS
+BOARD_STATUSES = ('pending', 'preparing')
+
+
+def encode_snapshot(epoch, seq, board):
+    """Serializa el tablero como el mensaje 'initial_orders' del KDS"""
+    orders = sorted(board, key=lambda order: (order['created_at'], order['order_id']))
+    return json.dumps({
+        'type': 'initial_orders',
+        'epoch': epoch,
+        'seq': seq,
+        'orders': orders,
+    }).encode()
+
+
+class LocalKDSStore:
+    """Sin registro compartido: eventos sin secuencia y snapshot desde la base de datos"""
+
+    sequenced = False
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex
+
+    def current_seq(self):
+        return None
+
+    def append(self, orders):
+        return [{'epoch': self.epoch, 'seq': None, **order} for order in orders]
+
+    def snapshot(self, build_board):
+        return encode_snapshot(self.epoch, None, build_board())
+
+    def events_since(self, epoch, last_seq):
+        # Sin registro no hay eventos que reenviar: siempre snapshot
+        return None
+
+
+class MemoryKDSStore:
+    """Registro de eventos del KDS en memoria del proceso"""
+
+    sequenced = True
+
+    def __init__(self, max_events=500):
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex
+        self._seq = 0
+        self._events = deque(maxlen=max_events)
+
+    def current_seq(self):
+        with self._lock:
+            return self._seq
+
+    def append(self, orders):
+        """Asigna una secuencia a cada payload de orden, los registra y los retorna como eventos"""
+        events = []
+        with self._lock:
+            for order in orders:
+                self._seq += 1
+                event = {'epoch': self.epoch, 'seq': self._seq, **order}
+                self._events.append(event)
+                events.append(event)
+        return events
+
+    def snapshot(self, build_board):
+        """
+        Snapshot serializado del tablero, armado desde la base de datos en cada
+        llamada: las órdenes que cambian otros procesos (workers, Celery) no
+        pasan por este registro. El lock mantiene la secuencia del snapshot
+        consistente con los eventos registrados por este proceso.
+        """
+        with self._lock:
+            return encode_snapshot(self.epoch, self._seq, build_board())
+
+    def events_since(self, epoch, last_seq):
+        """
+        Eventos con secuencia mayor a `last_seq`, o None si el cliente necesita
+        un snapshot (otra época, secuencia desconocida o eventos ya descartados).
+        """
+        with self._lock:
+            if epoch != self.epoch or last_seq > self._seq:
+                return None
+            if last_seq == self._seq:
+                return []
+            if not self._events or self._events[0]['seq'] > last_seq + 1:
+                return None
+            return [event for event in self._events if event['seq'] > last_seq]
+
+
+class RedisKDSStore:
+    """Registro de eventos del KDS compartido en Redis"""
+
+    sequenced = True
+
+    # Asigna secuencias, registra los eventos y actualiza el tablero (si ya
+    # fue construido) de forma atómica
+    APPEND_SCRIPT = """
+    local board_statuses = {}
+    for _, status in ipairs(cjson.decode(ARGV[2])) do
+        board_statuses[status] = true
+    end
+    local board_ready = redis.call('EXISTS', KEYS[4]) == 1
+    local events = {}
+    for i, order in ipairs(ARGV) do
+        if i > 3 then
+            local seq = redis.call('INCR', KEYS[1])
+            local event = '{"epoch": "' .. ARGV[3] .. '", "seq": ' .. seq .. ', ' .. string.sub(order, 2)
+            redis.call('ZADD', KEYS[2], seq, event)
+            table.insert(events, event)
+            if board_ready then
+                local data = cjson.decode(order)
+                if board_statuses[data.status] then
+                    redis.call('HSET', KEYS[3], tostring(data.order_id), order)
+                else
+                    redis.call('HDEL', KEYS[3], tostring(data.order_id))
+                end
+            end
+        end
+    end
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[1]) + 1))
+    redis.call('DEL', KEYS[5])
+    return events
+    """
+
+    def __init__(self, url, max_events=500, prefix='kds'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.max_events = max_events
+        self.seq_key = f'{prefix}:seq'
+        self.log_key = f'{prefix}:log'
+        self.epoch_key = f'{prefix}:epoch'
+        self.board_key = f'{prefix}:board'
+        self.board_ready_key = f'{prefix}:board_ready'
+        self.blob_key = f'{prefix}:snapshot'
+        self._append = self.redis.register_script(self.APPEND_SCRIPT)
+        self._epoch = None
+
+    @property
+    def epoch(self):
+        # La época se crea una vez por instancia de Redis; si Redis pierde
+        # los datos cambia y los clientes vuelven a pedir un snapshot
+        epoch = self.redis.get(self.epoch_key)
+        if epoch is None:
+            self.redis.set(self.epoch_key, uuid.uuid4().hex, nx=True)
+            epoch = self.redis.get(self.epoch_key)
+        return epoch.decode()
+
+    def current_seq(self):
+        return int(self.redis.get(self.seq_key) or 0)
+
+    def append(self, orders):
+        if not orders:
+            return []
+        payloads = [json.dumps(order) for order in orders]
+        events = self._append(
+            keys=[self.seq_key, self.log_key, self.board_key, self.board_ready_key, self.blob_key],
+            args=[self.max_events, json.dumps(BOARD_STATUSES), self.epoch, *payloads]
+        )
+        return [json.loads(event) for event in events]
+
+    def snapshot(self, build_board, retries=3):
+        """
+        Snapshot serializado del tablero compartido. Si otro proceso registra
+        eventos mientras se arma (cambia la secuencia), se vuelve a intentar;
+        agotados los intentos se entrega el snapshot sin guardarlo.
+        """
+        import redis
+
+        blob = self.redis.get(self.blob_key)
+        if blob is not None:
+            return blob
+
+        epoch = self.epoch
+        with self.redis.pipeline() as pipe:
+            for _ in range(retries):
+                try:
+                    pipe.watch(self.seq_key)
+                    seq = int(pipe.get(self.seq_key) or 0)
+                    built = not pipe.exists(self.board_ready_key)
+                    if built:
+                        board = list(build_board())
+                    else:
+                        board = [json.loads(order) for order in pipe.hvals(self.board_key)]
+                    blob = encode_snapshot(epoch, seq, board)
+
+                    pipe.multi()
+                    if built:
+                        pipe.delete(self.board_key)
+                        if board:
+                            pipe.hset(self.board_key, mapping={
+                                order['order_id']: json.dumps(order) for order in board
+                            })
+                        pipe.set(self.board_ready_key, 1)
+                    pipe.set(self.blob_key, blob)
+                    pipe.execute()
+                    return blob
+                except redis.WatchError:
+                    continue
+        return blob
+
+    def events_since(self, epoch, last_seq):
+        if epoch != self.epoch:
+            return None
+        current = self.current_seq()
+        if last_seq > current:
+            return None
+        if last_seq == current:
+            return []
+        oldest = self.redis.zrange(self.log_key, 0, 0, withscores=True)
+        if not oldest or oldest[0][1] > last_seq + 1:
+            return None
+        events = self.redis.zrangebyscore(self.log_key, f'({last_seq}', '+inf')
+        return [json.loads(event) for event in events]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_kds_store():
+    """Registro de eventos del KDS configurado para el proceso"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            url = getattr(settings, 'KDS_STORE_URL', '')
+            max_events = getattr(settings, 'KDS_EVENT_LOG_SIZE', 500)
+            if url == 'memory://':
+                _store = MemoryKDSStore(max_events=max_events)
+            elif url:
+                _store = RedisKDSStore(url, max_events=max_events)
+            else:
+                logger.warning(
+                    "KDS_STORE_URL no configurado: eventos del KDS sin secuencia ni reanudación"
+                )
+                _store = LocalKDSStore()
+        return _store
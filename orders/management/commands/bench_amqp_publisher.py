@@ -0,0 +1,72 @@
+"""
+Benchmark del publicador AMQP.
+
+Compara abrir una conexión por evento (handshake TCP + AMQP, declaración del
+exchange y cierre en cada mensaje) contra la conexión persistente del
+publicador. Por defecto usa un broker local en memoria que simula el costo
+del handshake; con --rabbitmq publica en el RabbitMQ configurado.
+
+Uso:
+    python manage.py bench_amqp_publisher --events 500 --handshake-ms 5
+    python manage.py bench_amqp_publisher --events 500 --rabbitmq
+"""
+
+import json
+import time
+from django.core.management.base import BaseCommand
+from orders.amqp import LocalAMQPBroker, RabbitMQPublisher
+
+
+class Command(BaseCommand):
+    help = 'Compara una conexión AMQP por evento contra el publicador persistente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=500, help='Mensajes a publicar por modo')
+        parser.add_argument('--handshake-ms', type=float, default=5.0,
+                            help='Costo simulado de abrir una conexión en el broker local')
+        parser.add_argument('--no-confirm', action='store_true', help='Publicar sin confirmaciones del broker')
+        parser.add_argument('--rabbitmq', action='store_true', help='Usar el RabbitMQ configurado')
+
+    def handle(self, *args, **options):
+        events = options['events']
+        confirm = not options['no_confirm']
+
+        if options['rabbitmq']:
+            publisher_options = {}
+        else:
+            broker = LocalAMQPBroker(handshake_ms=options['handshake_ms'])
+            publisher_options = {
+                'connection_factory': broker.connect,
+                'properties_factory': lambda message_id=None: {'message_id': message_id},
+            }
+
+        def body(n):
+            return json.dumps({'event_type': 'BENCH', 'n': n})
+
+        # Conexión por evento, como publicaba antes publish_order_paid
+        started = time.perf_counter()
+        for n in range(events):
+            publisher = RabbitMQPublisher(confirm=confirm, **publisher_options)
+            publisher.publish('pos.bench', body(n))
+            publisher.close()
+        per_event = time.perf_counter() - started
+
+        # Conexión persistente
+        publisher = RabbitMQPublisher(confirm=confirm, **publisher_options)
+        started = time.perf_counter()
+        for n in range(events):
+            publisher.publish('pos.bench', body(n))
+        persistent = time.perf_counter() - started
+        connections = publisher.connections_opened
+        publisher.close()
+
+        self.stdout.write(f"Mensajes por modo: {events}")
+        self.stdout.write(
+            f"Conexión por evento: {per_event:.3f}s ({events / per_event:.0f} eventos/s, "
+            f"{events} conexiones)"
+        )
+        self.stdout.write(
+            f"Conexión persistente: {persistent:.3f}s ({events / persistent:.0f} eventos/s, "
+            f"{connections} conexiones)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Aceleración: {per_event / persistent:.1f}x"))
@@ -0,0 +1,81 @@
+"""
+Benchmark concurrente del asignador de números de orden.
+
+Simula varios workers (un hilo y un asignador por worker) pidiendo números a
+la vez y verifica que no haya colisiones.
+
+Uso:
+    python manage.py bench_order_numbers --workers 8 --orders 4000
+    python manage.py bench_order_numbers --workers 8 --orders 2000 --create
+"""
+
+import threading
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from orders.models import Order
+from orders.numbering import OrderNumberAllocator
+
+
+class Command(BaseCommand):
+    help = 'Mide el throughput del asignador de números de orden y verifica que no haya colisiones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Workers concurrentes')
+        parser.add_argument('--orders', type=int, default=2000, help='Total de números a pedir')
+        parser.add_argument('--block-size', type=int, default=None, help='Tamaño de bloque por worker')
+        parser.add_argument('--create', action='store_true',
+                            help='Crear las órdenes en la base de datos (ejercita el índice único)')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        per_worker = options['orders'] // workers
+        block_size = options['block_size']
+        create = options['create']
+
+        numbers = []
+        errors = []
+        numbers_lock = threading.Lock()
+        start_barrier = threading.Barrier(workers)
+
+        def worker():
+            allocator = OrderNumberAllocator(block_size=block_size)
+            issued = []
+            try:
+                start_barrier.wait()
+                for _ in range(per_worker):
+                    number = allocator.next_number()
+                    if create:
+                        Order.objects.create(order_number=number)
+                    issued.append(number)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+                with numbers_lock:
+                    numbers.extend(issued)
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        collisions = sum(count - 1 for count in Counter(numbers).values() if count > 1)
+        rate = len(numbers) / elapsed if elapsed else 0
+
+        self.stdout.write(f"Workers: {workers}")
+        self.stdout.write(f"Números entregados: {len(numbers)}")
+        self.stdout.write(f"Tiempo: {elapsed:.3f}s")
+        self.stdout.write(f"Throughput: {rate:.0f} órdenes/s")
+        self.stdout.write(f"Colisiones: {collisions}")
+
+        if errors:
+            raise CommandError(f"{len(errors)} workers fallaron: {errors[0]}")
+        if collisions:
+            raise CommandError(f"Se detectaron {collisions} números repetidos")
+
+        self.stdout.write(self.style.SUCCESS('Sin colisiones'))
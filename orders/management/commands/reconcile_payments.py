@@ -0,0 +1,65 @@
+"""
+Reconciliación del monto pagado de las órdenes.
+
+Compara Order.amount_paid con la suma real de los pagos completados y,
+con --fix, corrige las órdenes con diferencias.
+
+Uso:
+    python manage.py reconcile_payments
+    python manage.py reconcile_payments --fix
+"""
+
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from orders.models import Order
+
+
+def completed_payments_sum(field_prefix=''):
+    """Expresión con la suma de pagos completados (0 si no hay pagos)"""
+    return Coalesce(
+        Sum(f'{field_prefix}amount', filter=Q(**{f'{field_prefix}status': 'completed'})),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Detecta (y con --fix corrige) diferencias entre Order.amount_paid y sus pagos completados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Corregir las órdenes con diferencias')
+
+    def handle(self, *args, **options):
+        drifted = Order.objects.annotate(
+            payments_total=completed_payments_sum('payments__')
+        ).exclude(
+            amount_paid=F('payments_total')
+        ).values_list('id', 'order_number', 'amount_paid', 'payments_total')
+
+        drifted = list(drifted)
+        for order_id, order_number, amount_paid, payments_total in drifted:
+            self.stdout.write(
+                f"Orden {order_number}: amount_paid=${amount_paid} pagos=${payments_total}"
+            )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Sin diferencias'))
+            return
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drifted)} órdenes con diferencias (use --fix para corregirlas)'
+            ))
+            return
+
+        for order_id, *_ in drifted:
+            # Recalcular con la orden bloqueada para no pisar un pago concurrente
+            with transaction.atomic():
+                order = Order.objects.select_for_update().get(pk=order_id)
+                actual = order.payments.aggregate(total=completed_payments_sum())['total']
+                Order.objects.filter(pk=order_id).update(amount_paid=actual)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} órdenes corregidas'))
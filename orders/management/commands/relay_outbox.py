@@ -0,0 +1,95 @@
+"""
+Relay del outbox de eventos de integración.
+
+Publica en RabbitMQ los eventos pendientes del outbox y muestra el
+rendimiento en eventos/s. Con --loop queda corriendo como proceso dedicado.
+
+Uso:
+    python manage.py relay_outbox
+    python manage.py relay_outbox --loop --interval 2
+    python manage.py relay_outbox --purge-days 7
+    python manage.py relay_outbox --bench 5000   (broker local en memoria)
+"""
+
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from orders.amqp import LocalPublisher
+from orders.models import OutboxEvent
+from orders.outbox import ORDER_PAID_ROUTING_KEY, OutboxRelay
+
+
+class Command(BaseCommand):
+    help = 'Publica los eventos pendientes del outbox en RabbitMQ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Eventos por lote')
+        parser.add_argument('--loop', action='store_true', help='Seguir publicando indefinidamente')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Segundos de espera cuando el outbox está vacío (con --loop)')
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help='Eliminar eventos enviados hace más de N días')
+        parser.add_argument('--bench', type=int, default=None,
+                            help='Crear N eventos de prueba y publicarlos en un broker local en memoria')
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['purge_days'])
+            deleted, _ = OutboxEvent.objects.filter(sent_at__lt=cutoff).delete()
+            self.stdout.write(f"Eventos enviados eliminados: {deleted}")
+            return
+
+        if options['bench']:
+            self.bench(options['bench'], options['batch_size'])
+            return
+
+        relay = OutboxRelay(batch_size=options['batch_size'])
+        try:
+            while True:
+                stats = relay.drain()
+                if stats['sent'] or stats['error']:
+                    self.report(stats)
+                if not options['loop']:
+                    break
+                if stats['error'] or not stats['sent']:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo relay del outbox...")
+
+    def bench(self, count, batch_size):
+        """
+        Mide el rendimiento del relay contra un broker local en memoria. Todo
+        corre en una transacción que se deshace al final: los eventos de
+        prueba nunca son visibles para el relay periódico ni llegan a RabbitMQ.
+        """
+        # El relay del benchmark bloquearía los eventos reales pendientes
+        # (y el relay periódico los saltaría) mientras dure la transacción
+        if OutboxEvent.objects.filter(sent_at__isnull=True).exists():
+            raise CommandError("Hay eventos pendientes en el outbox; publíquelos antes del benchmark")
+
+        with transaction.atomic():
+            OutboxEvent.objects.bulk_create([
+                OutboxEvent(
+                    event_type='BENCH',
+                    routing_key=ORDER_PAID_ROUTING_KEY,
+                    payload={'event_type': 'BENCH', 'n': n}
+                )
+                for n in range(count)
+            ])
+
+            publisher = LocalPublisher()
+            stats = OutboxRelay(publisher=publisher, batch_size=batch_size).drain()
+            transaction.set_rollback(True)
+
+        self.report(stats)
+        self.stdout.write(f"Mensajes recibidos por el broker local: {len(publisher.messages)}")
+
+    def report(self, stats):
+        self.stdout.write(
+            f"Enviados: {stats['sent']} en {stats['batches']} lotes, "
+            f"{stats['seconds']:.3f}s ({stats['events_per_sec']:.0f} eventos/s)"
+        )
+        if stats['error']:
+            self.stdout.write(self.style.WARNING(f"Broker no disponible: {stats['error']}"))
@@ -1,12 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from orders_service.tracking import FieldTrackerMixin
+from .numbering import order_numbers
 
 
-class Order(models.Model):
+TAX_RATE = Decimal('0.19')  # IVA 19% en Chile
+
+
+class Order(FieldTrackerMixin, models.Model):
     """Orden de un cliente (puede ser para mesa o para llevar)"""
     
     STATUS_CHOICES = [
@@ -17,6 +20,12 @@ class Order(models.Model):
         ('cancelled', 'Cancelado'),
     ]
     
+    # Estados que se muestran en el KDS
+    KDS_STATUSES = ['pending', 'preparing', 'ready']
+    
+    # Campos que determinan si hay que notificar al KDS al guardar
+    tracked_fields = ('status', 'table')
+    
     # Relación con mesa (opcional para órdenes para llevar)
     table = models.ForeignKey('pos.Table', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     
@@ -35,6 +44,9 @@ class Order(models.Model):
     tax = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
+    # Suma de los pagos completados (se mantiene en Payment.save/delete)
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
     # Control de tiempos
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)  # Cuando pasa a "preparing"
@@ -51,67 +63,131 @@ class Order(models.Model):
     def __str__(self):
         return f"Orden {self.order_number} - {self.get_status_display()}"
 
+    @classmethod
+    def create_with_items(cls, items_data, **fields):
+        """
+        Crea una orden con todos sus items en bloque.
+
+        Los totales se calculan una sola vez en memoria, la orden se inserta
+        ya con sus totales, los items se insertan con un único bulk_create y
+        el KDS recibe un solo evento, sin importar cuántos items tenga.
+        `items_data` debe traer instancias de MenuItem ya resueltas.
+        """
+        order = cls(**fields)
+        items = [
+            OrderItem(
+                order=order,
+                menu_item=item_data['menu_item'],
+                quantity=item_data['quantity'],
+                notes=item_data.get('notes', ''),
+                unit_price=item_data['menu_item'].price,
+                subtotal=item_data['menu_item'].price * item_data['quantity'],
+            )
+            for item_data in items_data
+        ]
+        order.set_totals(sum((item.subtotal for item in items), Decimal('0')))
+        
+        # El número se asigna fuera de la transacción para usar el bloque del worker
+        if not order.order_number:
+            order.order_number = order_numbers.next_number()
+
+        with transaction.atomic():
+            order.save(broadcast=False)
+            OrderItem.objects.bulk_create(items)
+
+        if order.status in cls.KDS_STATUSES:
+            order.broadcast_to_kds()
+        return order
+
+    def set_totals(self, subtotal):
+        """Asigna subtotal, impuesto y total a partir del subtotal (sin guardar)"""
+        self.subtotal = subtotal
+        self.tax = subtotal * TAX_RATE
+        self.total = self.subtotal + self.tax
+
     def calculate_total(self):
         """Calcula los totales de la orden"""
-        items_total = sum(item.subtotal for item in self.items.all())
-        self.subtotal = items_total
-        self.tax = items_total * Decimal('0.19')  # IVA 19% en Chile
-        self.total = self.subtotal + self.tax
+        items_total = self.items.aggregate(total=models.Sum('subtotal'))['total'] or Decimal('0')
+        self.set_totals(items_total)
         self.save(update_fields=['subtotal', 'tax', 'total'])
 
     @property
     def is_fully_paid(self):
         """Verifica si la orden está completamente pagada"""
-        total_paid = sum(payment.amount for payment in self.payments.filter(status='completed'))
-        return total_paid >= self.total
+        return self.amount_paid >= self.total
+
+    @property
+    def remaining_amount(self):
+        """Monto pendiente de pago"""
+        return self.total - self.amount_paid
+
+    @classmethod
+    def apply_payment_delta(cls, order_id, delta):
+        """
+        Suma `delta` al monto pagado de la orden bloqueando su fila, y retorna
+        (monto pagado anterior, monto pagado nuevo, total). Debe llamarse dentro
+        de la misma transacción que modifica el pago.
+        """
+        order = cls.objects.select_for_update().only('id', 'total', 'amount_paid').get(pk=order_id)
+        new_amount_paid = order.amount_paid + delta
+        cls.objects.filter(pk=order_id).update(amount_paid=new_amount_paid)
+        return order.amount_paid, new_amount_paid, order.total
 
     def broadcast_to_kds(self):
-        """Envía la orden a la pantalla KDS (Kitchen Display System) vía WebSocket"""
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            'kds',
-            {
-                'type': 'order_update',
-                'order_id': self.id,
-                'order_number': self.order_number,
-                'status': self.status,
-                'items': [
-                    {
-                        'id': item.id,
-                        'menu_item_name': item.menu_item.name,
-                        'quantity': str(item.quantity),
-                        'notes': item.notes,
-                    }
-                    for item in self.items.all()
-                ],
-                'table': self.table.number if self.table else None,
-                'created_at': self.created_at.isoformat(),
-            }
-        )
+        """
+        Envía la orden a la pantalla KDS (Kitchen Display System) vía WebSocket.
+        El envío se hace al confirmar la transacción y se agrupa con las demás
+        órdenes modificadas en la misma ventana (ver orders/kds.py).
+        """
+        from .kds import kds_broadcaster
+        kds_broadcaster.mark_dirty(self.id)
 
     def save(self, *args, **kwargs):
+        # broadcast=False permite agrupar varias escrituras en un solo evento KDS
+        broadcast = kwargs.pop('broadcast', True)
+
         # Auto-generar número de orden
         if not self.order_number:
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            self.order_number = f"ORD-{timestamp}"
+            self.order_number = order_numbers.next_number()
+        
+        # Registrar tiempos según cambio de estado (sin volver a leer la orden)
+        is_new = self._state.adding
+        status_changed = self.has_changed('status')
+        previous_status = self.previous_value('status')
+        kds_changed = is_new or status_changed or self.has_changed('table')
         
-        # Registrar tiempos según cambio de estado
-        if self.pk:
-            old_instance = Order.objects.get(pk=self.pk)
-            if old_instance.status != self.status:
-                if self.status == 'preparing' and not self.started_at:
-                    self.started_at = timezone.now()
-                elif self.status == 'delivered' and not self.completed_at:
-                    self.completed_at = timezone.now()
+        if not is_new and status_changed:
+            update_fields = kwargs.get('update_fields')
+            if self.status == 'preparing' and not self.started_at:
+                self.started_at = timezone.now()
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'started_at'}
+            elif self.status == 'delivered' and not self.completed_at:
+                self.completed_at = timezone.now()
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'completed_at'}
         
         super().save(*args, **kwargs)
         
-        # Broadcast a KDS cuando cambia el estado
-        if self.status in ['pending', 'preparing', 'ready']:
+        # Broadcast a KDS solo cuando cambia algo que el KDS muestra.
+        # Si la orden sale del KDS (entregada/cancelada) también se notifica
+        # para que las pantallas la quiten.
+        if broadcast and kds_changed and (
+            self.status in self.KDS_STATUSES or previous_status in self.KDS_STATUSES
+        ):
             self.broadcast_to_kds()
 
 
+class OrderNumberSequence(models.Model):
+    """Contador de números de orden por día de negocio (ver orders/numbering.py)"""
+    
+    business_day = models.DateField(unique=True)
+    next_value = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.business_day} - siguiente: {self.next_value}"
+
+
 class OrderItem(models.Model):
     """Items individuales de una orden"""
     
@@ -141,7 +217,7 @@ class OrderItem(models.Model):
         self.order.calculate_total()
 
 
-class Payment(models.Model):
+class Payment(FieldTrackerMixin, models.Model):
     """Pagos asociados a una orden (puede haber múltiples pagos para una orden)"""
     
     PAYMENT_METHOD_CHOICES = [
@@ -157,6 +233,9 @@ class Payment(models.Model):
         ('failed', 'Fallido'),
     ]
     
+    # Campos que afectan el monto pagado de la orden
+    tracked_fields = ('status', 'amount')
+    
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payments')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
@@ -177,11 +256,29 @@ class Payment(models.Model):
         return f"Pago {self.get_payment_method_display()} - ${self.amount} - Orden {self.order.order_number}"
 
     def check_order_fully_paid(self):
-        """Verifica si la orden está completamente pagada y publica evento"""
+        """
+        Verifica si la orden está completamente pagada y registra el evento
+        ORDEN_PAGADA en el outbox. Debe llamarse dentro de la transacción del
+        pago: el evento solo existe si el pago se confirma.
+        """
         if self.order.is_fully_paid:
-            # Publicar evento al microservicio de operaciones para descontar stock
-            from .tasks import publish_order_paid
-            publish_order_paid.delay(self.order.id)
+            # Evento al microservicio de operaciones para descontar stock
+            from .outbox import record_order_paid
+            record_order_paid(self.order)
+
+    def _ledger_amount(self, status, amount):
+        """Monto con que el pago cuenta en amount_paid de la orden"""
+        return amount if status == 'completed' and amount else Decimal('0')
+
+    def _update_order_ledger(self, delta):
+        """Aplica `delta` al monto pagado de la orden y retorna si quedó pagada por este cambio"""
+        old_paid, new_paid, total = Order.apply_payment_delta(self.order_id, delta)
+        
+        # Mantener sincronizada la instancia de la orden en memoria
+        if Payment.order.is_cached(self):
+            self.order.amount_paid = new_paid
+        
+        return old_paid < total <= new_paid
 
     def save(self, *args, **kwargs):
         # Validar convenio
@@ -192,8 +289,55 @@ class Payment(models.Model):
         if self.status == 'completed' and not self.completed_at:
             self.completed_at = timezone.now()
         
-        super().save(*args, **kwargs)
+        delta = self._ledger_amount(self.status, self.amount) - self._ledger_amount(
+            self.previous_value('status'), self.previous_value('amount')
+        )
+        
+        # El pago y el monto pagado de la orden se escriben en la misma transacción
+        became_paid = False
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if delta:
+                became_paid = self._update_order_ledger(delta)
+            
+            # Publicar solo cuando este pago completa el total de la orden
+            if became_paid:
+                self.check_order_fully_paid()
+
+    def delete(self, *args, **kwargs):
+        delta = -self._ledger_amount(self.previous_value('status'), self.previous_value('amount'))
+        
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if delta:
+                self._update_order_ledger(delta)
         
-        # Verificar si la orden está completamente pagada
-        if self.status == 'completed':
-            self.check_order_fully_paid()
+        return result
+
+
+class OutboxEvent(models.Model):
+    """
+    Evento de integración pendiente de publicar en RabbitMQ.
+    
+    Se escribe en la misma transacción que el cambio que lo origina y el relay
+    (orders/outbox.py) lo publica después: si la transacción se deshace no se
+    publica nada y si el broker no responde el evento espera al siguiente intento.
+    """
+    
+    event_type = models.CharField(max_length=50)
+    routing_key = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['sent_at', 'id']),
+        ]
+
+    def __str__(self):
+        state = 'enviado' if self.sent_at else 'pendiente'
+        return f"{self.event_type} #{self.id} ({state})"
@@ -0,0 +1,159 @@
+"""
+Outbox transaccional de eventos de integración.
+
+Los eventos para otros servicios (ORDEN_PAGADA, ...) no se publican desde
+save(): se guardan como OutboxEvent en la misma transacción que el cambio que
+los origina. El relay los lee en lotes, los publica en RabbitMQ con
+confirmaciones del broker y los marca como enviados.
+
+- Si la transacción se deshace, el evento no existe y no se publica nada.
+- Si el broker está caído, los eventos quedan pendientes y el siguiente
+  relay (al confirmarse otra transacción, la tarea periódica o el comando
+  relay_outbox) los publica en orden.
+- La entrega es al menos una vez: un evento publicado cuyo lote no alcanzó a
+  marcarse se vuelve a publicar. Cada mensaje lleva message_id
+  ('outbox-<id>') para que el consumidor descarte duplicados.
+
+Varios relays pueden correr a la vez: cada lote se toma con
+SELECT ... FOR UPDATE SKIP LOCKED.
+"""
+
+import json
+import logging
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .amqp import PublishError, get_publisher
+
+logger = logging.getLogger(__name__)
+
+ORDER_PAID_ROUTING_KEY = 'pos.order.paid'
+
+
+def build_order_paid_event(order):
+    """
+    Payload de ORDEN_PAGADA con el stock a descontar, sumado por producto y
+    receta a partir de la BOM cacheada de cada item del menú.
+    """
+    from menu.bom import stock_deductions
+
+    lines = order.items.values_list('menu_item_id', 'quantity')
+
+    return {
+        'event_type': 'ORDEN_PAGADA',
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'timestamp': order.completed_at.isoformat() if order.completed_at else None,
+        'stock_deductions': stock_deductions(lines)
+    }
+
+
+def record_event(event_type, routing_key, payload):
+    """Guarda un evento en el outbox y pide un relay cuando se confirme la transacción"""
+    from .models import OutboxEvent
+
+    event = OutboxEvent.objects.create(
+        event_type=event_type,
+        routing_key=routing_key,
+        payload=payload
+    )
+    transaction.on_commit(schedule_relay)
+    return event
+
+
+def record_order_paid(order):
+    """Registra ORDEN_PAGADA para una orden completamente pagada"""
+    return record_event('ORDEN_PAGADA', ORDER_PAID_ROUTING_KEY, build_order_paid_event(order))
+
+
+def schedule_relay():
+    """Encola el relay en Celery sin bloquear la request si el broker de Celery no responde"""
+    from .tasks import relay_outbox
+
+    try:
+        relay_outbox.apply_async(retry=False)
+    except Exception as e:
+        # La tarea periódica publicará el evento más tarde
+        logger.warning(f"No se pudo encolar el relay del outbox: {str(e)}")
+
+
+class OutboxRelay:
+    """Publica los eventos pendientes del outbox en lotes"""
+
+    def __init__(self, publisher=None, batch_size=None):
+        # Por defecto usa la conexión persistente del proceso (orders/amqp.py)
+        self.publisher = publisher or get_publisher()
+        self.batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+
+    def relay_batch(self):
+        """
+        Publica un lote de eventos pendientes en orden. Retorna
+        (enviados, error); al primer fallo se detiene y el resto del lote
+        queda pendiente.
+        """
+        from .models import OutboxEvent
+
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(sent_at__isnull=True)
+                .order_by('id')[:self.batch_size]
+            )
+
+            sent_ids = []
+            error = None
+            for event in events:
+                try:
+                    self.publisher.publish(
+                        event.routing_key,
+                        json.dumps(event.payload),
+                        message_id=f'outbox-{event.id}'
+                    )
+                except PublishError as e:
+                    error = str(e)
+                    OutboxEvent.objects.filter(id=event.id).update(
+                        attempts=F('attempts') + 1,
+                        last_error=error[:1000]
+                    )
+                    break
+                sent_ids.append(event.id)
+
+            if sent_ids:
+                OutboxEvent.objects.filter(id__in=sent_ids).update(
+                    sent_at=timezone.now(),
+                    attempts=F('attempts') + 1,
+                    last_error=''
+                )
+
+        return len(sent_ids), error
+
+    def drain(self, max_batches=None):
+        """
+        Publica lotes hasta vaciar el outbox o hasta que el broker falle.
+        Retorna métricas del recorrido, incluido el rendimiento en eventos/s.
+        """
+        started = time.perf_counter()
+        sent = 0
+        batches = 0
+        error = None
+
+        while max_batches is None or batches < max_batches:
+            batch_sent, error = self.relay_batch()
+            batches += 1
+            sent += batch_sent
+            if error or batch_sent < self.batch_size:
+                break
+
+        seconds = time.perf_counter() - started
+        if error:
+            logger.warning(f"Relay del outbox detenido por error del broker: {error}")
+
+        return {
+            'sent': sent,
+            'batches': batches,
+            'error': error,
+            'seconds': seconds,
+            'events_per_sec': sent / seconds if seconds and sent else 0.0,
+        }
@@ -1,6 +1,14 @@
 from rest_framework import serializers
 from .models import Order, OrderItem, Payment
-from menu.serializers import MenuItemSerializer
+from menu.models import MenuItem
+from menu.serializers import ComponentNamesListSerializer, MenuItemSerializer, prefetched
+
+
+def order_item_components(order_item):
+    """Componentes precargados del item del menú de una línea de la orden"""
+    if not OrderItem.menu_item.is_cached(order_item):
+        return []
+    return prefetched(order_item.menu_item, 'components')
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -12,6 +20,10 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'menu_item', 'menu_item_name', 'menu_item_details',
                   'quantity', 'unit_price', 'subtotal', 'notes', 'created_at']
         read_only_fields = ['unit_price', 'subtotal', 'created_at']
+        list_serializer_class = ComponentNamesListSerializer
+
+    def components_of(self, order_item):
+        return order_item_components(order_item)
 
 
 class OrderItemCreateSerializer(serializers.ModelSerializer):
@@ -27,6 +39,19 @@ class OrderItemCreateSerializer(serializers.ModelSerializer):
         return value
 
 
+class OrderItemBulkCreateSerializer(serializers.ModelSerializer):
+    """
+    Serializer para los items de una orden nueva.
+    Recibe solo el ID del menu item: OrderCreateSerializer resuelve
+    todos los IDs de la orden juntos en una única consulta.
+    """
+    menu_item = serializers.IntegerField(source='menu_item_id', min_value=1)
+
+    class Meta:
+        model = OrderItem
+        fields = ['menu_item', 'quantity', 'notes']
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -64,8 +89,7 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
         # Validar que el monto no exceda el total pendiente de la orden
         order = self.context.get('order')
         if order:
-            total_paid = sum(p.amount for p in order.payments.filter(status='completed'))
-            remaining = order.total - total_paid
+            remaining = order.remaining_amount
             if data['amount'] > remaining:
                 raise serializers.ValidationError({
                     'amount': f'El monto excede el total pendiente de ${remaining}'
@@ -93,18 +117,25 @@ class OrderSerializer(serializers.ModelSerializer):
                   'created_at', 'started_at', 'completed_at', 'updated_at']
         read_only_fields = ['order_number', 'subtotal', 'tax', 'total', 
                             'created_at', 'started_at', 'completed_at', 'updated_at']
+        list_serializer_class = ComponentNamesListSerializer
+
+    def components_of(self, order):
+        return [
+            component
+            for order_item in prefetched(order, 'items')
+            for component in order_item_components(order_item)
+        ]
 
     def get_total_paid(self, obj):
-        return sum(p.amount for p in obj.payments.filter(status='completed'))
+        return obj.amount_paid
 
     def get_remaining_amount(self, obj):
-        total_paid = self.get_total_paid(obj)
-        return obj.total - total_paid
+        return obj.remaining_amount
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     """Serializer para crear órdenes con items anidados"""
-    items = OrderItemCreateSerializer(many=True)
+    items = OrderItemBulkCreateSerializer(many=True)
 
     class Meta:
         model = Order
@@ -113,6 +144,19 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     def validate_items(self, value):
         if not value:
             raise serializers.ValidationError("Debe incluir al menos un item en la orden")
+        
+        # Resolver todos los menu items (y sus precios) en una sola consulta
+        menu_items = MenuItem.objects.in_bulk({item['menu_item_id'] for item in value})
+        
+        for item in value:
+            menu_item_id = item.pop('menu_item_id')
+            menu_item = menu_items.get(menu_item_id)
+            if menu_item is None:
+                raise serializers.ValidationError(f"El item #{menu_item_id} no existe")
+            if not menu_item.is_available:
+                raise serializers.ValidationError(f"El item '{menu_item.name}' no está disponible actualmente")
+            item['menu_item'] = menu_item
+        
         return value
 
     def validate_table(self, value):
@@ -128,12 +172,7 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
-        
-        order.calculate_total()
+        order = Order.create_with_items(items_data, **validated_data)
         
         # Cambiar el estado de la mesa si aplica
         if order.table:
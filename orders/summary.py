@@ -0,0 +1,76 @@
+"""
+Resumen de órdenes del día de negocio para los tableros.
+
+El resumen sale de una sola consulta con agregación condicional sobre las
+órdenes del día de negocio, filtradas por el rango [inicio, fin) de
+business_day_bounds() para que created_at use el índice (status, created_at).
+El total pagado sale de Order.amount_paid, que acumula los pagos completados
+de cada orden.
+
+Los tableros consultan el resumen cada pocos segundos, así que el resultado
+se guarda en el cache de Django durante ORDERS_DAILY_SUMMARY_CACHE_TIMEOUT
+segundos (0 lo desactiva). Dentro de esa ventana el resumen puede no incluir
+las últimas órdenes o pagos.
+"""
+
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from .business_day import business_day, business_day_bounds
+
+CACHE_KEY = 'orders:daily_summary:{day}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'ORDERS_DAILY_SUMMARY_CACHE_TIMEOUT', 5)
+
+
+def build_daily_summary(day=None):
+    """Resumen de las órdenes del día de negocio `day` (por defecto, el actual)"""
+    from .models import Order
+
+    day = day or business_day()
+    start, end = business_day_bounds(day)
+
+    totals = Order.objects.filter(created_at__gte=start, created_at__lt=end).aggregate(
+        total_orders=Count('id'),
+        total_revenue=Sum('total', filter=Q(status='delivered')),
+        total_paid=Sum('amount_paid'),
+        **{
+            f'status_{status_code}': Count('id', filter=Q(status=status_code))
+            for status_code, _ in Order.STATUS_CHOICES
+        }
+    )
+
+    total_revenue = totals['total_revenue'] or Decimal('0')
+    total_paid = totals['total_paid'] or Decimal('0')
+    return {
+        'date': day.isoformat(),
+        'total_orders': totals['total_orders'],
+        'by_status': {
+            status_code: {
+                'name': status_name,
+                'count': totals[f'status_{status_code}'],
+            }
+            for status_code, status_name in Order.STATUS_CHOICES
+        },
+        'total_revenue': float(total_revenue),
+        'total_paid': float(total_paid),
+        'pending_payment': float(total_revenue - total_paid),
+    }
+
+
+def get_daily_summary(day=None):
+    """Resumen del día de negocio, cacheado por unos segundos"""
+    day = day or business_day()
+    timeout = _cache_timeout()
+    if not timeout:
+        return build_daily_summary(day)
+
+    key = CACHE_KEY.format(day=day.isoformat())
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_daily_summary(day)
+        cache.set(key, summary, timeout=timeout)
+    return summary
@@ -6,108 +6,47 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-@shared_task(name='orders.publish_order_paid')
-def publish_order_paid(order_id):
+@shared_task(name='orders.relay_outbox')
+def relay_outbox():
     """
-    Publica evento ORDEN_PAGADA al microservicio de operaciones
-    para que descuente el stock de los productos/recetas utilizados.
+    Publica en RabbitMQ los eventos pendientes del outbox.
+    Se encola al confirmarse cada evento y además corre periódicamente
+    (CELERY_BEAT_SCHEDULE) para reintentar después de una caída del broker.
     """
-    from .models import Order
-    from menu.models import MenuItemComponent
-    from catalog_mirror.models import MirroredProduct, MirroredRecipe
-    import pika
-    from django.conf import settings
+    from .outbox import OutboxRelay
     
-    try:
-        order = Order.objects.get(id=order_id)
-        
-        # Recopilar información de stock a descontar
-        stock_deductions = {
-            'products': [],
-            'recipes': []
-        }
-        
-        for order_item in order.items.all():
-            # Obtener componentes del menu item
-            for component in order_item.menu_item.components.all():
-                quantity_to_deduct = component.quantity * order_item.quantity
-                
-                if component.component_type == 'product':
-                    stock_deductions['products'].append({
-                        'product_id': component.product_id,
-                        'quantity': float(quantity_to_deduct),
-                    })
-                elif component.component_type == 'recipe':
-                    stock_deductions['recipes'].append({
-                        'recipe_id': component.recipe_id,
-                        'quantity': float(quantity_to_deduct),
-                    })
-        
-        # Publicar evento a RabbitMQ
-        event_data = {
-            'event_type': 'ORDEN_PAGADA',
-            'order_id': order.id,
-            'order_number': order.order_number,
-            'timestamp': order.completed_at.isoformat() if order.completed_at else None,
-            'stock_deductions': stock_deductions
-        }
-        
-        # Conectar a RabbitMQ
-        credentials = pika.PlainCredentials(
-            settings.RABBITMQ_USER,
-            settings.RABBITMQ_PASSWORD
-        )
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=settings.RABBITMQ_HOST,
-                port=settings.RABBITMQ_PORT,
-                credentials=credentials
-            )
-        )
-        channel = connection.channel()
-        
-        # Declarar exchange
-        channel.exchange_declare(
-            exchange='restaurant_events',
-            exchange_type='topic',
-            durable=True
-        )
-        
-        # Publicar mensaje
-        channel.basic_publish(
-            exchange='restaurant_events',
-            routing_key='pos.order.paid',
-            body=json.dumps(event_data),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # Mensaje persistente
-                content_type='application/json'
-            )
+    stats = OutboxRelay().drain()
+    
+    if stats['sent']:
+        logger.info(
+            f"Outbox: {stats['sent']} eventos publicados "
+            f"({stats['events_per_sec']:.0f} eventos/s)"
         )
-        
-        connection.close()
-        
-        logger.info(f"Evento ORDEN_PAGADA publicado para orden {order.order_number}")
-        return True
-        
-    except Order.DoesNotExist:
-        logger.error(f"Orden {order_id} no encontrada")
-        return False
-    except Exception as e:
-        logger.error(f"Error al publicar evento ORDEN_PAGADA: {str(e)}")
-        raise
+    return stats
 
 
 @shared_task(name='orders.listen_operations_events')
-def listen_operations_events():
+def listen_operations_events(batch_size=None, flush_interval=None):
     """
     Escucha eventos del microservicio de operaciones
     (PRODUCT_STOCK_UPDATED, RECIPE_UPDATED) para actualizar catalog_mirror.
     
+    Con CATALOG_EVENTS_BATCH_SIZE > 1 (o batch_size) los mensajes se aplican
+    en lotes, quedándose con el último evento por producto/receta (ver
+    catalog_mirror/events.py). Con 1 cada mensaje se procesa en su propia
+    tarea de Celery.
+    
     Esta tarea debe ejecutarse como un worker persistente.
     """
     import pika
     from django.conf import settings
     
+    if batch_size is None:
+        batch_size = getattr(settings, 'CATALOG_EVENTS_BATCH_SIZE', 200)
+    if flush_interval is None:
+        flush_interval = getattr(settings, 'CATALOG_EVENTS_FLUSH_INTERVAL', 1.0)
+    connection = None
+    
     def callback(ch, method, properties, body):
         """Procesa mensajes recibidos"""
         try:
@@ -163,6 +102,10 @@ def listen_operations_events():
             routing_key='operations.recipe.*'
         )
         
+        if batch_size > 1:
+            consume_in_batches(channel, queue_name, batch_size, flush_interval)
+            return
+        
         # Consumir mensajes
         channel.basic_qos(prefetch_count=1)
         channel.basic_consume(queue=queue_name, on_message_callback=callback)
@@ -179,6 +122,36 @@ def listen_operations_events():
         raise
 
 
+def consume_in_batches(channel, queue_name, batch_size, flush_interval):
+    """
+    Consume la cola en lotes: el broker entrega hasta batch_size mensajes sin
+    confirmar y cada lote se aplica y confirma de una vez.
+    """
+    from catalog_mirror.events import CatalogEventBatcher
+    
+    batcher = CatalogEventBatcher(channel, batch_size=batch_size, flush_interval=flush_interval)
+    channel.basic_qos(prefetch_count=batch_size)
+    
+    logger.info(
+        f"Escuchando eventos de operaciones en lotes de {batch_size} "
+        f"(cada {flush_interval}s como máximo)..."
+    )
+    try:
+        # inactivity_timeout entrega (None, None, None) si no llegan mensajes,
+        # para aplicar lotes incompletos a tiempo
+        for method, properties, body in channel.consume(queue_name, inactivity_timeout=flush_interval):
+            if method is not None:
+                batcher.add(method.delivery_tag, body)
+            batcher.tick()
+    finally:
+        if channel.is_open:
+            batcher.flush()
+        logger.info(
+            f"Consumidor detenido: {batcher.stats['messages']} eventos en "
+            f"{batcher.stats['batches']} lotes ({batcher.throughput():.0f} eventos/s)"
+        )
+
+
 @shared_task(name='orders.process_product_update')
 def process_product_update(event_data):
     """
@@ -186,7 +159,8 @@ def process_product_update(event_data):
     y actualiza el catálogo espejo local.
     """
     from catalog_mirror.models import MirroredProduct
-    from menu.models import MenuItemComponent
+    from menu.component_names import invalidate_component_names
+    from menu.costing import propagate_component_costs
     
     try:
         product_id = event_data.get('product_id')
@@ -208,21 +182,13 @@ def process_product_update(event_data):
         action = "creado" if created else "actualizado"
         logger.info(f"Producto espejo {mirrored_product.name} {action}")
         
-        # Actualizar cached_unit_cost en componentes que usan este producto
-        components = MenuItemComponent.objects.filter(
-            component_type='product',
-            product_id=product_id
-        )
-        
-        for component in components:
-            component.cached_unit_cost = mirrored_product.unit_cost
-            component.save()
-            
-            # Recalcular costo del menu item
-            component.menu_item.calculate_cost()
+        # Actualizar cached_unit_cost de los componentes que usan este producto
+        # y el costo de sus items del menú (dos UPDATE en total)
+        updated = propagate_component_costs(product_ids=[product_id])
+        invalidate_component_names(product_ids=[product_id])
         
-        if components.exists():
-            logger.info(f"Actualizados {components.count()} componentes de menú")
+        if updated:
+            logger.info(f"Recalculado el costo de {updated} items del menú")
         
         return True
         
@@ -238,7 +204,8 @@ def process_recipe_update(event_data):
     y actualiza el catálogo espejo local.
     """
     from catalog_mirror.models import MirroredRecipe
-    from menu.models import MenuItemComponent
+    from menu.component_names import invalidate_component_names
+    from menu.costing import propagate_component_costs
     
     try:
         recipe_id = event_data.get('recipe_id')
@@ -262,21 +229,13 @@ def process_recipe_update(event_data):
         action = "creada" if created else "actualizada"
         logger.info(f"Receta espejo {mirrored_recipe.name} {action}")
         
-        # Actualizar cached_unit_cost en componentes que usan esta receta
-        components = MenuItemComponent.objects.filter(
-            component_type='recipe',
-            recipe_id=recipe_id
-        )
-        
-        for component in components:
-            component.cached_unit_cost = mirrored_recipe.cost_per_unit
-            component.save()
-            
-            # Recalcular costo del menu item
-            component.menu_item.calculate_cost()
+        # Actualizar cached_unit_cost de los componentes que usan esta receta
+        # y el costo de sus items del menú (dos UPDATE en total)
+        updated = propagate_component_costs(recipe_ids=[recipe_id])
+        invalidate_component_names(recipe_ids=[recipe_id])
         
-        if components.exists():
-            logger.info(f"Actualizados {components.count()} componentes de menú")
+        if updated:
+            logger.info(f"Recalculado el costo de {updated} items del menú")
         
         return True
         
@@ -1,11 +1,30 @@
-from django.test import TestCase
+import json
+from unittest import skipUnless
+from unittest.mock import AsyncMock, MagicMock, patch
+from django.core.cache import cache
+from django.db import connection, transaction
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from channels.testing import WebsocketCommunicator
 from rest_framework.test import APIClient
 from rest_framework import status
 from decimal import Decimal
 from pos.models import Zone, Table
-from menu.models import MenuCategory, MenuItem
-from .models import Order, OrderItem, Payment
+from menu.bom import get_boms
+from menu.models import MenuCategory, MenuItem, MenuItemComponent
+from .models import Order, OrderItem, OrderNumberSequence, OutboxEvent, Payment
+from .amqp import LocalAMQPBroker, LocalPublisher, PublishError, RabbitMQPublisher
+from .outbox import OutboxRelay, build_order_paid_event
+from .numbering import OrderNumberAllocator, format_order_number
+from .kds import KDSBroadcaster, build_kds_payloads, kds_snapshot
+from .kds_store import LocalKDSStore, MemoryKDSStore, get_kds_store
+from .consumers import KDSConsumer
+from .business_day import business_day, business_day_bounds
+from .summary import build_daily_summary
 
 
 class OrderModelTest(TestCase):
@@ -159,3 +178,781 @@ class OrderAPITest(TestCase):
         
         order.refresh_from_db()
         self.assertEqual(order.status, 'preparing')
+
+
+class OrderBulkCreateTest(TestCase):
+    """Tests para la creación de órdenes con items en bloque"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.zone = Zone.objects.create(name="Test Zone")
+        self.table = Table.objects.create(zone=self.zone, number="T1", capacity=4)
+        # La primera reserva del día además crea la fila de la secuencia
+        OrderNumberSequence.objects.create(business_day=business_day())
+        self.category = MenuCategory.objects.create(name="Test", display_order=1)
+        self.menu_items = [
+            MenuItem.objects.create(
+                category=self.category,
+                name=f"Item {i}",
+                price=Decimal('1000') * (i + 1)
+            )
+            for i in range(12)
+        ]
+    
+    def _create_order(self, menu_items):
+        data = {
+            'table': self.table.id,
+            'items': [{'menu_item': item.id, 'quantity': 2} for item in menu_items]
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/pos/orders/orders/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return len(queries)
+    
+    def test_query_count_is_flat(self):
+        """Test que crear una orden cuesta lo mismo con 1 o con 12 items"""
+        single_item_queries = self._create_order(self.menu_items[:1])
+        Order.objects.all().delete()
+        self.table.status = 'available'
+        self.table.save()
+        many_items_queries = self._create_order(self.menu_items)
+        
+        self.assertEqual(single_item_queries, many_items_queries)
+    
+    def test_single_kds_broadcast(self):
+        """Test que una orden de 12 items envía un solo evento al KDS"""
+        with patch.object(Order, 'broadcast_to_kds') as broadcast:
+            self._create_order(self.menu_items)
+        
+        self.assertEqual(broadcast.call_count, 1)
+    
+    def test_totals_computed_once(self):
+        """Test que los totales se calculan correctamente en bloque"""
+        self._create_order(self.menu_items)
+        order = Order.objects.get()
+        
+        # 2 x (1000 + 2000 + ... + 12000) = 156000
+        self.assertEqual(order.items.count(), 12)
+        self.assertEqual(order.subtotal, Decimal('156000'))
+        self.assertEqual(order.tax, Decimal('29640'))
+        self.assertEqual(order.total, Decimal('185640'))
+    
+    def test_unavailable_item_rejected(self):
+        """Test que no se pueden pedir items no disponibles"""
+        self.menu_items[0].is_available = False
+        self.menu_items[0].save()
+        
+        data = {'items': [{'menu_item': self.menu_items[0].id, 'quantity': 1}]}
+        response = self.client.post('/api/pos/orders/orders/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class OrderChangeTrackingTest(TestCase):
+    """Tests para el seguimiento de cambios de Order"""
+    
+    def setUp(self):
+        self.zone = Zone.objects.create(name="Test Zone")
+        self.table = Table.objects.create(zone=self.zone, number="T1", capacity=4)
+        Order.objects.create(table=self.table)
+        self.order = Order.objects.get()
+    
+    def test_save_without_changes_skips_select_and_broadcast(self):
+        """Test que guardar sin cambios no relee la orden ni notifica al KDS"""
+        with patch.object(Order, 'broadcast_to_kds') as broadcast:
+            with self.assertNumQueries(1):
+                self.order.save()
+        
+        broadcast.assert_not_called()
+    
+    def test_status_change_sets_timestamp_and_broadcasts(self):
+        """Test que el cambio de estado registra el tiempo y notifica una vez"""
+        self.order.status = 'preparing'
+        with patch.object(Order, 'broadcast_to_kds') as broadcast:
+            with self.assertNumQueries(1):
+                self.order.save()
+        
+        self.assertEqual(broadcast.call_count, 1)
+        self.assertIsNotNone(self.order.started_at)
+        self.assertFalse(self.order.has_changed('status'))
+    
+    def test_status_change_with_update_fields_persists_timestamp(self):
+        """Test que update_fields incluye el tiempo registrado"""
+        self.order.status = 'delivered'
+        with patch.object(Order, 'broadcast_to_kds'):
+            self.order.save(update_fields=['status'])
+        
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.completed_at)
+    
+    def test_totals_update_does_not_broadcast(self):
+        """Test que recalcular totales no notifica al KDS"""
+        with patch.object(Order, 'broadcast_to_kds') as broadcast:
+            self.order.calculate_total()
+        
+        broadcast.assert_not_called()
+    
+    def test_leaving_kds_broadcasts(self):
+        """Test que una orden que sale del KDS se notifica para quitarla"""
+        self.order.status = 'cancelled'
+        with patch.object(Order, 'broadcast_to_kds') as broadcast:
+            self.order.save()
+        
+        self.assertEqual(broadcast.call_count, 1)
+
+
+class OrderNumberAllocatorTest(TransactionTestCase):
+    """Tests para el asignador de números de orden por bloques"""
+    
+    def test_workers_never_share_numbers(self):
+        """Test que dos workers intercalados no repiten números"""
+        worker_a = OrderNumberAllocator(block_size=3)
+        worker_b = OrderNumberAllocator(block_size=3)
+        
+        numbers = []
+        for _ in range(10):
+            numbers.append(worker_a.next_number())
+            numbers.append(worker_b.next_number())
+        
+        self.assertEqual(len(numbers), len(set(numbers)))
+        # 4 bloques de 3 por worker
+        self.assertEqual(OrderNumberSequence.objects.get().next_value, 1 + 8 * 3)
+    
+    def test_block_is_served_from_memory(self):
+        """Test que los números de un bloque no consultan la base de datos"""
+        allocator = OrderNumberAllocator(block_size=5)
+        allocator.next_number()
+        
+        with self.assertNumQueries(0):
+            for _ in range(4):
+                allocator.next_number()
+    
+    def test_refill_does_not_insert_when_row_exists(self):
+        """Test que con la fila del día ya creada la reserva es solo UPDATE y SELECT"""
+        allocator = OrderNumberAllocator(block_size=1)
+        
+        with CaptureQueriesContext(connection) as first:
+            allocator.next_number()
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in first.captured_queries))
+        
+        with CaptureQueriesContext(connection) as refill:
+            allocator.next_number()
+        statements = [query['sql'].split()[0] for query in refill.captured_queries]
+        self.assertNotIn('INSERT', statements)
+        self.assertEqual(statements.count('UPDATE'), 1)
+    
+    def test_sequence_resets_each_business_day(self):
+        """Test que la secuencia se reinicia con el día de negocio"""
+        allocator = OrderNumberAllocator(block_size=5)
+        
+        with patch('orders.numbering.business_day', return_value=date(2025, 11, 5)):
+            first_day = [allocator.next_number() for _ in range(2)]
+        with patch('orders.numbering.business_day', return_value=date(2025, 11, 6)):
+            second_day = allocator.next_number()
+        
+        self.assertEqual(first_day, ['ORD-251105-0001', 'ORD-251105-0002'])
+        self.assertEqual(second_day, 'ORD-251106-0001')
+    
+    # Los workers del benchmark escriben en paralelo y SQLite bloquea la tabla
+    @skipUnless(connection.vendor == 'mysql', 'requiere escrituras concurrentes (MySQL)')
+    def test_concurrent_benchmark_has_no_collisions(self):
+        """Test que el benchmark concurrente no detecta colisiones"""
+        out = StringIO()
+        call_command('bench_order_numbers', workers=4, orders=200, block_size=10, stdout=out)
+        self.assertIn('Colisiones: 0', out.getvalue())
+    
+    def test_format_order_number(self):
+        """Test formato corto y legible"""
+        self.assertEqual(format_order_number(date(2025, 1, 2), 42), 'ORD-250102-0042')
+
+
+class PaymentLedgerTest(TestCase):
+    """Tests para el monto pagado mantenido en la orden"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.zone = Zone.objects.create(name="Test Zone")
+        self.table = Table.objects.create(zone=self.zone, number="T1", capacity=4)
+        self.order = Order.objects.create(table=self.table, total=Decimal('20000'))
+    
+    def _pay(self, amount, status='completed'):
+        return Payment.objects.create(
+            order=self.order,
+            payment_method='cash',
+            amount=Decimal(amount),
+            status=status
+        )
+    
+    def test_completed_payments_update_ledger(self):
+        """Test que solo los pagos completados suman al monto pagado"""
+        self._pay('5000')
+        self._pay('3000', status='failed')
+        
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.amount_paid, Decimal('5000'))
+        self.assertEqual(self.order.remaining_amount, Decimal('15000'))
+    
+    def test_status_change_and_delete_update_ledger(self):
+        """Test que cambiar el estado o eliminar un pago ajusta el monto pagado"""
+        payment = self._pay('5000')
+        payment.status = 'failed'
+        payment.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.amount_paid, Decimal('0'))
+        
+        payment.status = 'completed'
+        payment.save()
+        payment.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.amount_paid, Decimal('0'))
+    
+    def test_order_paid_event_published_once(self):
+        """Test que ORDEN_PAGADA se registra solo al completar el total"""
+        self._pay('15000')
+        self.assertFalse(OutboxEvent.objects.exists())
+        self._pay('5000')
+        
+        self.assertEqual(OutboxEvent.objects.filter(event_type='ORDEN_PAGADA').count(), 1)
+        self.assertTrue(self.order.is_fully_paid)
+    
+    def test_payment_validation_reads_ledger(self):
+        """Test que la validación del monto no suma los pagos"""
+        self._pay('15000')
+        
+        data = {'payment_method': 'cash', 'amount': '6000'}
+        response = self.client.post(
+            f'/api/pos/orders/orders/{self.order.id}/add_payment/', data
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('amount', response.data)
+    
+    def test_unpaid_list(self):
+        """Test listado de órdenes con pagos pendientes"""
+        self._pay('5000')
+        paid_order = Order.objects.create(total=Decimal('1000'))
+        Payment.objects.create(order=paid_order, payment_method='cash',
+                               amount=Decimal('1000'), status='completed')
+        
+        response = self.client.get('/api/pos/orders/orders/unpaid/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['paid'], 5000.0)
+        self.assertEqual(response.data[0]['remaining'], 15000.0)
+    
+    def test_reconcile_command_repairs_drift(self):
+        """Test que la reconciliación detecta y corrige diferencias"""
+        self._pay('5000')
+        Order.objects.filter(pk=self.order.pk).update(amount_paid=Decimal('1'))
+        
+        out = StringIO()
+        call_command('reconcile_payments', stdout=out)
+        self.assertIn(self.order.order_number, out.getvalue())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.amount_paid, Decimal('1'))
+        
+        call_command('reconcile_payments', fix=True, stdout=StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.amount_paid, Decimal('5000'))
+
+
+@override_settings(ORDERS_DAILY_SUMMARY_CACHE_TIMEOUT=5)
+class DailySummaryTest(TestCase):
+    """Tests para el resumen de órdenes del día de negocio"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.zone = Zone.objects.create(name="Test Zone")
+        self.table = Table.objects.create(zone=self.zone, number="T1", capacity=4)
+        self.start, self.end = business_day_bounds()
+    
+    def _order(self, status, total, paid='0', created_at=None):
+        order = Order.objects.create(table=self.table, status=status, total=Decimal(total))
+        if paid != '0':
+            Payment.objects.create(order=order, payment_method='cash', amount=Decimal(paid), status='completed')
+        Order.objects.filter(pk=order.pk).update(created_at=created_at or self.start)
+        return order
+    
+    def test_summary_in_one_query(self):
+        """Test que el resumen usa una consulta y solo cuenta el día de negocio"""
+        self._order('delivered', '10000', paid='10000')
+        self._order('delivered', '5000', paid='2000')
+        self._order('pending', '3000', created_at=self.end - timedelta(seconds=1))
+        # Fuera del día de negocio: justo antes del inicio y en el inicio del siguiente
+        self._order('delivered', '7000', created_at=self.start - timedelta(seconds=1))
+        self._order('delivered', '7000', created_at=self.end)
+        
+        with self.assertNumQueries(1):
+            summary = build_daily_summary()
+        
+        self.assertEqual(summary['date'], business_day().isoformat())
+        self.assertEqual(summary['total_orders'], 3)
+        self.assertEqual(summary['by_status']['delivered'], {'name': 'Entregado', 'count': 2})
+        self.assertEqual(summary['by_status']['pending']['count'], 1)
+        self.assertEqual(summary['by_status']['cancelled']['count'], 0)
+        self.assertEqual(summary['total_revenue'], 15000.0)
+        self.assertEqual(summary['total_paid'], 12000.0)
+        self.assertEqual(summary['pending_payment'], 3000.0)
+    
+    def test_endpoint_is_cached(self):
+        """Test que el endpoint responde desde el cache durante unos segundos"""
+        self._order('delivered', '10000')
+        
+        response = self.client.get('/api/pos/orders/orders/daily_summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_orders'], 1)
+        
+        self._order('pending', '3000')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/pos/orders/orders/daily_summary/')
+        self.assertEqual(response.data['total_orders'], 1)
+        
+        with override_settings(ORDERS_DAILY_SUMMARY_CACHE_TIMEOUT=0):
+            response = self.client.get('/api/pos/orders/orders/daily_summary/')
+        self.assertEqual(response.data['total_orders'], 2)
+
+
+class OutboxTest(TestCase):
+    """Tests para el outbox de eventos de integración"""
+    
+    def setUp(self):
+        self.category = MenuCategory.objects.create(name="Test", display_order=1)
+        self.menu_item = MenuItem.objects.create(
+            category=self.category, name="Test Item", price=Decimal('10000')
+        )
+        self.order = Order.create_with_items([{'menu_item': self.menu_item, 'quantity': 1}])
+        self.publisher = LocalPublisher()
+    
+    def _pay_in_full(self):
+        return Payment.objects.create(
+            order=self.order, payment_method='cash',
+            amount=self.order.total, status='completed'
+        )
+    
+    def _record(self, count):
+        for n in range(count):
+            OutboxEvent.objects.create(
+                event_type='ORDEN_PAGADA', routing_key='pos.order.paid', payload={'n': n}
+            )
+    
+    def test_event_written_with_payment(self):
+        """Test que el evento se guarda con el pago y el relay se pide al confirmar"""
+        with patch('orders.tasks.relay_outbox.apply_async') as relay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._pay_in_full()
+                relay.assert_not_called()
+        
+        relay.assert_called_once()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.payload['order_id'], self.order.id)
+        self.assertEqual(event.payload['order_number'], self.order.order_number)
+        self.assertIsNone(event.sent_at)
+    
+    @override_settings(MENU_BOM_CACHE=True)
+    def test_event_deductions_deduplicated(self):
+        """Test que ORDEN_PAGADA suma por producto con una consulta para los items"""
+        cache.clear()
+        fries = MenuItem.objects.create(category=self.category, name="Papas", price=Decimal('3000'))
+        MenuItemComponent.objects.create(
+            menu_item=self.menu_item, component_type='product', product_id=7, quantity=Decimal('0.150')
+        )
+        MenuItemComponent.objects.create(
+            menu_item=fries, component_type='product', product_id=7, quantity=Decimal('0.050')
+        )
+        OrderItem.objects.create(order=self.order, menu_item=fries, quantity=2)
+        get_boms([self.menu_item.id, fries.id])
+        
+        with self.assertNumQueries(1):
+            payload = build_order_paid_event(self.order)
+        
+        self.assertEqual(payload['stock_deductions']['products'], [{'product_id': 7, 'quantity': 0.25}])
+    
+    def test_rollback_discards_event(self):
+        """Test que si la transacción del pago se deshace no queda evento"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self._pay_in_full()
+                raise RuntimeError
+        
+        self.assertFalse(OutboxEvent.objects.exists())
+    
+    def test_relay_publishes_in_batches(self):
+        """Test que el relay publica en orden, en lotes, y marca los eventos como enviados"""
+        self._record(5)
+        
+        stats = OutboxRelay(publisher=self.publisher, batch_size=2).drain()
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(stats['batches'], 3)
+        self.assertGreater(stats['events_per_sec'], 0)
+        self.assertEqual(
+            [json.loads(message['body'])['n'] for message in self.publisher.messages],
+            [0, 1, 2, 3, 4]
+        )
+        self.assertFalse(OutboxEvent.objects.filter(sent_at__isnull=True).exists())
+        
+        # Un segundo relay no vuelve a publicar
+        self.assertEqual(OutboxRelay(publisher=self.publisher).drain()['sent'], 0)
+    
+    def test_recovery_after_broker_outage(self):
+        """Test que los eventos esperan durante una caída del broker y se publican al volver"""
+        self._record(3)
+        
+        self.publisher.available = False
+        stats = OutboxRelay(publisher=self.publisher).drain()
+        self.assertEqual(stats['sent'], 0)
+        self.assertIsNotNone(stats['error'])
+        first = OutboxEvent.objects.first()
+        self.assertEqual(first.attempts, 1)
+        self.assertTrue(first.last_error)
+        
+        self.publisher.available = True
+        stats = OutboxRelay(publisher=self.publisher).drain()
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(len(self.publisher.messages), 3)
+        first.refresh_from_db()
+        self.assertIsNotNone(first.sent_at)
+        self.assertEqual(first.last_error, '')
+    
+    def test_broker_failure_mid_batch(self):
+        """Test que si el broker falla a mitad de lote solo quedan pendientes los no confirmados"""
+        self._record(4)
+        publish = self.publisher.publish
+        
+        def flaky_publish(*args, **kwargs):
+            if len(self.publisher.messages) == 2:
+                raise PublishError("conexión perdida")
+            publish(*args, **kwargs)
+        
+        self.publisher.publish = flaky_publish
+        stats = OutboxRelay(publisher=self.publisher).drain()
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(OutboxEvent.objects.filter(sent_at__isnull=True).count(), 2)
+    
+    def test_bench_command(self):
+        """Test del benchmark del relay con el broker local"""
+        out = StringIO()
+        call_command('relay_outbox', bench=50, stdout=out)
+        self.assertIn('eventos/s', out.getvalue())
+        self.assertIn('broker local: 50', out.getvalue())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class RabbitMQPublisherTest(TestCase):
+    """Tests para el publicador AMQP persistente"""
+    
+    def setUp(self):
+        self.broker = LocalAMQPBroker()
+        self.publisher = RabbitMQPublisher(
+            connection_factory=self.broker.connect,
+            properties_factory=lambda message_id=None: {'message_id': message_id}
+        )
+    
+    def test_connection_reused(self):
+        """Test que varios mensajes usan una sola conexión y un solo exchange_declare"""
+        for n in range(5):
+            self.publisher.publish('pos.order.paid', json.dumps({'n': n}), message_id=str(n))
+        
+        self.assertEqual(self.broker.connections_opened, 1)
+        self.assertEqual(self.broker.exchanges_declared, 1)
+        self.assertEqual(len(self.broker.messages), 5)
+        self.assertEqual(self.broker.messages[0]['exchange'], 'restaurant_events')
+        self.assertEqual(self.broker.messages[4]['properties'], {'message_id': '4'})
+    
+    def test_reconnects_after_broker_restart(self):
+        """Test que si el broker cierra la conexión se reconecta sin volver a declarar el exchange"""
+        self.publisher.publish('pos.order.paid', '{}')
+        self.broker.drop_connections()
+        self.publisher.publish('pos.order.paid', '{}')
+        
+        self.assertEqual(self.broker.connections_opened, 2)
+        self.assertEqual(self.broker.exchanges_declared, 1)
+        self.assertEqual(len(self.broker.messages), 2)
+    
+    def test_broker_down_raises_publish_error(self):
+        """Test que con el broker caído se lanza PublishError y luego se recupera"""
+        self.broker.available = False
+        with self.assertRaises(PublishError):
+            self.publisher.publish('pos.order.paid', '{}')
+        
+        self.broker.available = True
+        self.publisher.publish('pos.order.paid', '{}')
+        self.assertEqual(len(self.broker.messages), 1)
+    
+    def test_new_connection_after_fork(self):
+        """Test que un proceso hijo no reutiliza la conexión heredada"""
+        self.publisher.publish('pos.order.paid', '{}')
+        inherited = self.publisher._connection
+        
+        with patch('orders.amqp.os.getpid', return_value=-1):
+            self.publisher.publish('pos.order.paid', '{}')
+        
+        self.assertEqual(self.broker.connections_opened, 2)
+        self.assertTrue(inherited.is_open)
+    
+    def test_bench_command(self):
+        """Test del benchmark de conexión por evento contra conexión persistente"""
+        out = StringIO()
+        call_command('bench_amqp_publisher', events=20, handshake_ms=1, stdout=out)
+        self.assertIn('Conexión persistente', out.getvalue())
+        self.assertIn('1 conexiones', out.getvalue())
+
+
+class KDSBroadcasterTest(TestCase):
+    """Tests para el envío agrupado de órdenes al KDS"""
+    
+    def setUp(self):
+        self.zone = Zone.objects.create(name="Test Zone")
+        self.table = Table.objects.create(zone=self.zone, number="T1", capacity=4)
+        self.category = MenuCategory.objects.create(name="Test", display_order=1)
+        self.menu_item = MenuItem.objects.create(
+            category=self.category, name="Test Item", price=Decimal('10000')
+        )
+        self.orders = [
+            Order.create_with_items(
+                [{'menu_item': self.menu_item, 'quantity': 2}], table=self.table
+            )
+            for _ in range(3)
+        ]
+        
+        self.channel_layer = MagicMock()
+        self.channel_layer.group_send = AsyncMock()
+        layer_patcher = patch('orders.kds.get_channel_layer', return_value=self.channel_layer)
+        layer_patcher.start()
+        self.addCleanup(layer_patcher.stop)
+    
+    def test_orders_coalesced_into_one_message(self):
+        """Test que varias órdenes modificadas se envían en un solo mensaje"""
+        broadcaster = KDSBroadcaster(window_ms=0)
+        
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            for order in self.orders:
+                broadcaster.mark_dirty(order.id)
+                broadcaster.mark_dirty(order.id)
+        
+        # Nada se envía antes de confirmar la transacción
+        self.channel_layer.group_send.assert_not_called()
+        
+        broadcaster._window_ms = 1000
+        for callback in callbacks:
+            callback()
+        self.channel_layer.group_send.assert_not_called()
+        
+        # Órdenes e items con menu_item en dos consultas
+        with self.assertNumQueries(2):
+            broadcaster.flush()
+        
+        self.channel_layer.group_send.assert_called_once()
+        group, message = self.channel_layer.group_send.call_args.args
+        self.assertEqual(group, 'kds')
+        self.assertEqual(message['type'], 'order_batch')
+        self.assertEqual(len(message['orders']), 3)
+        self.assertEqual(message['orders'][0]['items'][0]['menu_item_name'], 'Test Item')
+    
+    def test_flush_latency_is_measured(self):
+        """Test que se registran las métricas de latencia de envío"""
+        broadcaster = KDSBroadcaster(window_ms=0)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcaster.mark_dirty(self.orders[0].id)
+        
+        stats = broadcaster.stats()
+        self.assertEqual(stats['flushes'], 1)
+        self.assertEqual(stats['orders_sent'], 1)
+        self.assertGreaterEqual(stats['max_latency_ms'], stats['last_latency_ms'])
+        self.assertGreater(stats['last_latency_ms'], 0)
+    
+    def test_send_error_does_not_break_committed_write(self):
+        """Test que un error del channel layer al enviar no llega a la request"""
+        broadcaster = KDSBroadcaster(window_ms=0)
+        self.channel_layer.group_send.side_effect = ConnectionError("redis caído")
+        
+        with self.assertLogs('orders.kds', level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                broadcaster.mark_dirty(self.orders[0].id)
+        
+        self.assertEqual(broadcaster.stats()['flushes'], 0)
+
+
+class KDSEventLogTest(TestCase):
+    """Tests para el registro de eventos del KDS con secuencias"""
+    
+    def setUp(self):
+        self.store = MemoryKDSStore(max_events=3)
+    
+    def _append(self, *order_ids):
+        return self.store.append([{'order_id': order_id} for order_id in order_ids])
+    
+    def test_sequences_are_monotonic(self):
+        """Test que cada evento recibe la siguiente secuencia"""
+        events = self._append(10, 11)
+        events += self._append(10)
+        
+        self.assertEqual([event['seq'] for event in events], [1, 2, 3])
+        self.assertEqual(self.store.current_seq(), 3)
+    
+    def test_resume_returns_only_missed_events(self):
+        """Test que al reanudar solo se reciben los eventos perdidos"""
+        self._append(1, 2, 3)
+        
+        events = self.store.events_since(self.store.epoch, 1)
+        self.assertEqual([event['order_id'] for event in events], [2, 3])
+        self.assertEqual(self.store.events_since(self.store.epoch, 3), [])
+    
+    def test_snapshot_when_too_far_behind(self):
+        """Test que un cliente muy atrasado debe pedir un snapshot"""
+        self._append(1, 2, 3, 4, 5)
+        
+        self.assertIsNone(self.store.events_since(self.store.epoch, 1))
+        self.assertEqual(len(self.store.events_since(self.store.epoch, 2)), 3)
+    
+    def test_snapshot_when_epoch_changed(self):
+        """Test que una época distinta o una secuencia futura piden snapshot"""
+        self._append(1)
+        
+        self.assertIsNone(self.store.events_since('otra-epoca', 0))
+        self.assertIsNone(self.store.events_since(self.store.epoch, 5))
+    
+    def test_events_carry_epoch(self):
+        """Test que cada evento lleva la época del registro"""
+        events = self._append(1, 2)
+        self.assertEqual({event['epoch'] for event in events}, {self.store.epoch})
+    
+    def test_without_shared_store_events_are_unsequenced(self):
+        """Test que sin registro compartido no hay secuencias ni reanudación"""
+        with override_settings(KDS_STORE_URL=''), patch('orders.kds_store._store', None):
+            with self.assertLogs('orders.kds_store', level='WARNING'):
+                store = get_kds_store()
+            self.assertIsInstance(store, LocalKDSStore)
+        
+        events = store.append([{'order_id': 1}])
+        self.assertEqual(events, [{'epoch': store.epoch, 'seq': None, 'order_id': 1}])
+        self.assertIsNone(store.events_since(store.epoch, 0))
+
+
+class KDSBoardSnapshotTest(TestCase):
+    """Tests para el tablero materializado del KDS"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.zone = Zone.objects.create(name="Test Zone")
+        self.table = Table.objects.create(zone=self.zone, number="T1", capacity=4)
+        self.category = MenuCategory.objects.create(name="Test", display_order=1)
+        self.menu_item = MenuItem.objects.create(
+            category=self.category, name="Test Item", price=Decimal('10000')
+        )
+        self.order = Order.create_with_items(
+            [{'menu_item': self.menu_item, 'quantity': 2}], table=self.table
+        )
+        Order.create_with_items(
+            [{'menu_item': self.menu_item, 'quantity': 1}], table=self.table, status='ready'
+        )
+        
+        self.store = MemoryKDSStore()
+        store_patcher = patch('orders.kds_store._store', self.store)
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
+    
+    def test_snapshot_reads_current_board(self):
+        """Test que el registro en memoria arma el tablero desde la base de datos en cada snapshot"""
+        with self.assertNumQueries(2):
+            snapshot = json.loads(kds_snapshot())
+        self.assertEqual(snapshot['type'], 'initial_orders')
+        self.assertEqual(snapshot['epoch'], self.store.epoch)
+        self.assertEqual([order['order_id'] for order in snapshot['orders']], [self.order.id])
+        
+        # Un cambio hecho en otro proceso no pasa por este registro
+        Order.objects.filter(pk=self.order.pk).update(status='preparing')
+        snapshot = json.loads(kds_snapshot())
+        self.assertEqual(snapshot['orders'][0]['status'], 'preparing')
+        
+        self.store.append(build_kds_payloads([self.order.id]))
+        self.assertEqual(json.loads(kds_snapshot())['seq'], 1)
+    
+    def test_deleted_order_leaves_board(self):
+        """Test que una orden eliminada se envía como 'deleted' y sale del tablero"""
+        kds_snapshot()
+        order_id = self.order.id
+        self.order.delete()
+        
+        events = self.store.append(build_kds_payloads([order_id]))
+        self.assertEqual(events[0]['status'], 'deleted')
+        self.assertEqual(json.loads(kds_snapshot())['orders'], [])
+    
+    @override_settings(KDS_BROADCAST_WINDOW_MS=0)
+    def test_destroy_sends_deleted_order(self):
+        """Test que al eliminar una orden por la API el KDS la recibe como 'deleted'"""
+        channel_layer = MagicMock()
+        channel_layer.group_send = AsyncMock()
+        order_id = self.order.id
+        
+        with patch('orders.kds.get_channel_layer', return_value=channel_layer):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(f'/api/pos/orders/orders/{order_id}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        _, message = channel_layer.group_send.call_args.args
+        self.assertEqual(
+            [(order['order_id'], order['status']) for order in message['orders']],
+            [(order_id, 'deleted')]
+        )
+    
+    def test_rest_endpoint_serves_snapshot(self):
+        """Test que el endpoint REST entrega el mismo snapshot que el WebSocket"""
+        response = self.client.get('/api/pos/orders/orders/kds/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, kds_snapshot())
+        self.assertEqual(len(json.loads(response.content)['orders']), 1)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class KDSConsumerResumeTest(TransactionTestCase):
+    """Tests para la reconexión del KDS con last_seq"""
+    
+    def setUp(self):
+        self.store = MemoryKDSStore()
+        store_patcher = patch('orders.kds_store._store', self.store)
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
+    
+    async def _connect(self, query_string=''):
+        communicator = WebsocketCommunicator(KDSConsumer.as_asgi(), f'/ws/kds/{query_string}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        message = await communicator.receive_json_from()
+        await communicator.disconnect()
+        return message
+    
+    async def test_connect_without_seq_sends_snapshot(self):
+        """Test que sin last_seq se envía el snapshot con su secuencia"""
+        self.store.append([{'order_id': 1}])
+        
+        message = await self._connect()
+        self.assertEqual(message['type'], 'initial_orders')
+        self.assertEqual(message['seq'], 1)
+        self.assertEqual(message['epoch'], self.store.epoch)
+    
+    async def test_reconnect_receives_only_missed_events(self):
+        """Test que al reconectar se reciben solo los eventos perdidos"""
+        self.store.append([{'order_id': 1}, {'order_id': 2}, {'order_id': 3}])
+        
+        message = await self._connect(f'?epoch={self.store.epoch}&last_seq=1')
+        self.assertEqual(message['type'], 'resume')
+        self.assertEqual([event['seq'] for event in message['orders']], [2, 3])
+    
+    async def test_reconnect_from_other_epoch_gets_snapshot(self):
+        """Test que un cliente de otra época recibe un snapshot"""
+        message = await self._connect('?epoch=vieja&last_seq=10')
+        self.assertEqual(message['type'], 'initial_orders')
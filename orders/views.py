@@ -2,10 +2,14 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.http import HttpResponse
+from django.db.models import Q, Sum, F
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime
 from .models import Order, OrderItem, Payment
+from .kds import kds_broadcaster, kds_snapshot
+from .summary import get_daily_summary
 from .serializers import (
     OrderSerializer, OrderListSerializer, OrderCreateSerializer, OrderUpdateSerializer,
     OrderItemSerializer, OrderItemCreateSerializer,
@@ -38,7 +42,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Order.objects.select_related('table', 'table__zone').prefetch_related(
-            'items__menu_item', 'payments'
+            'items__menu_item__components', 'payments'
         )
         
         # Filtrar por mesa
@@ -101,7 +105,12 @@ class OrderViewSet(viewsets.ModelViewSet):
                 instance.table.status = 'available'
                 instance.table.save()
         
+        order_id = instance.id
         instance.delete()
+        
+        # Sacar la orden del tablero del KDS: se marca después de borrarla para
+        # que el envío la encuentre eliminada y la mande como 'deleted'
+        kds_broadcaster.mark_dirty(order_id)
 
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
@@ -152,6 +161,9 @@ class OrderViewSet(viewsets.ModelViewSet):
             item.delete()
             order.calculate_total()
             
+            # Broadcast a KDS
+            order.broadcast_to_kds()
+            
             return Response(OrderSerializer(order).data)
         except OrderItem.DoesNotExist:
             return Response(
@@ -194,89 +206,64 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Agregar un pago a una orden"""
         order = self.get_object()
         
-        serializer = PaymentCreateSerializer(
-            data=request.data,
-            context={'order': order}
-        )
-        
-        if serializer.is_valid():
-            payment = serializer.save(order=order, status='completed')
-            
-            return Response(
-                PaymentSerializer(payment).data,
-                status=status.HTTP_201_CREATED
+        # Bloquear la orden mientras se valida el monto pendiente y se registra
+        # el pago, para que dos pagos simultáneos no superen el total
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(pk=order.pk)
+            serializer = PaymentCreateSerializer(
+                data=request.data,
+                context={'order': order}
             )
+            
+            if serializer.is_valid():
+                payment = serializer.save(order=order, status='completed')
+                
+                return Response(
+                    PaymentSerializer(payment).data,
+                    status=status.HTTP_201_CREATED
+                )
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def kds(self, request):
-        """Obtener órdenes para el Kitchen Display System"""
-        orders = self.get_queryset().filter(
-            status__in=['pending', 'preparing']
-        ).order_by('created_at')
-        
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        """
+        Obtener el tablero del Kitchen Display System.
+        Retorna el mismo snapshot que reciben las pantallas por WebSocket
+        (época, secuencia y órdenes), ya serializado.
+        """
+        return HttpResponse(kds_snapshot(), content_type='application/json')
 
     @action(detail=False, methods=['get'])
     def daily_summary(self, request):
-        """Obtener resumen de órdenes del día"""
-        today = timezone.now().date()
-        orders = self.get_queryset().filter(created_at__date=today)
-        
-        summary = {
-            'date': today.isoformat(),
-            'total_orders': orders.count(),
-            'by_status': {},
-            'total_revenue': 0,
-            'total_paid': 0,
-            'pending_payment': 0,
-        }
-        
-        # Por estado
-        for status_code, status_name in Order.STATUS_CHOICES:
-            count = orders.filter(status=status_code).count()
-            summary['by_status'][status_code] = {
-                'name': status_name,
-                'count': count
-            }
-        
-        # Totales financieros
-        completed_orders = orders.filter(status='delivered')
-        summary['total_revenue'] = float(completed_orders.aggregate(
-            total=Sum('total')
-        )['total'] or 0)
-        
-        # Total pagado
-        from django.db.models import Sum as DSum
-        total_paid = Payment.objects.filter(
-            order__in=orders,
-            status='completed'
-        ).aggregate(total=DSum('amount'))['total'] or 0
-        summary['total_paid'] = float(total_paid)
-        
-        summary['pending_payment'] = summary['total_revenue'] - summary['total_paid']
-        
-        return Response(summary)
+        """
+        Obtener resumen de órdenes del día de negocio.
+        Se cachea por unos segundos (ver orders/summary.py).
+        """
+        return Response(get_daily_summary())
 
     @action(detail=False, methods=['get'])
     def unpaid(self, request):
         """Obtener órdenes con pagos pendientes"""
-        orders = []
-        
-        for order in self.get_queryset().filter(status__in=['pending', 'preparing', 'ready', 'delivered']):
-            if not order.is_fully_paid:
-                total_paid = sum(p.amount for p in order.payments.filter(status='completed'))
-                orders.append({
-                    'id': order.id,
-                    'order_number': order.order_number,
-                    'table': order.table.number if order.table else None,
-                    'total': float(order.total),
-                    'paid': float(total_paid),
-                    'remaining': float(order.total - total_paid),
-                    'status': order.status,
-                })
+        unpaid_orders = self.get_queryset().prefetch_related(None).filter(
+            status__in=['pending', 'preparing', 'ready', 'delivered'],
+            amount_paid__lt=F('total')
+        ).values(
+            'id', 'order_number', 'table__number', 'total', 'amount_paid', 'status'
+        ).order_by('-created_at')
+        
+        orders = [
+            {
+                'id': order['id'],
+                'order_number': order['order_number'],
+                'table': order['table__number'],
+                'total': float(order['total']),
+                'paid': float(order['amount_paid']),
+                'remaining': float(order['total'] - order['amount_paid']),
+                'status': order['status'],
+            }
+            for order in unpaid_orders
+        ]
         
         return Response(orders)
 
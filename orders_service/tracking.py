@@ -0,0 +1,77 @@
+"""
+Seguimiento de cambios en campos de modelos.
+
+Guarda una foto de los campos rastreados cuando la instancia se carga desde
+la base de datos, de modo que al guardar se puede saber qué cambió sin
+volver a consultar la fila.
+"""
+
+
+class FieldTrackerMixin:
+    """
+    Mixin para modelos que necesitan reaccionar a cambios de ciertos campos.
+
+    Uso:
+        class Order(FieldTrackerMixin, models.Model):
+            tracked_fields = ('status', 'table')
+
+    Dentro de save(), antes de llamar a super().save(), has_changed() y
+    previous_value() comparan contra los valores cargados. Después de guardar
+    la foto se actualiza con los valores escritos.
+    """
+
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_tracked_fields(fields)
+
+    def _tracked_attname(self, field_name):
+        return self._meta.get_field(field_name).attname
+
+    def _snapshot_tracked_fields(self, fields=None):
+        """Guarda los valores actuales de los campos rastreados (no diferidos)"""
+        if not hasattr(self, '_tracked_values'):
+            self._tracked_values = {}
+        deferred = self.get_deferred_fields()
+
+        for name in self.tracked_fields:
+            attname = self._tracked_attname(name)
+            if fields is not None and name not in fields and attname not in fields:
+                continue
+            if attname in deferred:
+                continue
+            self._tracked_values[name] = getattr(self, attname)
+
+    def has_changed(self, field_name):
+        """
+        Indica si el campo cambió desde que se cargó la instancia.
+        Las instancias nuevas o los campos que no se cargaron cuentan como cambiados.
+        """
+        if self._state.adding:
+            return True
+        tracked_values = getattr(self, '_tracked_values', {})
+        if field_name not in tracked_values:
+            return True
+        return getattr(self, self._tracked_attname(field_name)) != tracked_values[field_name]
+
+    def previous_value(self, field_name):
+        """Valor del campo al cargarse la instancia (None si es nueva o no se cargó)"""
+        if self._state.adding:
+            return None
+        return getattr(self, '_tracked_values', {}).get(field_name)
+
+    @property
+    def changed_fields(self):
+        """Conjunto de campos rastreados que cambiaron"""
+        return {name for name in self.tracked_fields if self.has_changed(name)}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields(kwargs.get('update_fields'))
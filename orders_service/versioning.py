@@ -0,0 +1,61 @@
+"""
+Versiones compartidas en el cache de Django para invalidar datos que cada
+proceso guarda en memoria.
+
+El proceso que cambia los datos incrementa la versión al confirmarse la
+transacción; los demás comparan la versión vigente con la de su copia y la
+descartan si cambió. Como la versión vive en el cache, solo sirve con un
+cache compartido entre procesos (CACHE_URL): cada uso se activa con su propio
+setting, que por defecto depende de que CACHE_URL esté configurado.
+"""
+
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class CacheVersion:
+    """
+    Versión compartida de unos datos cacheados por proceso.
+
+    Uso:
+        menu_version = CacheVersion('menu:snapshot:version', 'MENU_SNAPSHOT_CACHE')
+
+        if menu_version.enabled():
+            version = menu_version.current()
+        ...
+        menu_version.invalidate()
+    """
+
+    def __init__(self, key, setting):
+        self.key = key
+        self.setting = setting
+
+    def enabled(self):
+        return getattr(settings, self.setting, False)
+
+    def current(self):
+        """
+        Versión vigente. Si el cache no la tiene (primer uso o cache vaciado)
+        se crea una nueva, distinta de las anteriores, y todos los procesos
+        descartan sus copias.
+        """
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, time.time_ns(), timeout=None)
+            version = cache.get(self.key)
+        return version
+
+    def bump(self):
+        """Incrementa la versión y retorna la nueva; None si no existía y se creó otra"""
+        try:
+            return cache.incr(self.key)
+        except ValueError:
+            cache.set(self.key, time.time_ns(), timeout=None)
+            return None
+
+    def invalidate(self):
+        """Incrementa la versión cuando se confirme la transacción actual, si está activa"""
+        if self.enabled():
+            transaction.on_commit(self.bump)
@@ -1,44 +1,40 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from .events import parse_zone_ids, subscription_groups
 
 
 class TableStatusConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer para actualizaciones en tiempo real del estado de las mesas.
+
+    Con ?zones=1,2 recibe solo los eventos de esas zonas; sin el parámetro
+    recibe los de todo el salón (ver pos/events.py).
     """
-    
+
     async def connect(self):
-        # Unirse al grupo de mesas
-        self.room_group_name = 'tables'
-        
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-        
+        try:
+            zone_ids = parse_zone_ids(self.scope.get('query_string', b'').decode())
+        except ValueError:
+            await self.close(code=4400)
+            return
+
+        self.subscribed_groups = subscription_groups(zone_ids)
+        for group in self.subscribed_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+
         await self.accept()
-    
+
     async def disconnect(self, close_code):
-        # Salir del grupo
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
-    
+        # Salir de los grupos
+        for group in getattr(self, 'subscribed_groups', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
     async def receive(self, text_data):
         """Recibir mensajes del WebSocket (opcional)"""
         pass
-    
-    async def table_status_update(self, event):
+
+    async def table_event(self, event):
         """
-        Enviar actualización de estado de mesa al WebSocket
+        Enviar al WebSocket un evento de mesas tal como lo armó pos/events.py
         """
-        await self.send(text_data=json.dumps({
-            'type': 'table_status_update',
-            'table_id': event['table_id'],
-            'table_number': event['table_number'],
-            'zone': event['zone'],
-            'status': event['status'],
-            'timestamp': event['timestamp'],
-        }))
+        await self.send(text_data=json.dumps(event['event']))
@@ -0,0 +1,131 @@
+"""
+Eventos de mesas para los planos del salón (WebSocket ws/tables/).
+
+Los eventos se envían solo después de confirmarse la transacción y cada uno
+va al grupo global 'tables' y al grupo de su zona ('tables.zone.<id>'). Los
+clientes que muestran una parte del salón se conectan con ?zones=1,2 y
+reciben solo los eventos de esas zonas; sin el parámetro reciben todos.
+
+Todos los eventos viajan por el channel layer con el mismo formato
+({'type': 'table.event', 'event': {...}}) y TableStatusConsumer reenvía
+`event` tal cual al cliente, así que el esquema se define solo aquí:
+
+    table_status_update: table_id, table_number, zone_id, status,
+                         previous_status, timestamp
+    table_layout_update: tables (id, zone_id, position_x, position_y,
+                         width, height), timestamp
+
+Un cambio de distribución va completo al grupo global y cada zona recibe un
+solo evento con sus mesas.
+"""
+
+import logging
+from urllib.parse import parse_qs
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TABLES_GROUP = 'tables'
+
+STATUS_EVENT = 'table_status_update'
+LAYOUT_EVENT = 'table_layout_update'
+
+LAYOUT_FIELDS = ('position_x', 'position_y', 'width', 'height')
+
+
+def zone_group(zone_id):
+    return f'tables.zone.{zone_id}'
+
+
+def table_status_event(table, previous_status=None):
+    """Evento de cambio de estado de una mesa (sin consultar la zona)"""
+    return {
+        'type': STATUS_EVENT,
+        'table_id': table.id,
+        'table_number': table.number,
+        'zone_id': table.zone_id,
+        'status': table.status,
+        'previous_status': previous_status,
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def table_layout(table):
+    """Posición y tamaño de una mesa en el plano"""
+    return {
+        'id': table.id,
+        'zone_id': table.zone_id,
+        **{field: getattr(table, field) for field in LAYOUT_FIELDS},
+    }
+
+
+def _send(group_events):
+    """Envía [(grupo, evento)] por el channel layer"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        for group, event in group_events:
+            async_to_sync(channel_layer.group_send)(group, {'type': 'table.event', 'event': event})
+    except Exception as e:
+        # La transacción ya se confirmó: un channel layer caído no debe romper la request
+        logger.error(f"Error enviando evento de mesas: {str(e)}")
+
+
+def publish_table_event(event, zone_ids):
+    """Envía un evento al grupo global y a los grupos de las zonas indicadas"""
+    _send(
+        [(TABLES_GROUP, event)] +
+        [(zone_group(zone_id), event) for zone_id in sorted(set(zone_ids))]
+    )
+
+
+def publish_table_layout(layouts):
+    """
+    Envía un cambio de distribución: un evento con todas las mesas al grupo
+    global y uno por zona con las mesas de esa zona.
+    """
+    timestamp = timezone.now().isoformat()
+    by_zone = {}
+    for layout in layouts:
+        by_zone.setdefault(layout['zone_id'], []).append(layout)
+
+    _send(
+        [(TABLES_GROUP, {'type': LAYOUT_EVENT, 'tables': layouts, 'timestamp': timestamp})] +
+        [
+            (zone_group(zone_id), {'type': LAYOUT_EVENT, 'tables': zone_layouts, 'timestamp': timestamp})
+            for zone_id, zone_layouts in sorted(by_zone.items())
+        ]
+    )
+
+
+def publish_table_status(event):
+    """Aplica el cambio al estado del salón del proceso y lo envía a los clientes"""
+    from .floor_state import table_status_changed
+
+    table_status_changed(event['table_id'], event['status'])
+    publish_table_event(event, [event['zone_id']])
+
+
+def parse_zone_ids(query_string):
+    """
+    IDs de zona del parámetro ?zones=1,2 de la conexión. Retorna None si no
+    se pidió ninguna zona y lanza ValueError si el parámetro es inválido.
+    """
+    values = parse_qs(query_string).get('zones')
+    if not values:
+        return None
+    zone_ids = {int(zone_id) for value in values for zone_id in value.split(',') if zone_id.strip()}
+    if not zone_ids:
+        raise ValueError("zones vacío")
+    return sorted(zone_ids)
+
+
+def subscription_groups(zone_ids):
+    """Grupos a los que se une un cliente: los de sus zonas o el global"""
+    if zone_ids is None:
+        return [TABLES_GROUP]
+    return [zone_group(zone_id) for zone_id in zone_ids]
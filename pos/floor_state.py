@@ -0,0 +1,163 @@
+"""
+Estado del salón (zonas y estado de cada mesa) para el resumen de mesas.
+
+summarize_from_db() arma el resumen con una sola consulta agrupada por zona.
+Con POS_FLOOR_STATE_CACHE activo cada proceso guarda además el estado del
+salón en memoria (FloorState) y responde el resumen sin consultar la base de
+datos:
+
+- Los cambios de estado de una mesa se aplican al estado en memoria cuando
+  se confirma la transacción (lo llama Table.broadcast_status_change()).
+- Cada cambio incrementa una versión en el cache de Django. El proceso que
+  aplicó el cambio queda al día; los demás ven otra versión y recargan el
+  salón en la siguiente lectura.
+- Crear, borrar, mover o desactivar mesas y cambiar zonas invalida el estado
+  (invalidate_floor_state()) y todos los procesos lo recargan.
+"""
+
+import threading
+from orders_service.versioning import CacheVersion
+
+TABLE_STATUSES = ('available', 'occupied', 'reserved')
+
+
+def build_summary(zone_rows):
+    """
+    Resumen de mesas a partir de filas por zona (zone_id, zone_name,
+    is_active, total y un conteo por estado). Los totales suman todas las
+    zonas y el detalle incluye solo las zonas activas.
+    """
+    summary = {'total': 0}
+    summary.update({status: 0 for status in TABLE_STATUSES})
+
+    by_zone = []
+    for row in zone_rows:
+        summary['total'] += row['total']
+        for status in TABLE_STATUSES:
+            summary[status] += row[status]
+        if row['is_active']:
+            by_zone.append({
+                'zone_id': row['zone_id'],
+                'zone_name': row['zone_name'],
+                'total': row['total'],
+                **{status: row[status] for status in TABLE_STATUSES},
+            })
+
+    summary['by_zone'] = by_zone
+    return summary
+
+
+def summarize_from_db(tables_filter=None):
+    """Resumen de las mesas activas con una consulta (zonas con sus conteos por estado)"""
+    from django.db.models import Q
+    from .models import Zone
+
+    active_tables = Q(tables__is_active=True)
+    if tables_filter is not None:
+        active_tables &= tables_filter
+
+    zones = Zone.objects.with_table_stats(active_tables).order_by('name').values(
+        'id', 'name', 'is_active',
+        'tables_total', 'tables_available', 'tables_occupied', 'tables_reserved'
+    )
+    return build_summary(
+        {
+            'zone_id': zone['id'],
+            'zone_name': zone['name'],
+            'is_active': zone['is_active'],
+            'total': zone['tables_total'],
+            **{status: zone[f'tables_{status}'] for status in TABLE_STATUSES},
+        }
+        for zone in zones
+    )
+
+
+class FloorState:
+    """Zonas y mesas del salón en memoria"""
+
+    def __init__(self, zones, tables):
+        # zones: [{'id', 'name', 'is_active'}], tables: [{'id', 'zone_id', 'status', 'is_active'}]
+        self.zones = {zone['id']: dict(zone) for zone in sorted(zones, key=lambda zone: zone['name'])}
+        self.tables = {table['id']: dict(table) for table in tables}
+
+    @classmethod
+    def load(cls):
+        from .models import Table, Zone
+
+        return cls(
+            Zone.objects.values('id', 'name', 'is_active'),
+            Table.objects.values('id', 'zone_id', 'status', 'is_active'),
+        )
+
+    def set_status(self, table_id, status):
+        """Aplica un cambio de estado; False si la mesa no está en el estado cargado"""
+        table = self.tables.get(table_id)
+        if table is None:
+            return False
+        table['status'] = status
+        return True
+
+    def zone_stats(self, active_only=True):
+        """{zone_id: {'total', 'available', 'occupied', 'reserved'}} de cada zona"""
+        stats = {
+            zone_id: {'total': 0, **{status: 0 for status in TABLE_STATUSES}}
+            for zone_id in self.zones
+        }
+        for table in self.tables.values():
+            if active_only and not table['is_active']:
+                continue
+            zone = stats[table['zone_id']]
+            zone['total'] += 1
+            if table['status'] in zone:
+                zone[table['status']] += 1
+        return stats
+
+    def summary(self):
+        stats = self.zone_stats()
+        return build_summary(
+            {
+                'zone_id': zone_id,
+                'zone_name': zone['name'],
+                'is_active': zone['is_active'],
+                **stats[zone_id],
+            }
+            for zone_id, zone in self.zones.items()
+        )
+
+
+floor_version = CacheVersion('pos:floor_state:version', 'POS_FLOOR_STATE_CACHE')
+
+_lock = threading.Lock()
+_local = {'version': None, 'floor': None}
+
+
+def get_floor_state():
+    """Estado del salón de este proceso, recargado si otro proceso lo cambió"""
+    version = floor_version.current()
+    with _lock:
+        if _local['floor'] is None or _local['version'] != version:
+            _local['floor'] = FloorState.load()
+            _local['version'] = version
+        return _local['floor']
+
+
+def table_status_changed(table_id, status):
+    """Aplica un cambio de estado ya confirmado y avisa a los demás procesos"""
+    if not floor_version.enabled():
+        return
+    new_version = floor_version.bump()
+    with _lock:
+        floor = _local['floor']
+        in_sync = (
+            floor is not None and new_version is not None and
+            _local['version'] == new_version - 1
+        )
+        if in_sync and floor.set_status(table_id, status):
+            _local['version'] = new_version
+        else:
+            _local['floor'] = None
+
+
+def invalidate_floor_state():
+    """Obliga a todos los procesos a recargar el salón cuando se confirme la transacción"""
+    floor_version.invalidate()
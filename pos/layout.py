@@ -0,0 +1,109 @@
+"""
+Validación de superposición de mesas en el plano del salón.
+
+Las mesas ocupan un rectángulo de celdas de cuadrícula (position_x,
+position_y, width, height) dentro de su zona. OccupancyGrid guarda qué mesa
+ocupa cada celda de una zona, así que verificar una mesa cuesta lo mismo que
+la cantidad de celdas que cubre, sin compararla contra todas las demás.
+
+Solo cuentan las mesas activas con posición; las que no tienen posición
+todavía no están en el plano.
+
+La verificación y el guardado deben hacerse con las zonas bloqueadas
+(lock_zones()) dentro de la misma transacción: así dos requests simultáneos
+que pasan la verificación no pueden ubicar mesas superpuestas, aunque una de
+ellas sea una mesa nueva que todavía no tiene fila que bloquear.
+"""
+
+from collections import defaultdict
+
+# Lado máximo de una mesa en celdas (acota el costo de verificarla)
+MAX_TABLE_SIZE = 50
+
+
+class OverlapError(ValueError):
+    """Una mesa se superpone con otra de su zona"""
+
+    def __init__(self, table, other):
+        self.table = table
+        self.other = other
+        super().__init__(f"La mesa {table} se superpone con la mesa {other}")
+
+
+def cells(position_x, position_y, width, height):
+    """Celdas (x, y) que cubre un rectángulo"""
+    for x in range(position_x, position_x + width):
+        for y in range(position_y, position_y + height):
+            yield (x, y)
+
+
+def is_placed(position_x, position_y, is_active=True):
+    return is_active and position_x is not None and position_y is not None
+
+
+def lock_zones(zone_ids):
+    """
+    Bloquea las filas de las zonas hasta el fin de la transacción, en orden de
+    id para no generar deadlocks. Serializa los cambios de distribución de
+    cada zona.
+    """
+    from .models import Zone
+
+    list(
+        Zone.objects.select_for_update().filter(id__in=zone_ids)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+class OccupancyGrid:
+    """Celdas ocupadas de una zona: {(x, y): mesa}"""
+
+    def __init__(self):
+        self._cells = {}
+
+    def __len__(self):
+        return len(self._cells)
+
+    def conflict(self, table, position_x, position_y, width, height):
+        """Primera otra mesa que ocupa alguna de esas celdas, o None"""
+        for cell in cells(position_x, position_y, width, height):
+            other = self._cells.get(cell)
+            if other is not None and other != table:
+                return other
+        return None
+
+    def place(self, table, position_x, position_y, width, height):
+        """Ocupa las celdas de la mesa; lanza OverlapError si alguna ya está ocupada"""
+        other = self.conflict(table, position_x, position_y, width, height)
+        if other is not None:
+            raise OverlapError(table, other)
+        for cell in cells(position_x, position_y, width, height):
+            self._cells[cell] = table
+
+    @classmethod
+    def for_zones(cls, zone_ids, exclude_ids=()):
+        """
+        Grillas {zone_id: OccupancyGrid} con las mesas ubicadas de esas zonas
+        (una consulta), sin las mesas de exclude_ids. Las mesas se identifican
+        por su número.
+        """
+        from .models import Table
+
+        grids = defaultdict(cls)
+        tables = Table.objects.filter(
+            zone_id__in=zone_ids,
+            is_active=True,
+            position_x__isnull=False,
+            position_y__isnull=False,
+        ).exclude(id__in=exclude_ids).values_list(
+            'zone_id', 'number', 'position_x', 'position_y', 'width', 'height'
+        )
+        for zone_id, number, position_x, position_y, width, height in tables:
+            # Los datos guardados ya deberían estar libres de superposiciones
+            for cell in cells(position_x, position_y, width, height):
+                grids[zone_id]._cells.setdefault(cell, number)
+        return grids
+
+    @classmethod
+    def for_zone(cls, zone_id, exclude_ids=()):
+        return cls.for_zones([zone_id], exclude_ids)[zone_id]
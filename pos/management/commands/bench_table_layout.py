@@ -0,0 +1,117 @@
+"""
+Benchmark de la validación de superposición de mesas.
+
+Arma en memoria el plano de un salón de eventos grande (mesas de distintos
+tamaños sin superponerse, con pasillos) y compara:
+
+- Guardar el salón completo: comparar cada mesa contra todas las demás
+  (O(n²)) contra ubicarlas en una OccupancyGrid (O(celdas)).
+- Mover una mesa: compararla contra todas las de la zona contra consultar
+  solo las celdas que ocupa.
+
+No usa la base de datos.
+
+Uso:
+    python manage.py bench_table_layout --tables 2000
+    python manage.py bench_table_layout --tables 5000 --moves 5000
+"""
+
+import random
+import time
+from django.core.management.base import BaseCommand
+from pos.layout import OccupancyGrid
+
+
+def overlaps(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+class Command(BaseCommand):
+    help = 'Mide la validación de superposición de mesas en un salón grande'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, default=2000, help='Mesas del salón')
+        parser.add_argument('--moves', type=int, default=2000, help='Movimientos de una mesa a medir')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        layout = self.event_hall(rng, options['tables'])
+        tables = list(layout.items())
+
+        # Salón completo
+        started = time.perf_counter()
+        for index, (number, rect) in enumerate(tables):
+            for other_number, other_rect in tables[index + 1:]:
+                if overlaps(rect, other_rect):
+                    raise AssertionError(f"{number} se superpone con {other_number}")
+        naive_floor = time.perf_counter() - started
+
+        started = time.perf_counter()
+        grid = OccupancyGrid()
+        for number, rect in tables:
+            grid.place(number, *rect)
+        grid_floor = time.perf_counter() - started
+
+        # Mover una mesa a una posición al azar
+        moves = [
+            (rng.choice(tables)[0], rng.randrange(0, 200), rng.randrange(0, 200))
+            for _ in range(options['moves'])
+        ]
+
+        started = time.perf_counter()
+        naive_conflicts = 0
+        for number, x, y in moves:
+            _, _, width, height = layout[number]
+            target = (x, y, width, height)
+            naive_conflicts += any(
+                other_number != number and overlaps(target, other_rect)
+                for other_number, other_rect in tables
+            )
+        naive_move = time.perf_counter() - started
+
+        started = time.perf_counter()
+        grid_conflicts = 0
+        for number, x, y in moves:
+            _, _, width, height = layout[number]
+            grid_conflicts += grid.conflict(number, x, y, width, height) is not None
+        grid_move = time.perf_counter() - started
+
+        if naive_conflicts != grid_conflicts:
+            raise AssertionError(f"Resultados distintos: {naive_conflicts} != {grid_conflicts}")
+
+        moves_count = len(moves)
+        self.stdout.write(f"Mesas: {len(tables)}, celdas ocupadas: {len(grid)}")
+        self.stdout.write(
+            f"Salón completo: comparación por pares {naive_floor * 1000:.1f} ms, "
+            f"grilla {grid_floor * 1000:.1f} ms ({naive_floor / grid_floor:.0f}x)"
+        )
+        self.stdout.write(
+            f"Mover una mesa: comparación por pares {naive_move / moves_count * 1e6:.0f} µs, "
+            f"grilla {grid_move / moves_count * 1e6:.1f} µs ({naive_move / grid_move:.0f}x), "
+            f"{grid_conflicts} de {moves_count} movimientos rechazados"
+        )
+        self.stdout.write(self.style.SUCCESS("Resultados de ambos métodos coinciden"))
+
+    def event_hall(self, rng, count):
+        """
+        Mesas redondas (2x2), rectangulares (3x1, 4x2) e individuales (1x1)
+        en filas con un pasillo de una celda entre mesas.
+        """
+        sizes = [(1, 1), (2, 2), (3, 1), (4, 2)]
+        layout = {}
+        x = y = 0
+        row_height = 0
+        row_width = max(40, int((count * 8) ** 0.5))
+        for n in range(count):
+            width, height = rng.choice(sizes)
+            if x + width > row_width:
+                x = 0
+                y += row_height + 1
+                row_height = 0
+            layout[f"E{n}"] = (x, y, width, height)
+            x += width + 1
+            row_height = max(row_height, height)
+        return layout
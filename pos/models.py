@@ -3,10 +3,34 @@ Modelos de la aplicación POS.
 Gestiona zonas y mesas del restaurante.
 """
 
-from django.db import models
+from functools import partial
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.utils import timezone
+from orders_service.tracking import FieldTrackerMixin
+from .events import (
+    LAYOUT_FIELDS, publish_table_layout, publish_table_status, table_layout, table_status_event
+)
+from .floor_state import invalidate_floor_state
+from .layout import OccupancyGrid, is_placed, lock_zones
+
+
+class ZoneQuerySet(models.QuerySet):
+
+    def with_table_stats(self, tables_filter=None):
+        """
+        Anota la cantidad de mesas de cada zona en total y por estado
+        (tables_total, tables_available, tables_occupied, tables_reserved)
+        en la misma consulta que las zonas. `tables_filter` (un Q sobre
+        tables__...) limita las mesas contadas, p. ej. solo las activas.
+        """
+        tables_filter = tables_filter or models.Q()
+        return self.annotate(
+            tables_total=models.Count('tables', filter=tables_filter or None),
+            tables_available=models.Count('tables', filter=tables_filter & models.Q(tables__status='available')),
+            tables_occupied=models.Count('tables', filter=tables_filter & models.Q(tables__status='occupied')),
+            tables_reserved=models.Count('tables', filter=tables_filter & models.Q(tables__status='reserved')),
+        )
 
 
 class Zone(models.Model):
@@ -17,6 +41,8 @@ class Zone(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ZoneQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Zona"
         verbose_name_plural = "Zonas"
@@ -25,8 +51,78 @@ class Zone(models.Model):
     def __str__(self):
         return self.name
 
-
-class Table(models.Model):
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_floor_state()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_floor_state()
+        return result
+
+
+# Estados de orden que mantienen una mesa con una orden en curso
+ACTIVE_ORDER_STATUSES = ('pending', 'preparing', 'ready')
+
+
+class TableQuerySet(models.QuerySet):
+
+    def with_current_order(self):
+        """
+        Precarga las órdenes activas de cada mesa en `active_orders` (la más
+        reciente primero) con una sola consulta para todo el queryset, así
+        current_order no consulta la base de datos mesa por mesa.
+        """
+        from orders.models import Order
+
+        return self.prefetch_related(models.Prefetch(
+            'orders',
+            queryset=Order.objects.filter(status__in=ACTIVE_ORDER_STATUSES).order_by('-created_at', '-id'),
+            to_attr='active_orders'
+        ))
+
+    def apply_layout(self, changes):
+        """
+        Aplica cambios de posición/tamaño {table_id: {campo: valor}} con un
+        solo UPDATE en una transacción y, al confirmarse, envía un único
+        evento de distribución. Lanza Table.DoesNotExist si falta alguna mesa
+        y OverlapError si la distribución final superpone mesas de una zona.
+        """
+        with transaction.atomic():
+            # Primero las zonas y después las mesas, en el mismo orden que
+            # TableSerializer.save(), para no generar deadlocks
+            zone_ids = set(self.filter(id__in=changes).values_list('zone_id', flat=True))
+            lock_zones(zone_ids)
+            tables = list(self.select_for_update().filter(id__in=changes).order_by('id'))
+            missing = set(changes) - {table.id for table in tables}
+            if missing:
+                raise self.model.DoesNotExist(
+                    f"Mesas inexistentes: {', '.join(str(table_id) for table_id in sorted(missing))}"
+                )
+            # Una mesa que otra transacción movió de zona mientras se esperaba
+            lock_zones({table.zone_id for table in tables} - zone_ids)
+
+            # Las mesas que se mueven se ubican con su posición final sobre el resto de su zona
+            grids = OccupancyGrid.for_zones({table.zone_id for table in tables}, exclude_ids=changes)
+
+            now = timezone.now()
+            for table in tables:
+                for field, value in changes[table.id].items():
+                    setattr(table, field, value)
+                table.updated_at = now
+                if is_placed(table.position_x, table.position_y, table.is_active):
+                    grids[table.zone_id].place(
+                        table.number, table.position_x, table.position_y, table.width, table.height
+                    )
+            self.model.objects.bulk_update(tables, [*LAYOUT_FIELDS, 'updated_at'])
+
+            layouts = [table_layout(table) for table in tables]
+            transaction.on_commit(partial(publish_table_layout, layouts))
+
+        return tables
+
+
+class Table(FieldTrackerMixin, models.Model):
     """Mesa del restaurante."""
     
     STATUS_CHOICES = [
@@ -35,6 +131,10 @@ class Table(models.Model):
         ('reserved', 'Reservada'),
     ]
     
+    # Solo los cambios de estado se notifican a los clientes; zona y
+    # activa cambian la composición del salón (pos/floor_state.py)
+    tracked_fields = ('status', 'zone', 'is_active')
+    
     zone = models.ForeignKey(
         Zone,
         on_delete=models.PROTECT,
@@ -79,6 +179,8 @@ class Table(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TableQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Mesa"
         verbose_name_plural = "Mesas"
@@ -96,38 +198,31 @@ class Table(models.Model):
         """Marca la mesa como ocupada."""
         self.status = 'occupied'
         self.save()
-        self.broadcast_status_change()
 
     def release(self):
         """Libera la mesa."""
         self.status = 'available'
         self.save()
-        self.broadcast_status_change()
 
     def reserve(self):
         """Reserva la mesa."""
         self.status = 'reserved'
         self.save()
-        self.broadcast_status_change()
-
-    def broadcast_status_change(self):
-        """Envía actualización del estado de la mesa via WebSocket."""
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            'tables_status',
-            {
-                'type': 'table_status_update',
-                'table_id': self.id,
-                'table_number': self.number,
-                'zone_name': self.zone.name,
-                'status': self.status,
-            }
-        )
+
+    def broadcast_status_change(self, previous_status=None):
+        """
+        Notifica el cambio de estado de la mesa via WebSocket (grupo global y
+        grupo de su zona) cuando se confirme la transacción.
+        """
+        event = table_status_event(self, previous_status)
+        transaction.on_commit(partial(publish_table_status, event))
 
     @property
     def current_order(self):
-        """Obtiene la orden activa en esta mesa."""
-        return self.orders.filter(status='open').first()
+        """Obtiene la orden activa en esta mesa (precargada con with_current_order())."""
+        if hasattr(self, 'active_orders'):
+            return self.active_orders[0] if self.active_orders else None
+        return self.orders.filter(status__in=ACTIVE_ORDER_STATUSES).order_by('-created_at', '-id').first()
 
     @property
     def is_available(self):
@@ -135,10 +230,21 @@ class Table(models.Model):
         return self.status == 'available'
 
     def save(self, *args, **kwargs):
-        """Al guardar, validar el estado."""
-        is_new = self.pk is None
+        """Al guardar, notificar solo si cambió el estado."""
+        is_new = self._state.adding
+        status_changed = self.has_changed('status')
+        previous_status = self.previous_value('status')
+        floor_changed = is_new or self.has_changed('zone') or self.has_changed('is_active')
         super().save(*args, **kwargs)
         
+        if floor_changed:
+            invalidate_floor_state()
+        
         # Si no es nueva y cambió el estado, broadcast
-        if not is_new:
-            self.broadcast_status_change()
+        if not is_new and status_changed:
+            self.broadcast_status_change(previous_status)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_floor_state()
+        return result
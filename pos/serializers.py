@@ -1,15 +1,21 @@
+from collections import Counter
+from django.db import transaction
 from rest_framework import serializers
 from .models import Zone, Table
+from .layout import MAX_TABLE_SIZE, OccupancyGrid, OverlapError, is_placed, lock_zones
 
 
 class ZoneSerializer(serializers.ModelSerializer):
     tables_count = serializers.SerializerMethodField()
     available_tables = serializers.SerializerMethodField()
+    occupied_tables = serializers.SerializerMethodField()
+    reserved_tables = serializers.SerializerMethodField()
 
     class Meta:
         model = Zone
         fields = ['id', 'name', 'description', 'is_active', 
-                  'tables_count', 'available_tables', 'created_at', 'updated_at']
+                  'tables_count', 'available_tables', 'occupied_tables', 'reserved_tables',
+                  'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
     def to_internal_value(self, data):
@@ -28,11 +34,28 @@ class ZoneSerializer(serializers.ModelSerializer):
         data['descripcion'] = data['description']
         return data
 
+    # Los conteos vienen anotados por Zone.objects.with_table_stats(); sin
+    # anotación (p. ej. al crear una zona) se cuentan con una consulta
+
     def get_tables_count(self, obj):
+        if hasattr(obj, 'tables_total'):
+            return obj.tables_total
         return obj.tables.count()
 
     def get_available_tables(self, obj):
-        return obj.tables.filter(status='available').count()
+        return self._status_count(obj, 'available')
+
+    def get_occupied_tables(self, obj):
+        return self._status_count(obj, 'occupied')
+
+    def get_reserved_tables(self, obj):
+        return self._status_count(obj, 'reserved')
+
+    def _status_count(self, obj, status):
+        annotated = getattr(obj, f'tables_{status}', None)
+        if annotated is not None:
+            return annotated
+        return obj.tables.filter(status=status).count()
 
 
 class TableSerializer(serializers.ModelSerializer):
@@ -79,10 +102,55 @@ class TableSerializer(serializers.ModelSerializer):
         data['alto'] = data.get('height', 1)
         return data
 
+    def validate(self, attrs):
+        """La mesa no puede superponerse con otra mesa ubicada de su zona"""
+        width = self._value(attrs, 'width', 1)
+        height = self._value(attrs, 'height', 1)
+        if width > MAX_TABLE_SIZE or height > MAX_TABLE_SIZE:
+            raise serializers.ValidationError(
+                f"El ancho y el alto no pueden superar {MAX_TABLE_SIZE} celdas"
+            )
+
+        self.check_overlap(attrs)
+        return attrs
+
+    def _value(self, attrs, field, default=None):
+        if field in attrs:
+            return attrs[field]
+        return getattr(self.instance, field, default)
+
+    def check_overlap(self, attrs):
+        position_x = self._value(attrs, 'position_x')
+        position_y = self._value(attrs, 'position_y')
+        if is_placed(position_x, position_y, self._value(attrs, 'is_active', True)):
+            exclude_ids = [self.instance.id] if self.instance else []
+            grid = OccupancyGrid.for_zone(self._value(attrs, 'zone').pk, exclude_ids=exclude_ids)
+            other = grid.conflict(
+                self._value(attrs, 'number'), position_x, position_y,
+                self._value(attrs, 'width', 1), self._value(attrs, 'height', 1)
+            )
+            if other is not None:
+                raise serializers.ValidationError(f"La mesa se superpone con la mesa {other}")
+
+    def save(self, **kwargs):
+        """
+        Guarda con la zona de la mesa (y la anterior, si cambia) bloqueada y
+        vuelve a verificar la superposición: dos requests simultáneos pueden
+        pasar validate() pero no ubicar mesas superpuestas.
+        """
+        attrs = {**self.validated_data, **kwargs}
+        zone_ids = {self._value(attrs, 'zone').pk}
+        if self.instance is not None:
+            zone_ids.add(self.instance.zone_id)
+
+        with transaction.atomic():
+            lock_zones(zone_ids)
+            self.check_overlap(attrs)
+            return super().save(**kwargs)
+
     def get_current_order(self, obj):
-        # Obtener la orden activa actual de la mesa
-        from orders.models import Order
-        order = obj.orders.filter(status__in=['pending', 'preparing', 'ready']).first()
+        # Orden activa actual de la mesa; sin consultas si se usó with_current_order()
+        order = obj.current_order
         if order:
             return {
                 'id': order.id,
@@ -101,3 +169,49 @@ class TableStatusUpdateSerializer(serializers.Serializer):
         instance.status = validated_data['status']
         instance.save()
         return instance
+
+
+class TableLayoutSerializer(serializers.Serializer):
+    """Posición y tamaño de una mesa dentro de un cambio de distribución"""
+    id = serializers.IntegerField()
+    position_x = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    position_y = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    width = serializers.IntegerField(required=False, min_value=1, max_value=MAX_TABLE_SIZE)
+    height = serializers.IntegerField(required=False, min_value=1, max_value=MAX_TABLE_SIZE)
+
+    # Nombres que envía el editor visual del frontend
+    ALIASES = {
+        'posicion_x': 'position_x',
+        'posicion_y': 'position_y',
+        'ancho': 'width',
+        'alto': 'height',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = {self.ALIASES.get(key, key): value for key, value in data.items()}
+        return super().to_internal_value(data)
+
+
+class TableBulkLayoutSerializer(serializers.Serializer):
+    """Cambios de distribución de varias mesas del editor visual"""
+    tables = TableLayoutSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_tables(self, value):
+        counts = Counter(change['id'] for change in value)
+        duplicated = sorted(table_id for table_id, count in counts.items() if count > 1)
+        if duplicated:
+            raise serializers.ValidationError(
+                f"Mesas repetidas: {', '.join(str(table_id) for table_id in duplicated)}"
+            )
+        return value
+
+    def save(self):
+        changes = {
+            change['id']: {field: value for field, value in change.items() if field != 'id'}
+            for change in self.validated_data['tables']
+        }
+        try:
+            return Table.objects.apply_layout(changes)
+        except (Table.DoesNotExist, OverlapError) as e:
+            raise serializers.ValidationError({'tables': [str(e)]})
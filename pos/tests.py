@@ -1,8 +1,20 @@
-from django.test import TestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from . import floor_state
+from .consumers import TableStatusConsumer
+from .events import publish_table_event
+from .layout import OccupancyGrid, OverlapError
 from .models import Zone, Table
+from .serializers import TableSerializer, ZoneSerializer
 
 
 class ZoneModelTest(TestCase):
@@ -126,3 +138,466 @@ class TableAPITest(TestCase):
         
         self.table.refresh_from_db()
         self.assertEqual(self.table.status, 'occupied')
+
+
+class TableChangeTrackingTest(TestCase):
+    """Tests para el seguimiento de cambios de Table"""
+    
+    def setUp(self):
+        self.zone = Zone.objects.create(name="Salón")
+        Table.objects.create(zone=self.zone, number="M1", capacity=4)
+        self.table = Table.objects.get()
+    
+    def test_position_change_does_not_broadcast(self):
+        """Test que mover la mesa no notifica cambios de estado"""
+        self.table.position_x = 3
+        with patch.object(Table, 'broadcast_status_change') as broadcast:
+            with self.assertNumQueries(1):
+                self.table.save()
+        
+        broadcast.assert_not_called()
+    
+    def test_status_change_broadcasts_once(self):
+        """Test que un cambio de estado se notifica una sola vez"""
+        with patch.object(Table, 'broadcast_status_change') as broadcast:
+            self.table.occupy()
+            self.table.occupy()
+        
+        self.assertEqual(broadcast.call_count, 1)
+
+
+class TableCurrentOrderTest(TestCase):
+    """Tests para la orden activa precargada de las mesas"""
+    
+    def setUp(self):
+        from orders.models import Order
+        
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.zone = Zone.objects.create(name="Salón")
+        self.tables = [
+            Table.objects.create(zone=self.zone, number=f"M{n:02d}", capacity=4)
+            for n in range(1, 6)
+        ]
+        Order.objects.create(table=self.tables[0], status='delivered')
+        self.active = Order.objects.create(table=self.tables[0], status='preparing')
+    
+    def add_tables(self, count):
+        from orders.models import Order
+        
+        for n in range(count):
+            table = Table.objects.create(zone=self.zone, number=f"X{n:02d}", capacity=2)
+            Order.objects.create(table=table)
+    
+    def test_current_order_prefetched(self):
+        """Test que la orden activa sale de la precarga"""
+        tables = list(Table.objects.with_current_order())
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(tables[0].current_order, self.active)
+            self.assertIsNone(tables[1].current_order)
+    
+    def test_list_constant_queries(self):
+        """Test que el listado de mesas no hace una consulta por mesa"""
+        # count de la paginación + mesas con su zona + órdenes activas
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/pos/tables/')
+        self.assertEqual(response.data['results'][0]['current_order']['id'], self.active.id)
+        
+        self.add_tables(20)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/pos/tables/')
+        self.assertEqual(response.data['count'], 25)
+    
+    def test_zone_tables_constant_queries(self):
+        """Test que las mesas de una zona y las disponibles no hacen N+1"""
+        self.add_tables(10)
+        
+        # zona + mesas + órdenes activas
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/pos/zones/{self.zone.id}/tables/')
+        # mesas + órdenes activas
+        with self.assertNumQueries(2):
+            self.client.get('/api/pos/tables/available/')
+
+
+class ZoneTableStatsTest(TestCase):
+    """Tests para los conteos de mesas anotados en las zonas"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.add_zone("Salón", ['available', 'available', 'occupied', 'reserved'])
+    
+    def add_zone(self, name, statuses):
+        zone = Zone.objects.create(name=name)
+        for n, table_status in enumerate(statuses):
+            Table.objects.create(zone=zone, number=f"M{n}", capacity=4, status=table_status)
+        return zone
+    
+    def test_stats_annotated(self):
+        """Test que el serializer usa los conteos anotados"""
+        zone = Zone.objects.with_table_stats().get()
+        
+        with self.assertNumQueries(0):
+            data = ZoneSerializer(zone).data
+        
+        self.assertEqual(data['tables_count'], 4)
+        self.assertEqual(data['available_tables'], 2)
+        self.assertEqual(data['occupied_tables'], 1)
+        self.assertEqual(data['reserved_tables'], 1)
+    
+    def test_list_constant_queries(self):
+        """Test que el listado de zonas no hace consultas por zona"""
+        for n in range(5):
+            self.add_zone(f"Zona {n}", ['available', 'occupied'])
+        
+        # count de la paginación + zonas con sus conteos
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/pos/zones/')
+        self.assertEqual(response.data['count'], 6)
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/pos/zones/with_stats/')
+        salon = next(zone for zone in response.data if zone['name'] == 'Salón')
+        self.assertEqual(salon['stats'], {
+            'total_tables': 4, 'available_tables': 2, 'occupied_tables': 1, 'reserved_tables': 1
+        })
+
+
+class StatusSummaryTest(TestCase):
+    """Tests para el resumen de estados de mesas"""
+    
+    url = '/api/pos/tables/status_summary/'
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.hall = Zone.objects.create(name="Salón")
+        self.terrace = Zone.objects.create(name="Terraza")
+        self.closed = Zone.objects.create(name="Bar", is_active=False)
+        for n, table_status in enumerate(['available', 'available', 'occupied', 'reserved']):
+            Table.objects.create(zone=self.hall, number=f"S{n}", capacity=4, status=table_status)
+        Table.objects.create(zone=self.hall, number="S9", capacity=4, is_active=False)
+        Table.objects.create(zone=self.closed, number="B1", capacity=2, status='occupied')
+        self.table = Table.objects.get(number="S0")
+    
+    def expected_summary(self):
+        return {
+            'total': 5, 'available': 2, 'occupied': 2, 'reserved': 1,
+            'by_zone': [
+                {'zone_id': self.hall.id, 'zone_name': 'Salón',
+                 'total': 4, 'available': 2, 'occupied': 1, 'reserved': 1},
+                {'zone_id': self.terrace.id, 'zone_name': 'Terraza',
+                 'total': 0, 'available': 0, 'occupied': 0, 'reserved': 0},
+            ],
+        }
+    
+    @override_settings(POS_FLOOR_STATE_CACHE=False)
+    def test_summary_single_query(self):
+        """Test que el resumen sale de una sola consulta"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        
+        self.assertEqual(response.data, self.expected_summary())
+        
+        response = self.client.get(self.url, {'status': 'occupied'})
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['by_zone'][0]['occupied'], 1)
+    
+    @override_settings(POS_FLOOR_STATE_CACHE=True)
+    def test_summary_from_floor_state(self):
+        """Test que el estado del salón en memoria responde sin consultas y sigue los cambios"""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data, self.expected_summary())
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.occupy()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['available'], 1)
+        self.assertEqual(response.data['occupied'], 3)
+    
+    @override_settings(POS_FLOOR_STATE_CACHE=True)
+    def test_floor_state_reloaded(self):
+        """Test que otro proceso o un cambio del salón obligan a recargar el estado"""
+        self.client.get(self.url)
+        
+        # Cambio hecho por otro proceso: solo se incrementa la versión compartida
+        Table.objects.filter(pk=self.table.pk).update(status='reserved')
+        floor_state.floor_version.bump()
+        self.assertEqual(self.client.get(self.url).data['reserved'], 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Table.objects.create(zone=self.terrace, number="T1", capacity=2)
+        self.assertEqual(self.client.get(self.url).data['by_zone'][1]['total'], 1)
+
+
+class TableEventsTest(TestCase):
+    """Tests para el envío de eventos de estado de mesas"""
+    
+    def setUp(self):
+        self.zone = Zone.objects.create(name="Salón")
+        Table.objects.create(zone=self.zone, number="M1", capacity=4)
+        self.table = Table.objects.get()
+        
+        self.channel_layer = MagicMock()
+        self.channel_layer.group_send = AsyncMock()
+        layer_patcher = patch('pos.events.get_channel_layer', return_value=self.channel_layer)
+        layer_patcher.start()
+        self.addCleanup(layer_patcher.stop)
+    
+    def test_status_change_sent_after_commit(self):
+        """Test que el cambio se envía al confirmar, al grupo global y al de la zona"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            # Sin consultar la zona: solo el UPDATE
+            with self.assertNumQueries(1):
+                self.table.occupy()
+        
+        self.channel_layer.group_send.assert_not_called()
+        for callback in callbacks:
+            callback()
+        
+        groups = [call.args[0] for call in self.channel_layer.group_send.call_args_list]
+        self.assertEqual(groups, ['tables', f'tables.zone.{self.zone.id}'])
+        message = self.channel_layer.group_send.call_args.args[1]
+        self.assertEqual(message['type'], 'table.event')
+        self.assertEqual(message['event']['type'], 'table_status_update')
+        self.assertEqual(message['event']['table_id'], self.table.id)
+        self.assertEqual(message['event']['zone_id'], self.zone.id)
+        self.assertEqual(message['event']['status'], 'occupied')
+        self.assertEqual(message['event']['previous_status'], 'available')
+    
+    def test_only_status_transitions_sent(self):
+        """Test que guardar sin cambiar el estado no envía nada"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.position_x = 4
+            self.table.save()
+            self.table.release()
+        
+        self.channel_layer.group_send.assert_not_called()
+    
+    def test_rolled_back_change_not_sent(self):
+        """Test que un cambio deshecho no se envía"""
+        from django.db import transaction
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.table.occupy()
+                    raise RuntimeError("cancelado")
+            except RuntimeError:
+                pass
+        
+        self.channel_layer.group_send.assert_not_called()
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class TableStatusConsumerTest(TestCase):
+    """Tests para las suscripciones por zona del WebSocket de mesas"""
+    
+    def event(self, table_id, zone_id):
+        return {'type': 'table_status_update', 'table_id': table_id, 'zone_id': zone_id, 'status': 'occupied'}
+    
+    async def connect(self, query_string=''):
+        communicator = WebsocketCommunicator(TableStatusConsumer.as_asgi(), f'/ws/tables/{query_string}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+    
+    async def test_zone_subscription(self):
+        """Test que un cliente con ?zones= recibe solo los eventos de sus zonas"""
+        everything = await self.connect()
+        zones = await self.connect('?zones=1,3')
+        
+        await sync_to_async(publish_table_event)(self.event(10, 2), [2])
+        await sync_to_async(publish_table_event)(self.event(11, 3), [3])
+        
+        self.assertEqual((await everything.receive_json_from())['table_id'], 10)
+        self.assertEqual((await everything.receive_json_from())['table_id'], 11)
+        self.assertEqual(await zones.receive_json_from(), self.event(11, 3))
+        self.assertTrue(await zones.receive_nothing())
+        
+        await everything.disconnect()
+        await zones.disconnect()
+    
+    async def test_invalid_zones_rejected(self):
+        """Test que un parámetro zones inválido cierra la conexión"""
+        communicator = WebsocketCommunicator(TableStatusConsumer.as_asgi(), '/ws/tables/?zones=abc')
+        connected, code = await communicator.connect()
+        
+        self.assertFalse(connected)
+        self.assertEqual(code, 4400)
+
+
+class BulkLayoutTest(TestCase):
+    """Tests para el guardado en lote de la distribución del salón"""
+    
+    url = '/api/pos/tables/bulk_layout/'
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.hall = Zone.objects.create(name="Salón")
+        self.terrace = Zone.objects.create(name="Terraza")
+        Table.objects.bulk_create(
+            Table(zone=self.hall if n % 3 else self.terrace, number=f"M{n:03d}", capacity=4)
+            for n in range(150)
+        )
+        self.tables = list(Table.objects.order_by('id'))
+        
+        self.channel_layer = MagicMock()
+        self.channel_layer.group_send = AsyncMock()
+        layer_patcher = patch('pos.events.get_channel_layer', return_value=self.channel_layer)
+        layer_patcher.start()
+        self.addCleanup(layer_patcher.stop)
+    
+    def test_whole_floor_in_one_update(self):
+        """Test que reordenar 150 mesas es un UPDATE y un evento por grupo"""
+        payload = {'tables': [
+            {'id': table.id, 'position_x': n % 15 * 2, 'position_y': n // 15 * 2, 'width': 2, 'height': 1}
+            for n, table in enumerate(self.tables)
+        ]}
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 150)
+        # Un UPDATE por lote de bulk_update (SQLite limita los parámetros por consulta), no por mesa
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertLessEqual(len(updates), 2)
+        
+        table = Table.objects.get(id=self.tables[16].id)
+        self.assertEqual((table.position_x, table.position_y, table.width), (2, 2, 2))
+        
+        # Un evento completo al grupo global y uno por zona con sus mesas
+        sent = {call.args[0]: call.args[1]['event'] for call in self.channel_layer.group_send.call_args_list}
+        self.assertEqual(set(sent), {'tables', f'tables.zone.{self.hall.id}', f'tables.zone.{self.terrace.id}'})
+        self.assertEqual(sent['tables']['type'], 'table_layout_update')
+        self.assertEqual(len(sent['tables']['tables']), 150)
+        self.assertEqual(len(sent[f'tables.zone.{self.terrace.id}']['tables']), 50)
+    
+    def test_frontend_aliases(self):
+        """Test que se aceptan los nombres de campos del editor visual"""
+        table = self.tables[0]
+        response = self.client.post(self.url, {'tables': [
+            {'id': table.id, 'posicion_x': 7, 'ancho': 3}
+        ]}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table.refresh_from_db()
+        self.assertEqual((table.position_x, table.width, table.height), (7, 3, 1))
+    
+    def test_invalid_changes_rejected(self):
+        """Test que mesas repetidas, inexistentes o tamaños inválidos no guardan nada"""
+        first, second = self.tables[:2]
+        invalid_payloads = [
+            [{'id': first.id, 'position_x': 1}, {'id': first.id, 'position_x': 2}],
+            [{'id': first.id, 'position_x': 1}, {'id': 999999, 'position_x': 2}],
+            [{'id': first.id, 'position_x': 1}, {'id': second.id, 'width': 0}],
+            [],
+        ]
+        for tables in invalid_payloads:
+            response = self.client.post(self.url, {'tables': tables}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, tables)
+        
+        first.refresh_from_db()
+        self.assertIsNone(first.position_x)
+        self.channel_layer.group_send.assert_not_called()
+
+
+class TableOverlapTest(TestCase):
+    """Tests para la validación de superposición de mesas"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        
+        self.hall = Zone.objects.create(name="Salón")
+        self.terrace = Zone.objects.create(name="Terraza")
+        # M1 ocupa (0,0)-(1,1) y M2 ocupa (3,0)-(3,1)
+        self.m1 = Table.objects.create(zone=self.hall, number="M1", capacity=4,
+                                       position_x=0, position_y=0, width=2, height=2)
+        self.m2 = Table.objects.create(zone=self.hall, number="M2", capacity=2,
+                                       position_x=3, position_y=0, width=1, height=2)
+    
+    def test_grid(self):
+        """Test de la grilla de ocupación de una zona"""
+        grid = OccupancyGrid.for_zone(self.hall.id)
+        
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(grid.conflict('X', 1, 1, 1, 1), 'M1')
+        self.assertIsNone(grid.conflict('X', 2, 0, 1, 5))
+        self.assertIsNone(grid.conflict('M1', 0, 0, 2, 2))
+        with self.assertRaises(OverlapError):
+            grid.place('X', 2, 1, 2, 1)
+    
+    def test_create_and_update_rejected_when_overlapping(self):
+        """Test que crear o mover una mesa encima de otra se rechaza"""
+        data = {'zone': self.hall.id, 'number': 'M3', 'capacity': 2,
+                'position_x': 1, 'position_y': 1, 'width': 1, 'height': 1}
+        response = self.client.post('/api/pos/tables/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # En otra zona o en una celda libre sí se puede
+        response = self.client.post('/api/pos/tables/', dict(data, zone=self.terrace.id), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/pos/tables/', dict(data, position_x=2), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        response = self.client.patch(f'/api/pos/tables/{self.m2.id}/', {'position_x': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # Crecer sobre sus propias celdas no es superposición
+        response = self.client.patch(f'/api/pos/tables/{self.m1.id}/', {'height': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_overlap_checked_again_when_saving(self):
+        """Test que al guardar se vuelve a verificar con la zona bloqueada"""
+        serializer = TableSerializer(data={
+            'zone': self.hall.id, 'number': 'M3', 'capacity': 2,
+            'position_x': 5, 'position_y': 0, 'width': 1, 'height': 1,
+        })
+        self.assertTrue(serializer.is_valid())
+        
+        # Otra request ubica una mesa en esa celda entre la validación y el guardado
+        Table.objects.create(zone=self.hall, number="M4", capacity=2, position_x=5, position_y=0)
+        
+        with self.assertRaisesMessage(ValidationError, 'M4'):
+            serializer.save()
+        self.assertFalse(Table.objects.filter(number='M3').exists())
+    
+    def test_bulk_layout_uses_final_positions(self):
+        """Test que el lote se valida con la distribución final de todas las mesas"""
+        url = '/api/pos/tables/bulk_layout/'
+        
+        # Intercambiar las mesas es válido aunque cada una pase por la posición de la otra
+        response = self.client.post(url, {'tables': [
+            {'id': self.m1.id, 'position_x': 2},
+            {'id': self.m2.id, 'position_x': 0},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        m3 = Table.objects.create(zone=self.hall, number="M3", capacity=2, position_x=3, position_y=5)
+        response = self.client.post(url, {'tables': [
+            {'id': self.m1.id, 'position_y': 4},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(m3.number, str(response.data['tables']))
+        
+        self.m1.refresh_from_db()
+        self.assertEqual((self.m1.position_x, self.m1.position_y), (2, 0))
@@ -2,10 +2,14 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Count
+from django.db.models import Q
 import logging
+from . import floor_state
 from .models import Zone, Table
-from .serializers import ZoneSerializer, TableSerializer, TableStatusUpdateSerializer
+from .events import table_layout
+from .serializers import (
+    ZoneSerializer, TableSerializer, TableStatusUpdateSerializer, TableBulkLayoutSerializer
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +30,7 @@ class ZoneViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Zone.objects.all()
+        queryset = Zone.objects.with_table_stats()
         
         # Filtrar por activo/inactivo
         is_active = self.request.query_params.get('is_active')
@@ -39,25 +43,21 @@ class ZoneViewSet(viewsets.ModelViewSet):
     def tables(self, request, pk=None):
         """Obtener todas las mesas de una zona específica"""
         zone = self.get_object()
-        tables = zone.tables.filter(is_active=True)
+        tables = zone.tables.filter(is_active=True).select_related('zone').with_current_order()
         serializer = TableSerializer(tables, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def with_stats(self, request):
         """Obtener zonas con estadísticas de mesas"""
-        zones = self.get_queryset().annotate(
-            total_tables=Count('tables'),
-            available_tables_count=Count('tables', filter=Q(tables__status='available'))
-        )
-        
         data = []
-        for zone in zones:
+        for zone in self.get_queryset():
             zone_data = ZoneSerializer(zone).data
             zone_data['stats'] = {
-                'total_tables': zone.total_tables,
-                'available_tables': zone.available_tables_count,
-                'occupied_tables': zone.total_tables - zone.available_tables_count
+                'total_tables': zone.tables_total,
+                'available_tables': zone.tables_available,
+                'occupied_tables': zone.tables_occupied,
+                'reserved_tables': zone.tables_reserved,
             }
             data.append(zone_data)
         
@@ -97,7 +97,7 @@ class TableViewSet(viewsets.ModelViewSet):
             raise
 
     def get_queryset(self):
-        queryset = Table.objects.select_related('zone').all()
+        queryset = Table.objects.select_related('zone').with_current_order()
         
         # Filtrar por zona
         zone_id = self.request.query_params.get('zone')
@@ -171,32 +171,40 @@ class TableViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(tables, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_layout(self, request):
+        """
+        Mover o redimensionar varias mesas del editor visual en una sola
+        llamada: {"tables": [{"id", "position_x", "position_y", "width", "height"}]}.
+        Se guarda con un solo UPDATE y se notifica un único evento de distribución.
+        """
+        serializer = TableBulkLayoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tables = serializer.save()
+        
+        return Response({
+            'updated': len(tables),
+            'tables': [table_layout(table) for table in tables],
+        })
+
     @action(detail=False, methods=['get'])
     def status_summary(self, request):
-        """Obtener resumen de estados de todas las mesas"""
-        queryset = self.get_queryset().filter(is_active=True)
-        
-        summary = {
-            'total': queryset.count(),
-            'available': queryset.filter(status='available').count(),
-            'occupied': queryset.filter(status='occupied').count(),
-            'reserved': queryset.filter(status='reserved').count(),
-        }
-        
-        # Por zona
-        zones_summary = []
-        from .models import Zone
-        for zone in Zone.objects.filter(is_active=True):
-            zone_tables = queryset.filter(zone=zone)
-            zones_summary.append({
-                'zone_id': zone.id,
-                'zone_name': zone.name,
-                'total': zone_tables.count(),
-                'available': zone_tables.filter(status='available').count(),
-                'occupied': zone_tables.filter(status='occupied').count(),
-                'reserved': zone_tables.filter(status='reserved').count(),
-            })
-        
-        summary['by_zone'] = zones_summary
-        
-        return Response(summary)
+        """
+        Obtener resumen de estados de todas las mesas (total y por zona).
+        Sin filtros sale del estado del salón en memoria si
+        POS_FLOOR_STATE_CACHE está activo; si no, de una sola consulta.
+        """
+        params = request.query_params
+        
+        tables_filter = Q()
+        if params.get('zone'):
+            tables_filter &= Q(tables__zone_id=params['zone'])
+        if params.get('status'):
+            tables_filter &= Q(tables__status=params['status'])
+        if params.get('is_active') is not None:
+            tables_filter &= Q(tables__is_active=params['is_active'].lower() == 'true')
+        
+        if not tables_filter and floor_state.floor_version.enabled():
+            return Response(floor_state.get_floor_state().summary())
+        
+        return Response(floor_state.summarize_from_db(tables_filter))